@@ -0,0 +1,93 @@
+"""
+Index from sorted-letter signatures to words, for "what can I make from this
+rack" queries.
+
+A rack is a string of letters where "_" or "?" is a blank. Instead of scanning
+every word, we enumerate the distinct sub-multisets of the rack (at most 128
+for seven distinct tiles) and look each one up by signature. Blanks multiply
+that by the letter combinations they can stand for, which is still far
+smaller than the word list.
+"""
+
+import collections
+import itertools
+import string
+
+BLANK_CHARS = "_?"
+ALPHABET = string.ascii_uppercase
+
+
+def signature(letters: str) -> str:
+    return "".join(sorted(letters.upper()))
+
+
+def parse_rack(rack: str) -> tuple[collections.Counter, int]:
+    """Split a rack into letter counts and the number of blanks"""
+    counts = collections.Counter()
+    blanks = 0
+    for char in rack.upper():
+        if char in BLANK_CHARS:
+            blanks += 1
+        elif char in ALPHABET:
+            counts[char] += 1
+        elif not char.isspace():
+            raise ValueError(f"Invalid rack character {char!r}")
+    return counts, blanks
+
+
+def blank_letters(word: str, rack: str) -> list[str]:
+    """Letters of `word` that have to be played with blanks from `rack`"""
+    counts, _ = parse_rack(rack)
+    needed = collections.Counter(word.upper())
+    needed.subtract(counts)
+    return sorted(needed.elements())
+
+
+class AnagramIndex:
+    def __init__(self, words):
+        self.by_signature: dict[str, list[str]] = collections.defaultdict(list)
+        for word in words:
+            self.by_signature[signature(word)].append(word.upper())
+        self.by_signature = dict(self.by_signature)
+
+    def __len__(self):
+        return len(self.by_signature)
+
+    def anagrams(self, letters: str) -> list[str]:
+        """Words that use exactly these letters (no blanks)"""
+        return self.by_signature.get(signature(letters), [])
+
+    def signatures(self, rack: str, min_length: int = 2):
+        """Every distinct signature that can be formed from the rack"""
+        counts, blanks = parse_rack(rack)
+        letters = sorted(counts)
+
+        # Every distinct sub-multiset of the real tiles
+        subsets = [""]
+        for letter in letters:
+            subsets = [
+                subset + letter * n
+                for subset in subsets
+                for n in range(counts[letter] + 1)
+            ]
+
+        seen = set()
+        for used_blanks in range(blanks + 1):
+            for fill in itertools.combinations_with_replacement(ALPHABET, used_blanks):
+                fill = "".join(fill)
+                for subset in subsets:
+                    if len(subset) + used_blanks < min_length:
+                        continue
+                    sig = signature(subset + fill) if fill else subset
+                    if sig not in seen:
+                        seen.add(sig)
+                        yield sig
+
+    def subanagrams(self, rack: str, min_length: int = 2) -> set[str]:
+        """Words that can be made from any subset of the rack, blanks included"""
+        found = set()
+        for sig in self.signatures(rack, min_length):
+            words = self.by_signature.get(sig)
+            if words:
+                found.update(words)
+        return found
@@ -0,0 +1,205 @@
+"""
+Offline analysis of saved positions and finished games, for coaching.
+
+Reads JSONL, one of these a line:
+
+- a saved position (Board.to_save_dict, e.g. the /state JSON): the best moves
+  for the player to move, and the best bingo if there is one
+- an archived game (ArchivedGame.to_dict, e.g. from
+  `python -m backend.archive dump`): every turn is replayed from the seed and
+  compared with the best move there was, giving the score lost each turn, the
+  bingos missed and totals per player
+
+and writes one JSON result a line, in the same order, with the input line
+number. A line that can't be analyzed gets {"line": N, "error": ...} and the
+run carries on.
+
+Lines are analyzed across a process pool. At most `window` lines are read
+ahead of the output, and lines are read and results written as they go, so
+memory stays flat however big the input is. Each search is cut off after
+`time_limit` seconds; "complete" says whether it searched the whole board.
+
+Usage:
+    python -m backend.analysis positions.jsonl --out results.jsonl
+    python -m backend.archive dump | python -m backend.analysis --workers 8
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import heapq
+import json
+import os
+import sys
+import time
+
+from .archive import ArchivedGame, move_tiles
+from .movegen import MoveGenerator
+from .scrabble import Board, WordList
+
+TOP = 3
+TIME_LIMIT = 5.0
+# Lines in flight per worker
+WINDOW_PER_WORKER = 4
+
+_WORKER_WORD_LIST = None
+
+
+def _init_worker():
+    global _WORKER_WORD_LIST
+    _WORKER_WORD_LIST = WordList.load_word_list()
+    _WORKER_WORD_LIST.pattern_index
+
+
+def search(board: Board, top=TOP, time_limit=TIME_LIMIT):
+    """(best `top` moves, best bingo or None, whether the search finished)"""
+    generator = MoveGenerator(board, board.current_player.word_bank)
+    best, bingo = [], None  # Min-heap of (score, order, move)
+    for order, move in enumerate(generator.generate(time.monotonic() + time_limit)):
+        if len(best) < top:
+            heapq.heappush(best, (move.score, -order, move))
+        elif move.score > best[0][0]:
+            heapq.heapreplace(best, (move.score, -order, move))
+        if move.is_bingo and (bingo is None or move.score > bingo.score):
+            bingo = move
+    best = [move for *_, move in sorted(best, key=lambda t: t[:2], reverse=True)]
+    return best, bingo, generator.complete
+
+
+def analyze_position(board: Board, top=TOP, time_limit=TIME_LIMIT) -> dict:
+    best, bingo, complete = search(board, top, time_limit)
+    return {
+        "player": board.players.index(board.current_player),
+        "rack": "".join(
+            "_" if t.is_blank else t.letter for t in board.current_player.word_bank.hand
+        ),
+        "best": [move.to_dict() for move in best],
+        "bingo": bingo.to_dict() if bingo else None,
+        "complete": complete,
+    }
+
+
+def analyze_game(game: ArchivedGame, word_list, time_limit=TIME_LIMIT) -> dict:
+    board = game.start(word_list)
+    lost = [0] * len(game.bots)
+    missed_bingos = [0] * len(game.bots)
+    turns = []
+    for move in game.moves:
+        player = board.players.index(board.current_player)
+        best, bingo, complete = search(board, 1, time_limit)
+
+        tiles = move_tiles(move)
+        # Before the move, as the end of the game also moves scores
+        played = board.score_move(tiles)[1] if tiles else 0
+        board.make_move(tiles, board.current_player)
+
+        best_score = best[0].score if best else 0
+        # Only a miss if the bingo would have scored more than what was played
+        missed = (
+            bingo is not None
+            and len(tiles) != board.variant.rack_size
+            and bingo.score > played
+        )
+        lost[player] += max(0, best_score - played)
+        missed_bingos[player] += missed
+        turns.append(
+            {
+                "player": player,
+                "played": "".join(t.letter for t in tiles),
+                "score": played,
+                "best": best[0].to_dict() if best else None,
+                "lost": max(0, best_score - played),
+                "missed_bingo": bingo.to_dict() if missed else None,
+                "complete": complete,
+            }
+        )
+    return {
+        "game_id": game.game_id,
+        "scores": game.scores,
+        "lost": lost,
+        "missed_bingos": missed_bingos,
+        "turns": turns,
+    }
+
+
+def analyze_line(line: str, word_list, top=TOP, time_limit=TIME_LIMIT) -> dict:
+    data = json.loads(line)
+    if "board" in data:
+        return analyze_position(Board.from_save_dict(data, word_list), top, time_limit)
+    if "seed" in data and "moves" in data:
+        return analyze_game(ArchivedGame(**data), word_list, time_limit)
+    raise ValueError("Neither a saved position nor an archived game")
+
+
+def _analyze(number, line, top, time_limit, word_list=None):
+    try:
+        result = analyze_line(line, word_list or _WORKER_WORD_LIST, top, time_limit)
+    except Exception as exc:
+        return {"line": number, "error": f"{type(exc).__name__}: {exc}"}
+    return {"line": number, **result}
+
+
+def analyze(lines, out, workers=None, window=None, top=TOP, time_limit=TIME_LIMIT):
+    """
+    Analyze each line of `lines`, writing a JSON line to `out` for each, in
+    order. workers=0 runs in this process. Returns (results, errors)
+    """
+    done = errors = 0
+
+    def write(result):
+        nonlocal done, errors
+        out.write(json.dumps(result) + "\n")
+        done += 1
+        errors += "error" in result
+
+    numbered = ((n, line) for n, line in enumerate(lines, 1) if line.strip())
+    if workers == 0:
+        word_list = WordList.load_word_list()
+        for number, line in numbered:
+            write(_analyze(number, line, top, time_limit, word_list))
+        return done, errors
+
+    workers = workers or os.cpu_count() or 1
+    window = window or workers * WINDOW_PER_WORKER
+    in_flight = collections.deque()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker
+    ) as executor:
+        for number, line in numbered:
+            # Wait for the oldest before reading further, results stay in order
+            if len(in_flight) >= window:
+                write(in_flight.popleft().result())
+            in_flight.append(executor.submit(_analyze, number, line, top, time_limit))
+        while in_flight:
+            write(in_flight.popleft().result())
+    return done, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze saved positions and games")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL, default stdin")
+    parser.add_argument("--out", default="-", help="JSONL, default stdout")
+    parser.add_argument("--workers", type=int, default=None, help="Default: one per core")
+    parser.add_argument("--window", type=int, default=None, help="Lines in flight at most")
+    parser.add_argument("--top", type=int, default=TOP, help="Best moves per position")
+    parser.add_argument("--time-limit", type=float, default=TIME_LIMIT)
+    args = parser.parse_args(argv)
+
+    start = time.monotonic()
+    # Only close what we opened, not stdin and stdout
+    with contextlib.ExitStack() as stack:
+        source = sys.stdin if args.input == "-" else stack.enter_context(open(args.input))
+        out = sys.stdout if args.out == "-" else stack.enter_context(open(args.out, "w"))
+        done, errors = analyze(
+            source, out, args.workers, args.window, args.top, args.time_limit
+        )
+    elapsed = time.monotonic() - start
+    print(
+        f"{done} lines in {elapsed:.1f}s ({done / elapsed:.1f}/s), {errors} errors",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
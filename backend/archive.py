@@ -0,0 +1,392 @@
+"""
+Archive of finished games in compact, compressed, append-only files.
+
+A game is stored as a small header (game id, seed, variant, each player's bot
+name and final score) and its moves. A move is a tile count followed by 2
+bytes a tile: the square (9 bits, up to a 22x22 board), the letter and a
+blank bit. With the seed that is
+everything needed to replay the game, see ArchivedGame.replay. A typical game
+is 150-250 bytes before compression.
+
+Records are grouped into blocks of BLOCK_RECORDS games, and each block is
+zlib-compressed and appended to the current segment file; a new segment is
+started once one reaches SEGMENT_BYTES. Every game gets an archive id, its
+position in the archive, and `index.dat` holds a fixed-size entry for each
+(segment, block offset, slot in block), so reading any game is one seek in
+the index, one seek in its segment and decompressing one block. `games.dat`
+maps game ids to archive ids (a game id is reused when its game is
+restarted, so it can have several), see Archive.find. It is written after the
+index, and any games the index has that it lacks are added back on open.
+
+Games waiting for their block to fill up are also appended, uncompressed, to
+`pending.dat`, so they survive a restart. It starts with the archive id of its
+first game, so games that made it into a block before a crash cleared the file
+aren't archived twice.
+
+Usage:
+    python -m backend.archive [--dir DIR] stats
+    python -m backend.archive [--dir DIR] get ARCHIVE_ID
+    python -m backend.archive [--dir DIR] find GAME_ID
+    python -m backend.archive [--dir DIR] dump > games.jsonl
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import struct
+import zlib
+from pathlib import Path
+
+from .anagram import ALPHABET
+from .scrabble import (STANDARD, VARIANTS, Board, Player, Tile, TileBag, WordList,
+                       tile_points)
+
+ARCHIVE_DIR = os.getenv("SCRABBLE_ARCHIVE_DIR", "archive")
+SEGMENT_BYTES = int(os.getenv("SCRABBLE_ARCHIVE_SEGMENT_BYTES", 64 * 1024 * 1024))
+BLOCK_RECORDS = int(os.getenv("SCRABBLE_ARCHIVE_BLOCK_RECORDS", 256))
+
+VERSION = 3
+BOTS = [None, "greedy", "sim"]
+VARIANT_NAMES = list(VARIANTS)
+HEADER = struct.Struct("<BQBBH")  # version, seed, variant, players, moves
+GAME_ID_LENGTH = struct.Struct("<H")  # One byte in version 2
+PLAYER = struct.Struct("<Bh")  # bot, final score
+TILE = struct.Struct("<H")  # square | letter << 9 | blank << 14
+LENGTH = struct.Struct("<I")
+INDEX_ENTRY = struct.Struct("<IQH")  # segment, block offset, slot in block
+PENDING_MAGIC = b"SPND"
+PENDING_HEADER = struct.Struct("<4sQ")  # magic, archive id of the first game
+GAME_ENTRY = struct.Struct("<QH")  # archive id, game id length, then the game id
+
+
+def move_tiles(move) -> list[Tile]:
+    return [
+        Tile(letter=l, x=x, y=y, is_blank=b, points=tile_points(l, b)) for l, x, y, b in move
+    ]
+
+
+@dataclasses.dataclass
+class ArchivedGame:
+    game_id: str
+    seed: int
+    bots: list[str | None]  # One per player, None for a person
+    scores: list[int]
+    moves: list[list[tuple]]  # [(letter, x, y, is_blank), ...] per turn
+    variant: str = STANDARD.name
+
+    @classmethod
+    def from_board(cls, game_id: str, board: Board):
+        if board.seed is None:
+            raise ValueError("Game was started before moves were recorded")
+        return cls(
+            game_id=game_id,
+            seed=board.seed,
+            bots=[p.bot for p in board.players],
+            scores=[p.score for p in board.players],
+            moves=[list(move) for move in board.moves],
+            variant=board.variant.name,
+        )
+
+    def encode(self) -> bytes:
+        game_id = self.game_id.encode()
+        size = VARIANTS[self.variant].size
+        parts = [
+            HEADER.pack(
+                VERSION,
+                self.seed,
+                VARIANT_NAMES.index(self.variant),
+                len(self.bots),
+                len(self.moves),
+            ),
+            GAME_ID_LENGTH.pack(len(game_id)),
+            game_id,
+        ]
+        for bot, score in zip(self.bots, self.scores):
+            parts.append(PLAYER.pack(BOTS.index(bot), score))
+        for move in self.moves:
+            parts.append(bytes([len(move)]))
+            for letter, x, y, is_blank in move:
+                square = y * size + x
+                parts.append(
+                    TILE.pack(square | ALPHABET.index(letter.upper()) << 9 | is_blank << 14)
+                )
+        return b"".join(parts)
+
+    @classmethod
+    def decode(cls, data: bytes):
+        version, seed, variant, players, moves = HEADER.unpack_from(data)
+        if version not in (2, VERSION):
+            raise ValueError(f"Unknown archive record version {version}")
+        variant = VARIANT_NAMES[variant]
+        size = VARIANTS[variant].size
+        at = HEADER.size
+        if version == 2:
+            length, at = data[at], at + 1
+        else:
+            (length,) = GAME_ID_LENGTH.unpack_from(data, at)
+            at += GAME_ID_LENGTH.size
+        game_id = data[at : at + length].decode()
+        at += length
+
+        bots, scores = [], []
+        for _ in range(players):
+            bot, score = PLAYER.unpack_from(data, at)
+            at += PLAYER.size
+            bots.append(BOTS[bot])
+            scores.append(score)
+
+        played = []
+        for _ in range(moves):
+            count = data[at]
+            at += 1
+            move = []
+            for _ in range(count):
+                (packed,) = TILE.unpack_from(data, at)
+                at += TILE.size
+                square = packed & 0x1FF
+                move.append(
+                    (
+                        ALPHABET[packed >> 9 & 0x1F],
+                        square % size,
+                        square // size,
+                        bool(packed >> 14 & 1),
+                    )
+                )
+            played.append(move)
+        return cls(game_id, seed, bots, scores, played, variant)
+
+    def start(self, word_list: WordList) -> Board:
+        """The board as it was dealt, before the first move"""
+        variant = VARIANTS[self.variant]
+        board = Board(
+            players=[Player(bot=bot) for bot in self.bots],
+            tile_bag=TileBag.full(self.seed, variant.tiles),
+            variant=variant,
+        )
+        board.initialize(word_list)
+        return board
+
+    def replay(self, word_list: WordList) -> Board:
+        """Play the game again from its seed, returns the final board"""
+        board = self.start(word_list)
+        for move in self.moves:
+            board.make_move(move_tiles(move), board.current_player)
+        return board
+
+    def to_dict(self):
+        return dataclasses.asdict(self)
+
+
+class Archive:
+    def __init__(
+        self, directory=ARCHIVE_DIR, segment_bytes=SEGMENT_BYTES, block_records=BLOCK_RECORDS
+    ):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.block_records = block_records
+        self.index_path = self.directory / "index.dat"
+        self.pending_path = self.directory / "pending.dat"
+        self.games_path = self.directory / "games.dat"
+        # game id -> archive ids of the games played under it, oldest first
+        self.by_game_id = {}
+
+        self.indexed = (
+            self.index_path.stat().st_size // INDEX_ENTRY.size
+            if self.index_path.exists()
+            else 0
+        )
+        segments = sorted(self.directory.glob("segment-*.dat"))
+        self.segment = int(segments[-1].stem.split("-")[1]) if segments else 0
+
+        # Records not in a block yet, reloaded from pending.dat
+        self.pending = []
+        if self.pending_path.exists():
+            data = self.pending_path.read_bytes()
+            # Files from before the header start straight at the first record
+            at, first = 0, self.indexed
+            if data[: len(PENDING_MAGIC)] == PENDING_MAGIC:
+                _, first = PENDING_HEADER.unpack_from(data)
+                at = PENDING_HEADER.size
+            records = []
+            while at + LENGTH.size <= len(data):
+                (length,) = LENGTH.unpack_from(data, at)
+                if at + LENGTH.size + length > len(data):
+                    break  # Torn write, the game never got its id
+                records.append(data[at + LENGTH.size : at + LENGTH.size + length])
+                at += LENGTH.size + length
+            # Stopped after indexing a block but before clearing the file
+            self.pending = records[max(0, self.indexed - first) :]
+
+        named = self.load_game_ids()
+        # Stopped after indexing a block but before naming its games
+        if named < self.indexed:
+            self.write_game_ids(
+                (archive_id, game.game_id)
+                for archive_id, game in enumerate(self.iter_indexed(named), named)
+            )
+        for archive_id, record in enumerate(self.pending, self.indexed):
+            self.add_game_id(ArchivedGame.decode(record).game_id, archive_id)
+
+    def add_game_id(self, game_id, archive_id):
+        self.by_game_id.setdefault(game_id, []).append(archive_id)
+
+    def load_game_ids(self) -> int:
+        """Reads games.dat, returns how many games it names"""
+        if not self.games_path.exists():
+            return 0
+        data = self.games_path.read_bytes()
+        at, named = 0, 0
+        while at + GAME_ENTRY.size <= len(data):
+            archive_id, length = GAME_ENTRY.unpack_from(data, at)
+            end = at + GAME_ENTRY.size + length
+            if end > len(data):
+                break
+            self.add_game_id(data[at + GAME_ENTRY.size : end].decode(), archive_id)
+            named, at = archive_id + 1, end
+        if at < len(data):
+            # Torn write, cut it off so the next entry doesn't land after it
+            with open(self.games_path, "r+b") as f:
+                f.truncate(at)
+        return named
+
+    def write_game_ids(self, entries):
+        """Adds (archive id, game id) pairs of indexed games to games.dat"""
+        parts = []
+        for archive_id, game_id in entries:
+            encoded = game_id.encode()
+            parts.append(GAME_ENTRY.pack(archive_id, len(encoded)) + encoded)
+            if archive_id not in self.by_game_id.get(game_id, ()):
+                self.add_game_id(game_id, archive_id)
+        with open(self.games_path, "ab") as f:
+            f.write(b"".join(parts))
+
+    def find(self, game_id: str) -> list[int]:
+        """Archive ids of the games played under game_id, oldest first"""
+        return list(self.by_game_id.get(game_id, ()))
+
+    def __len__(self):
+        return self.indexed + len(self.pending)
+
+    def segment_path(self, segment):
+        return self.directory / f"segment-{segment:05}.dat"
+
+    def append(self, game: ArchivedGame) -> int:
+        """Add a game, returns its archive id"""
+        record = game.encode()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.pending_path, "ab") as f:
+            if f.tell() == 0:
+                f.write(PENDING_HEADER.pack(PENDING_MAGIC, self.indexed))
+            f.write(LENGTH.pack(len(record)) + record)
+        self.pending.append(record)
+        archive_id = len(self) - 1
+        self.add_game_id(game.game_id, archive_id)
+        if len(self.pending) >= self.block_records:
+            self.flush()
+        return archive_id
+
+    def flush(self):
+        """Compress the pending games into a block and index them"""
+        if not self.pending:
+            return
+        block = zlib.compress(
+            b"".join(LENGTH.pack(len(r)) + r for r in self.pending), level=9
+        )
+        path = self.segment_path(self.segment)
+        if path.exists() and path.stat().st_size >= self.segment_bytes:
+            self.segment += 1
+            path = self.segment_path(self.segment)
+        with open(path, "ab") as f:
+            offset = f.tell()
+            f.write(LENGTH.pack(len(block)) + block)
+        # Index last, so it never points at a block that isn't written
+        with open(self.index_path, "ab") as f:
+            for slot in range(len(self.pending)):
+                f.write(INDEX_ENTRY.pack(self.segment, offset, slot))
+        # Already in by_game_id since append, this only makes them last
+        self.write_game_ids(
+            (archive_id, ArchivedGame.decode(record).game_id)
+            for archive_id, record in enumerate(self.pending, self.indexed)
+        )
+        self.indexed += len(self.pending)
+        self.pending = []
+        self.pending_path.write_bytes(PENDING_HEADER.pack(PENDING_MAGIC, self.indexed))
+
+    def read_block(self, segment, offset) -> list[bytes]:
+        with open(self.segment_path(segment), "rb") as f:
+            f.seek(offset)
+            (length,) = LENGTH.unpack(f.read(LENGTH.size))
+            data = zlib.decompress(f.read(length))
+        records, at = [], 0
+        while at < len(data):
+            (length,) = LENGTH.unpack_from(data, at)
+            records.append(data[at + LENGTH.size : at + LENGTH.size + length])
+            at += LENGTH.size + length
+        return records
+
+    def get(self, archive_id: int) -> ArchivedGame:
+        if not 0 <= archive_id < len(self):
+            raise KeyError(archive_id)
+        if archive_id >= self.indexed:
+            return ArchivedGame.decode(self.pending[archive_id - self.indexed])
+        with open(self.index_path, "rb") as f:
+            f.seek(archive_id * INDEX_ENTRY.size)
+            segment, offset, slot = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+        return ArchivedGame.decode(self.read_block(segment, offset)[slot])
+
+    def iter_indexed(self, start=0):
+        """Indexed games from archive id `start` on, reading each block once"""
+        block, at = None, None
+        if start >= self.indexed:
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(start * INDEX_ENTRY.size)
+            for _ in range(start, self.indexed):
+                segment, offset, slot = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+                if (segment, offset) != at:
+                    block, at = self.read_block(segment, offset), (segment, offset)
+                yield ArchivedGame.decode(block[slot])
+
+    def __iter__(self):
+        """Every game in id order"""
+        yield from self.iter_indexed()
+        for record in list(self.pending):
+            yield ArchivedGame.decode(record)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read the finished game archive")
+    parser.add_argument("--dir", default=ARCHIVE_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="How many games and how much disk")
+    get_parser = commands.add_parser("get", help="Print one game as JSON")
+    get_parser.add_argument("archive_id", type=int)
+    find_parser = commands.add_parser("find", help="Print the games played under a game id")
+    find_parser.add_argument("game_id")
+    commands.add_parser("dump", help="Print every game as JSONL")
+    args = parser.parse_args(argv)
+
+    archive = Archive(args.dir)
+    if args.command == "get":
+        print(json.dumps(archive.get(args.archive_id).to_dict()))
+        return
+    if args.command == "find":
+        for archive_id in archive.find(args.game_id):
+            print(json.dumps({"archive_id": archive_id, **archive.get(archive_id).to_dict()}))
+        return
+    if args.command == "dump":
+        for game in archive:
+            print(json.dumps(game.to_dict()))
+        return
+    size = sum(p.stat().st_size for p in archive.directory.glob("*.dat"))
+    print(
+        f"{len(archive)} games ({len(archive.pending)} pending), "
+        f"{len(list(archive.directory.glob('segment-*.dat')))} segments, {size} bytes"
+    )
+    if len(archive):
+        print(f"{size / len(archive):.1f} bytes per game")
+
+
+if __name__ == "__main__":
+    main()
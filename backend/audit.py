@@ -0,0 +1,226 @@
+"""
+Audit trail of every move attempt, written off the request path.
+
+/make_move (and the bot pool) call AuditLog.record, which only puts the
+record on a bounded in-memory queue and returns. A background task takes
+records off the queue in batches of up to BATCH_SIZE, waiting at most
+FLUSH_INTERVAL seconds for a batch to fill, and hands each batch to the sink:
+
+- "redis": one pipeline of XADDs to the SCRABBLE_AUDIT_STREAM stream (capped
+  at about STREAM_MAXLEN entries), the default
+- "file": appended as JSON lines to one file a day in SCRABBLE_AUDIT_DIR
+- "off": nothing is recorded
+
+If the queue is full (the sink is down or slow) the record is dropped and
+counted, in `dropped` and scrabble_audit_dropped_total, rather than holding
+up the game. A batch the sink fails on is counted as failed (and the first
+failure of a run is logged) and the writer carries on with the next one.
+Records still queued when the event loop changes move to the new loop's queue.
+
+A record: {"ts", "game_id", "player", "bot", "tiles", "accepted", "reason",
+"seconds"}, tiles as in the /make_move payload, reason the error for a move
+that was turned down, seconds the time the server took over it.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from . import metrics, scrabble
+
+SINK = os.getenv("SCRABBLE_AUDIT_SINK", "redis")
+QUEUE_SIZE = int(os.getenv("SCRABBLE_AUDIT_QUEUE_SIZE", 10000))
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+STREAM = os.getenv("SCRABBLE_AUDIT_STREAM", "scrabble:audit")
+STREAM_MAXLEN = 1_000_000
+AUDIT_DIR = os.getenv("SCRABBLE_AUDIT_DIR", "audit")
+
+log = logging.getLogger(__name__)
+
+
+class RedisStreamSink:
+    def __init__(self, stream=STREAM, maxlen=STREAM_MAXLEN):
+        self.stream = stream
+        self.maxlen = maxlen
+
+    async def write(self, records: list[dict]):
+        # scrabble.rd looked up each time, so it can be swapped (see loadtest.py)
+        async with scrabble.rd.pipeline(transaction=False) as pipe:
+            for record in records:
+                pipe.xadd(
+                    self.stream,
+                    {"record": json.dumps(record)},
+                    maxlen=self.maxlen,
+                    approximate=True,
+                )
+            await pipe.execute()
+
+
+class JsonlSink:
+    def __init__(self, directory=AUDIT_DIR):
+        self.directory = Path(directory)
+
+    def path(self, ts):
+        return self.directory / f"audit-{time.strftime('%Y%m%d', time.gmtime(ts))}.jsonl"
+
+    def _write(self, records):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        lines = {}
+        for record in records:
+            lines.setdefault(self.path(record["ts"]), []).append(json.dumps(record) + "\n")
+        for path, chunk in lines.items():
+            with open(path, "a") as f:
+                f.writelines(chunk)
+
+    async def write(self, records: list[dict]):
+        # Files block, keep them off the event loop
+        await asyncio.to_thread(self._write, records)
+
+
+def make_sink(name=SINK):
+    if name == "off":
+        return None
+    if name == "file":
+        return JsonlSink()
+    if name == "redis":
+        return RedisStreamSink()
+    raise ValueError(f"Unknown audit sink {name!r}, expected redis, file or off")
+
+
+class AuditLog:
+    def __init__(
+        self,
+        sink=None,
+        queue_size=QUEUE_SIZE,
+        batch_size=BATCH_SIZE,
+        flush_interval=FLUSH_INTERVAL,
+    ):
+        self.sink = sink
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._loop = None
+        self._queue = None
+        self._task = None
+        self._batch = []  # Taken off the queue, not written yet
+        self._writing = None
+        self._written = []  # The batch _writing is writing
+        self._failing = False
+
+    def record(self, game_id, player, tiles, accepted, reason=None, seconds=None, bot=None):
+        """Queue a move attempt. Never waits, returns False if it was dropped"""
+        if self.sink is None:
+            return False
+        # Made here rather than in __init__, they need the running event loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # The old writer went with its loop, what it hadn't written yet
+            # (a batch cut off mid-write included) is written by the new one
+            carried = []
+            if self._writing is not None and (
+                self._writing.cancelled() or not self._writing.done()
+            ):
+                carried = self._written
+            if self._queue is not None:
+                carried = carried + self.take_pending()
+            self._loop, self._queue, self._task = loop, asyncio.Queue(self.queue_size), None
+            self._writing = None
+            if carried:
+                log.warning("Event loop changed, moving %d audit records over", len(carried))
+            for pending in carried:
+                self.put(pending)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self.put(
+            {
+                "ts": time.time(),
+                "game_id": game_id,
+                "player": player,
+                "bot": bot,
+                "tiles": tiles,
+                "accepted": accepted,
+                "reason": reason,
+                "seconds": seconds,
+            }
+        )
+
+    def put(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            metrics.inc("scrabble_audit_dropped_total")
+            return False
+        metrics.set_gauge("scrabble_audit_queue_depth", self._queue.qsize())
+        return True
+
+    def take_pending(self):
+        """Empties the batch in hand and the queue, returns their records"""
+        pending, self._batch = self._batch, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        return pending
+
+    async def fill_batch(self):
+        """Waits for a record, then up to flush_interval for the batch to fill"""
+        self._batch.append(await self._queue.get())
+        deadline = time.monotonic() + self.flush_interval
+        while len(self._batch) < self.batch_size:
+            try:
+                self._batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def write(self, batch):
+        try:
+            await self.sink.write(batch)
+        except Exception:
+            # Once per outage, not once per batch
+            if not self._failing:
+                log.exception("Audit sink failed, dropping %d records", len(batch))
+            self._failing = True
+            metrics.inc("scrabble_audit_records_total", len(batch), result="failed")
+        else:
+            self._failing = False
+            metrics.inc("scrabble_audit_records_total", len(batch), result="written")
+        metrics.set_gauge("scrabble_audit_queue_depth", self._queue.qsize())
+
+    async def run(self):
+        while True:
+            await self.fill_batch()
+            batch, self._batch = self._batch, []
+            # Stopping the writer (flush) lets the batch in hand finish
+            self._written = batch
+            self._writing = asyncio.ensure_future(self.write(batch))
+            await asyncio.shield(self._writing)
+
+    async def flush(self):
+        """Write out everything queued so far, e.g. before shutting down"""
+        if self._queue is None:
+            return
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writing is not None:
+            await self._writing
+        # Anything the writer had taken off the queue, then the rest
+        remaining = self.take_pending()
+        for i in range(0, len(remaining), self.batch_size):
+            await self.write(remaining[i : i + self.batch_size])
@@ -0,0 +1,186 @@
+"""
+Vectorized evaluation of many boards at once with NumPy. NumPy is optional and
+only needed here (`pip install -e ".[batch]"`).
+
+Boards are stacked into (N, 15, 15) uint8 arrays of letters (0 for an empty
+square, 1-26 for A-Z) with a matching bool array marking blanks. Moves are
+stacked the same way, one move per board, holding only the new tiles.
+
+Everything works on the whole stack at once: occupancy, anchors, the extent
+of the words running through each square, premium squares covered, and the
+score of a move on each board. Scores follow Board.score_move exactly,
+including its quirks: only the newly placed tiles score, a single tile is read
+as a vertical word, and the main word always counts even when it is one
+letter long. Moves have to be in one row or column. Only the standard
+15x15 variant is supported.
+"""
+
+from .anagram import ALPHABET
+from .scrabble import BOARD_SIZE, STANDARD, Board, Tile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PREMIUMS = ["DLS", "TLS", "DWS", "TWS"]
+# The engine's own rules for the one variant supported here
+BINGO_SIZE = STANDARD.rack_size
+BINGO_BONUS = STANDARD.bingo_bonus
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('The batch engine needs numpy: pip install -e ".[batch]"')
+
+
+if np is not None:
+    # Indexed by the letter codes above, so empty squares are worth 0
+    LETTER_POINTS = np.array([0] + [STANDARD.tiles[c][1] for c in ALPHABET], dtype=np.int32)
+    LETTER_MULTIPLIERS = np.array(
+        [[{"DLS": 2, "TLS": 3}.get(m, 1) for m in row] for row in STANDARD.multipliers],
+        dtype=np.int32,
+    )
+    WORD_MULTIPLIERS = np.array(
+        [[{"DWS": 2, "TWS": 3}.get(m, 1) for m in row] for row in STANDARD.multipliers],
+        dtype=np.int32,
+    )
+    PREMIUM_MASKS = np.array(
+        [[[m == premium for m in row] for row in STANDARD.multipliers] for premium in PREMIUMS]
+    )
+
+
+def encode_tiles(tiles):
+    """(letters, blanks) for one board's worth of tiles"""
+    letters = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=np.uint8)
+    blanks = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=bool)
+    for tile in tiles:
+        if tile.letter:
+            letters[tile.y, tile.x] = ALPHABET.index(tile.letter.upper()) + 1
+            blanks[tile.y, tile.x] = tile.is_blank
+    return letters, blanks
+
+
+def stack_boards(boards: list[Board]):
+    """(N, 15, 15) letters and blanks for a list of boards"""
+    _require_numpy()
+    if any(b.variant is not STANDARD for b in boards):
+        raise ValueError("The batch engine only handles the standard board")
+    encoded = [encode_tiles(t for row in b.board for t in row) for b in boards]
+    return (
+        np.stack([letters for letters, _ in encoded]),
+        np.stack([blanks for _, blanks in encoded]),
+    )
+
+
+def stack_moves(moves: list[list[Tile]]):
+    """(N, 15, 15) letters and blanks of the new tiles, one move per board"""
+    _require_numpy()
+    encoded = [encode_tiles(move) for move in moves]
+    return (
+        np.stack([letters for letters, _ in encoded]),
+        np.stack([blanks for _, blanks in encoded]),
+    )
+
+
+def occupancy(letters):
+    return letters > 0
+
+
+def anchors(letters):
+    """Empty squares next to a tile, the same squares as Board.anchors"""
+    occupied = occupancy(letters)
+    near = np.zeros_like(occupied)
+    near[:, 1:, :] |= occupied[:, :-1, :]
+    near[:, :-1, :] |= occupied[:, 1:, :]
+    near[:, :, 1:] |= occupied[:, :, :-1]
+    near[:, :, :-1] |= occupied[:, :, 1:]
+    return near & ~occupied
+
+
+def _runs_before(occupied, axis):
+    # runs[..., i] = how many occupied squares in a row end just before i
+    occupied = np.moveaxis(occupied, axis, -1)
+    runs = np.zeros(occupied.shape, dtype=np.int8)
+    for i in range(1, BOARD_SIZE):
+        runs[..., i] = np.where(occupied[..., i - 1], runs[..., i - 1] + 1, 0)
+    return np.moveaxis(runs, -1, axis)
+
+
+def cross_extents(occupied):
+    """
+    (up, down, left, right): for every square, how many tiles run straight
+    out from it in each direction before the first empty square
+    """
+    up = _runs_before(occupied, 1)
+    left = _runs_before(occupied, 2)
+    down = _runs_before(occupied[:, ::-1, :], 1)[:, ::-1, :]
+    right = _runs_before(occupied[:, :, ::-1], 2)[:, :, ::-1]
+    return up, down, left, right
+
+
+def premium_coverage(letters):
+    """(N, 4) how many DLS, TLS, DWS and TWS squares have a tile on them"""
+    occupied = occupancy(letters)
+    return (occupied[:, None] & PREMIUM_MASKS[None]).sum(axis=(2, 3))
+
+
+def move_words(letters, new_letters):
+    """
+    Where the words of each move are, like Board.extract_words:
+
+    - vertical: (N,) True if the main word runs down a column
+    - main: (N, 15, 15) bool, the squares of the main word
+    - cross: (N, 15, 15) bool, new tiles that also make a word across
+    """
+    _require_numpy()
+    new = new_letters > 0
+    # A move in one column is vertical, that includes single tiles
+    vertical = new.any(axis=1).sum(axis=1) == 1
+
+    # Turn vertical boards on their side so every main word runs along a row
+    flip = vertical[:, None, None]
+    occupied = np.where(flip, occupancy(letters).transpose(0, 2, 1), occupancy(letters))
+    new = np.where(flip, new.transpose(0, 2, 1), new)
+    combined = occupied | new
+
+    # The main word is the run of tiles through the first new tile
+    n = np.arange(len(new))
+    row = new.any(axis=2).argmax(axis=1)
+    first = new[n, row].argmax(axis=1)
+    line = combined[n, row]
+    before = _runs_before(line[:, None, :], 2)[:, 0]
+    after = _runs_before(line[:, None, ::-1], 2)[:, 0, ::-1]
+    start = first - before[n, first]
+    end = first + after[n, first]
+    cols = np.arange(BOARD_SIZE)
+    main = np.zeros_like(new)
+    main[n, row] = (cols >= start[:, None]) & (cols <= end[:, None])
+
+    # New tiles are all in one row, so across they only touch old tiles
+    up, down, _, _ = cross_extents(occupied)
+    cross = new & ((up + down) > 0)
+
+    main = np.where(flip, main.transpose(0, 2, 1), main)
+    cross = np.where(flip, cross.transpose(0, 2, 1), cross)
+    return vertical, main, cross
+
+
+def move_scores(letters, new_letters, new_blanks):
+    """(N,) score of each move, the same as Board.score_move"""
+    _require_numpy()
+    new = new_letters > 0
+    _, main, cross = move_words(letters, new_letters)
+
+    # Only new tiles score, and only new tiles pick up premium squares
+    values = np.where(new_blanks, 0, LETTER_POINTS[new_letters]) * LETTER_MULTIPLIERS
+    values = np.where(new, values, 0)
+    word_multiplier = np.where(new, WORD_MULTIPLIERS, 1)
+
+    in_main = main & new
+    main_score = np.where(in_main, values, 0).sum(axis=(1, 2)) * np.where(
+        in_main, word_multiplier, 1
+    ).prod(axis=(1, 2))
+    cross_score = np.where(cross, values * word_multiplier, 0).sum(axis=(1, 2))
+    bingo = np.where(new.sum(axis=(1, 2)) == BINGO_SIZE, BINGO_BONUS, 0)
+    return main_score + cross_score + bingo
@@ -0,0 +1,118 @@
+"""
+Load test for the spectator hub: 1000 spectators on one game, in process,
+while moves are published faster than some of them can keep up.
+
+Most spectators take their frames straight away, some take SLOW_SEND seconds
+per frame and a few hang longer than the send timeout. Reports how many frames
+each group got, how many were coalesced, the delay from publish to send, and
+peak memory, which should stay flat however far the slow ones fall behind.
+
+Usage:
+    python -m backend.bench_broadcast [SPECTATORS]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+import tracemalloc
+
+from . import metrics
+from .bench_validation import crowded_board
+from .broadcast import BroadcastHub
+from .scrabble import WordList
+
+SPECTATORS = 1000
+PUBLISHES = 200
+PUBLISH_INTERVAL = 0.005
+SLOW_SHARE = 0.1
+SLOW_SEND = 0.05
+STUCK = 5
+SEND_TIMEOUT = 0.5
+
+
+async def run(spectators, state):
+    hub = BroadcastHub(send_timeout=SEND_TIMEOUT)
+    published = {}  # version -> publish time
+    lags = {"fast": [], "slow": [], "stuck": []}
+    frames = {"fast": 0, "slow": 0, "stuck": 0}
+
+    def spectator(kind):
+        subscription = hub.subscribe("bench")
+
+        async def send(frame):
+            lags[kind].append(time.perf_counter() - published[subscription.version])
+            if kind == "slow":
+                await asyncio.sleep(SLOW_SEND)
+            elif kind == "stuck":
+                await asyncio.sleep(SEND_TIMEOUT * 2)
+            frames[kind] += 1
+
+        return hub.serve(subscription, send)
+
+    kinds = ["stuck"] * STUCK
+    kinds += ["slow"] * int(spectators * SLOW_SHARE)
+    kinds += ["fast"] * (spectators - len(kinds))
+    tasks = [asyncio.create_task(spectator(kind)) for kind in kinds]
+    await asyncio.sleep(0)
+
+    publish_times = []
+    start = time.perf_counter()
+    for turn in range(PUBLISHES):
+        state["turn"] = turn
+        t = time.perf_counter()
+        version = hub.publish("bench", state)
+        published[version] = t
+        publish_times.append(time.perf_counter() - t)
+        await asyncio.sleep(PUBLISH_INTERVAL)
+    # Let the slow ones catch up with the last frame
+    await asyncio.sleep(SLOW_SEND * 2)
+    elapsed = time.perf_counter() - start
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return kinds, frames, lags, publish_times, elapsed
+
+
+def main():
+    spectators = int(sys.argv[1]) if len(sys.argv) > 1 else SPECTATORS
+    state = crowded_board(WordList.load_word_list(), 0).to_save_dict()
+    metrics.reset()
+
+    tracemalloc.start()
+    kinds, frames, lags, publish_times, elapsed = asyncio.run(run(spectators, state))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    counters = metrics.counters["scrabble_spectator_frames_total"]
+    result = {dict(k)["result"]: v for k, v in counters.items()}
+    print(
+        f"{spectators} spectators, {PUBLISHES} states published every "
+        f"{PUBLISH_INTERVAL * 1000:.0f}ms in {elapsed:.2f}s"
+    )
+    print(
+        f"publish: median {statistics.median(publish_times) * 1e6:.0f}us, "
+        f"max {max(publish_times) * 1e6:.0f}us (one encode for everyone)"
+    )
+    print(f"{'group':<6} {'count':>6} {'frames each':>12} {'lag p50':>9} {'p99':>9}")
+    for kind in ("fast", "slow", "stuck"):
+        count = kinds.count(kind)
+        if not count:
+            continue
+        ordered = sorted(lags[kind])
+        p50 = ordered[len(ordered) // 2]
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        print(
+            f"{kind:<6} {count:>6} {frames[kind] / count:>12.1f} "
+            f"{p50 * 1000:>7.1f}ms {p99 * 1000:>7.1f}ms"
+        )
+    print(
+        f"frames sent {result.get('sent', 0)}, coalesced {result.get('coalesced', 0)}, "
+        f"spectators dropped {result.get('dropped', 0)}"
+    )
+    print(f"peak traced memory {peak / 1e6:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Time the placement checks make_move runs (contiguity, touching an existing
+tile) and the anchor search, with the occupancy bitmasks against walking the
+board square by square, on crowded late-game boards.
+
+Usage:
+    python -m backend.bench_validation
+"""
+
+import random
+import time
+
+from .movegen import generate_moves
+from .scrabble import (BOARD_SIZE, STANDARD, Board, Player, Tile, WordList,
+                       create_tile_bag)
+
+BOARDS = 3
+# Greedy moves played before measuring, the bag is about empty by then
+MOVES_PLAYED = 14
+REPEAT = 20
+
+
+def scan_is_contiguous(board: Board, move: list[Tile]):
+    # How Board.is_contiguous worked before the bitmasks
+    xs = [t.x for t in move]
+    ys = [t.y for t in move]
+    new_positions = {(t.x, t.y) for t in move}
+    if len(set(xs)) == 1:
+        x = xs[0]
+        return all(
+            (x, y) in new_positions or board.board[y][x].letter
+            for y in range(min(ys), max(ys) + 1)
+        )
+    if len(set(ys)) == 1:
+        y = ys[0]
+        return all(
+            (x, y) in new_positions or board.board[y][x].letter
+            for x in range(min(xs), max(xs) + 1)
+        )
+    return False
+
+
+def scan_touches_existing_tile(board: Board, move: list[Tile]):
+    positions = {(t.x, t.y) for t in move}
+    for tile in move:
+        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+            x, y = tile.x + dx, tile.y + dy
+            if 0 <= x < 15 and 0 <= y < 15:
+                if (x, y) not in positions and board.board[y][x].letter:
+                    return True
+    return False
+
+
+def scan_anchors(board: Board, direction, line):
+    mask = 0
+    for i in range(BOARD_SIZE):
+        x, y = (i, line) if direction == "h" else (line, i)
+        if board.board[y][x].letter:
+            continue
+        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < BOARD_SIZE and 0 <= ny < BOARD_SIZE):
+                continue
+            if board.board[ny][nx].letter:
+                mask |= 1 << i
+                break
+    return mask
+
+
+def crowded_board(word_list, seed, variant=STANDARD):
+    random.seed(seed)
+    board = Board(
+        players=[Player(), Player()],
+        tile_bag=create_tile_bag(seed, variant),
+        variant=variant,
+    )
+    board.initialize(word_list)
+    for _ in range(MOVES_PLAYED):
+        best = max(generate_moves(board), key=lambda m: m.score, default=None)
+        board.make_move(best.tiles if best else [], board.current_player)
+    return board
+
+
+def probe_moves(board: Board, rng: random.Random):
+    """Legal moves, plus the same number of random (mostly illegal) lines"""
+    moves = [m.tiles for m in generate_moves(board)]
+    for _ in range(len(moves)):
+        length = rng.randint(1, 7)
+        line = rng.randrange(BOARD_SIZE)
+        start = rng.randrange(BOARD_SIZE - length + 1)
+        squares = [(start + i, line) for i in range(length)]
+        if rng.random() < 0.5:
+            squares = [(y, x) for x, y in squares]
+        moves.append([Tile(letter="E", x=x, y=y) for x, y in squares])
+    return moves
+
+
+def timed(fn):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    word_list = WordList.load_word_list()
+    rng = random.Random(0)
+
+    print(
+        f"{'board':<7} {'check':<22} {'moves':>6} {'bitmask':>10} {'scan':>10} "
+        f"{'speedup':>8}"
+    )
+    for seed in range(BOARDS):
+        board = crowded_board(word_list, seed)
+        moves = probe_moves(board, rng)
+        lines = [(d, line) for d in "hv" for line in range(BOARD_SIZE)]
+
+        checks = [
+            (
+                "is_contiguous",
+                len(moves),
+                lambda: [board.is_contiguous(m) for m in moves],
+                lambda: [scan_is_contiguous(board, m) for m in moves],
+            ),
+            (
+                "touches_existing_tile",
+                len(moves),
+                lambda: [board.touches_existing_tile(m, False) for m in moves],
+                lambda: [scan_touches_existing_tile(board, m) for m in moves],
+            ),
+            (
+                "anchors",
+                len(lines),
+                lambda: [board.anchors(d, line) for d, line in lines],
+                lambda: [scan_anchors(board, d, line) for d, line in lines],
+            ),
+        ]
+        filled = sum(bin(row).count("1") for row in board.rows)
+        for name, count, fast_fn, slow_fn in checks:
+            fast, fast_result = timed(fast_fn)
+            slow, slow_result = timed(slow_fn)
+            assert fast_result == slow_result, name
+            print(
+                f"{filled:>3} sq  {name:<22} {count:>6} {fast * 1000:>8.2f}ms "
+                f"{slow * 1000:>8.2f}ms {slow / fast:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
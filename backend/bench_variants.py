@@ -0,0 +1,63 @@
+"""
+Checks that making a move costs the same on a bigger board: times
+apply_move + undo_move (placement checks, word extraction, lookups, scoring
+and the hash update) for every legal move on crowded boards of each variant,
+grouped by how many tiles the move puts down. The per-move times should match
+across variants for the same move size, whatever the board area.
+
+Usage:
+    python -m backend.bench_variants
+"""
+
+import collections
+import time
+
+from .bench_validation import crowded_board
+from .movegen import generate_moves
+from .scrabble import VARIANTS, WordList
+
+BOARDS = 3
+REPEAT = 5
+
+
+def time_moves(board):
+    """{tiles in move: [seconds per apply + undo, ...]}"""
+    times = collections.defaultdict(list)
+    player = board.current_player
+    for move in generate_moves(board):
+        best = float("inf")
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            record = board.apply_move(move.tiles, player)
+            board.undo_move(record)
+            best = min(best, time.perf_counter() - start)
+        times[len(move.tiles)].append(best)
+    return times
+
+
+def main():
+    word_list = WordList.load_word_list()
+    results = {}
+    for name, variant in VARIANTS.items():
+        times = collections.defaultdict(list)
+        for seed in range(BOARDS):
+            board = crowded_board(word_list, seed, variant)
+            board.state_hash  # Keep the hash updated, like the server does
+            for size, samples in time_moves(board).items():
+                times[size] += samples
+        results[name] = times
+
+    names = list(results)
+    print(f"{'tiles':>5} " + " ".join(f"{name + ' us':>14} {'moves':>6}" for name in names))
+    sizes = sorted(set().union(*(times.keys() for times in results.values())))
+    for size in sizes:
+        row = []
+        for name in names:
+            samples = sorted(results[name].get(size, []))
+            median = samples[len(samples) // 2] * 1e6 if samples else float("nan")
+            row.append(f"{median:>14.1f} {len(samples):>6}")
+        print(f"{size:>5} " + " ".join(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Compare PatternIndex.search against a linear scan of the word list.
+
+Usage:
+    python -m backend.bench_wordsearch
+"""
+
+import time
+
+from .scrabble import WordList
+from .wordsearch import brute_force_search
+
+QUERIES = [
+    dict(pattern="QU*"),
+    dict(pattern="C?T*", max_length=6),
+    dict(pattern="*ING"),
+    dict(pattern="*Z*Z*"),
+    dict(pattern="??", rack="QI"),
+    dict(pattern="C?T*", rack="AEST_", limit=20),
+    dict(pattern="???????", rack="RETAINS"),
+    dict(pattern="*", rack="RETAINS"),
+]
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = list(fn())
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    word_list = WordList.load_word_list()
+
+    start = time.perf_counter()
+    index = word_list.pattern_index
+    print(f"Index built in {time.perf_counter() - start:.2f}s")
+
+    print(f"{'query':<45} {'results':>8} {'indexed':>10} {'scan':>10} {'speedup':>8}")
+    for query in QUERIES:
+        fast, fast_result = timed(lambda: index.search(**query), 20)
+        slow, slow_result = timed(
+            lambda: brute_force_search(word_list.word_list, **query), 2
+        )
+        assert fast_result == slow_result, query
+
+        label = ", ".join(f"{k}={v}" for k, v in query.items())
+        print(
+            f"{label:<45} {len(fast_result):>8} {fast * 1000:>8.2f}ms "
+            f"{slow * 1000:>8.1f}ms {slow / fast:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
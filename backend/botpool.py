@@ -0,0 +1,213 @@
+"""
+Server-side bots: seats marked as bots in /start are played by the server
+instead of by a client process.
+
+Whenever the turn passes to a bot seat the server queues a job. The move is
+searched for in a process pool (workers load the word list once), so the
+event loop keeps serving requests meanwhile. The result is committed back in
+the server: the game is reloaded, and if it is still the same game (same
+start id, new on every /start) and position (same state hash) the move is
+played, saved, published to spectators and announced on the pub/sub channel
+the clients listen on. If the next seat is a bot too, the next job is queued
+straight away.
+
+First moves come from the opening book (opening.py) when there is one. Each
+move has a time limit. A job that doesn't come back in time, or whose search
+fails (a worker crashed, say), passes instead, so one bad search can't hold up
+the game. If the job fails anywhere else (Redis down) it is logged and tried
+again RETRY_DELAY seconds later, up to ATTEMPTS times.
+
+With workers=0 the search runs in a thread instead, which is what the tests
+use.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from . import metrics, opening, scrabble
+from .movegen import stream_top_moves
+from .scrabble import STANDARD, Board, WordList
+from .simbot import SimBot, tiles_from_locations
+
+TIME_LIMIT = float(os.getenv("SCRABBLE_BOT_TIME_LIMIT", 5))
+WORKERS = int(os.getenv("SCRABBLE_BOT_WORKERS", os.cpu_count() or 1))
+# Extra time on top of the limit before a job is given up on
+GRACE = 1.0
+# The channel frontend/client.py waits on for its turn
+PUB_SUB_KEY = "scrabble:pubsub"
+ATTEMPTS = 3
+RETRY_DELAY = 5.0
+
+log = logging.getLogger(__name__)
+
+_WORKER_WORD_LIST = None
+
+
+def _init_worker():
+    global _WORKER_WORD_LIST
+    _WORKER_WORD_LIST = WordList.load_word_list()
+    _WORKER_WORD_LIST.pattern_index
+    _WORKER_WORD_LIST.anagram_index
+
+
+def find_move(state, word_list, player_index, bot, time_limit) -> list[dict]:
+    """Locations of the bot's move, [] to pass"""
+    board = Board.from_save_dict(state, word_list)
+    hand = board.players[player_index].word_bank
+    book = opening.default_book()
+    # The book is for the standard board and tiles only
+    if board.is_first_word and board.variant is STANDARD and book is not None:
+        try:
+            move = book.lookup(hand, board.variant)
+            return move.to_locations() if move else []
+        except KeyError:
+            pass  # Not in the book, search as usual
+
+    if bot == "sim":
+        sim = SimBot(word_list, time_budget=time_limit, workers=0)
+        move = sim.choose_move(board, player_index)
+    else:
+        *_, (_, best, _) = stream_top_moves(board, hand, 1, time.monotonic() + time_limit)
+        move = best[0] if best else None
+    return move.to_locations() if move else []
+
+
+def _worker_find_move(state, player_index, bot, time_limit):
+    return find_move(state, _WORKER_WORD_LIST, player_index, bot, time_limit)
+
+
+class BotPool:
+    def __init__(
+        self,
+        word_list: WordList,
+        on_move=None,
+        workers=WORKERS,
+        time_limit=TIME_LIMIT,
+        audit=None,
+    ):
+        self.word_list = word_list
+        # Called with (game_id, board) after every saved bot move
+        self.on_move = on_move
+        # An audit.AuditLog, bot moves are recorded like everyone else's
+        self.audit = audit
+        self.workers = workers
+        self.time_limit = time_limit
+        self._executor = None
+        # (game id, start id, state hash) -> the task playing that bot turn
+        self.jobs = {}
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker
+            )
+        return self._executor
+
+    def close(self):
+        for task in self.jobs.values():
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def update_gauge(self):
+        metrics.set_gauge("scrabble_bot_queue_depth", len(self.jobs))
+
+    def schedule(self, game_id: str, board: Board):
+        """Queue a job if it is a bot's turn. Returns the task, or None"""
+        if board.is_game_over or board.current_player.bot is None:
+            return None
+        key = (game_id, board.start_id, board.state_hash)
+        if key not in self.jobs:
+            self.jobs[key] = asyncio.create_task(self.play_turn(*key))
+            self.jobs[key].add_done_callback(lambda _: self._finished(key))
+            self.update_gauge()
+        return self.jobs[key]
+
+    def _finished(self, key):
+        self.jobs.pop(key, None)
+        self.update_gauge()
+
+    async def search(self, state, player_index, bot):
+        if self.workers == 0:
+            return await asyncio.to_thread(
+                find_move, state, self.word_list, player_index, bot, self.time_limit
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, _worker_find_move, state, player_index, bot, self.time_limit
+        )
+
+    async def play_turn(self, game_id: str, start_id: str | None, state_hash: int):
+        # Nothing else would ever play this seat, so a failed job is retried
+        for attempt in range(1, ATTEMPTS + 1):
+            try:
+                return await self._play_turn(game_id, start_id, state_hash)
+            except Exception:
+                log.exception("Bot turn in game %r failed, attempt %d", game_id, attempt)
+                metrics.inc("scrabble_bot_moves_total", bot="unknown", result="error")
+            if attempt < ATTEMPTS:
+                await asyncio.sleep(RETRY_DELAY)
+
+    def is_current(self, board: Board, start_id, state_hash) -> bool:
+        return board.start_id == start_id and board.state_hash == state_hash
+
+    async def _play_turn(self, game_id: str, start_id: str | None, state_hash: int):
+        board = await Board.load_from_redis(self.word_list, game_id)
+        if not self.is_current(board, start_id, state_hash):
+            return  # Reset or moved on before the job started
+        player_index = board.players.index(board.current_player)
+        bot = board.current_player.bot
+
+        start = time.perf_counter()
+        try:
+            locations = await asyncio.wait_for(
+                self.search(board.to_save_dict(), player_index, bot),
+                self.time_limit + GRACE,
+            )
+            result = "played" if locations else "passed"
+        except asyncio.TimeoutError:
+            locations, result = [], "timeout"
+        except Exception as exc:
+            log.exception("Bot search in game %r failed, passing", game_id)
+            if isinstance(exc, BrokenProcessPool) and self._executor is not None:
+                # A crashed worker breaks the whole pool, start a new one
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            locations, result = [], "error"
+        metrics.observe("scrabble_bot_move_seconds", time.perf_counter() - start, bot=bot)
+
+        # The game may have been reset or moved on while we were thinking
+        board = await Board.load_from_redis(self.word_list, game_id)
+        if not self.is_current(board, start_id, state_hash):
+            metrics.inc("scrabble_bot_moves_total", bot=bot, result="stale")
+            return
+        reason = None
+        try:
+            board.make_move(tiles_from_locations(locations), board.current_player)
+        except ValueError as exc:
+            # Shouldn't happen, the search only finds legal moves
+            board.make_move([], board.current_player)
+            result, reason = "rejected", str(exc)
+        metrics.inc("scrabble_bot_moves_total", bot=bot, result=result)
+
+        await board.save_to_redis(game_id)
+        if self.audit is not None:
+            self.audit.record(
+                game_id,
+                player_index,
+                locations,
+                reason is None,
+                reason,
+                time.perf_counter() - start,
+                bot=bot,
+            )
+        if self.on_move is not None:
+            self.on_move(game_id, board)
+        await scrabble.rd.publish(PUB_SUB_KEY, f"Player {player_index} made a move")
+        self.schedule(game_id, board)
@@ -0,0 +1,115 @@
+"""
+Fan-out of game states to spectators (GET /spectate, a websocket).
+
+Every game being watched has one Channel that holds only the newest frame: the
+state JSON, encoded once, and a version number that goes up on every publish.
+A spectator remembers the last version it was sent and waits for a newer one.
+There are no per-spectator queues, so a slow spectator never piles up frames:
+when it is ready again it gets the newest state and everything in between is
+skipped (counted as coalesced). Memory is one frame per watched game, however
+many spectators there are and however far behind they fall.
+
+Spectators whose send takes longer than SEND_TIMEOUT are disconnected
+(counted as dropped). Games nobody is watching aren't encoded at all.
+
+The hub lives in the server process. With several server processes each one
+only sees the moves it handled itself.
+"""
+
+import asyncio
+import json
+import os
+
+from . import metrics
+
+SEND_TIMEOUT = float(os.getenv("SCRABBLE_SPECTATOR_SEND_TIMEOUT", 5))
+
+
+class Channel:
+    def __init__(self):
+        self.version = 0
+        self.frame = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+
+    def publish(self, frame: str):
+        self.version += 1
+        self.frame = frame
+        # Wake everyone waiting on the old event, later waiters get a new one
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_newer(self, version):
+        while self.version <= version:
+            await self._changed.wait()
+
+
+class Subscription:
+    def __init__(self, hub: "BroadcastHub", game_id: str):
+        self.hub = hub
+        self.game_id = game_id
+        self.channel = hub.channels.setdefault(game_id, Channel())
+        self.channel.subscribers += 1
+        self.version = 0
+        self.closed = False
+        hub.update_gauge()
+
+    async def next(self) -> str:
+        """The newest frame after the last one returned, waits if there is none"""
+        await self.channel.wait_newer(self.version)
+        skipped = self.channel.version - self.version - 1
+        if self.version and skipped:
+            metrics.inc("scrabble_spectator_frames_total", skipped, result="coalesced")
+        self.version = self.channel.version
+        return self.channel.frame
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.channel.subscribers -= 1
+        if not self.channel.subscribers:
+            self.hub.channels.pop(self.game_id, None)
+        self.hub.update_gauge()
+
+
+class BroadcastHub:
+    def __init__(self, send_timeout=SEND_TIMEOUT):
+        self.send_timeout = send_timeout
+        # game id -> Channel, only for games with spectators
+        self.channels = {}
+
+    def subscribe(self, game_id: str) -> Subscription:
+        return Subscription(self, game_id)
+
+    def publish(self, game_id: str, state: dict) -> int:
+        """Hand the new state to the game's spectators, returns its version"""
+        channel = self.channels.get(game_id)
+        if channel is None:
+            return 0
+        channel.publish(json.dumps(state))
+        return channel.version
+
+    @property
+    def spectators(self):
+        return sum(c.subscribers for c in self.channels.values())
+
+    def update_gauge(self):
+        metrics.set_gauge("scrabble_spectators", self.spectators)
+
+    async def serve(self, subscription: Subscription, send):
+        """
+        Send frames with `send` (a coroutine function taking the frame) until
+        it fails or is too slow. Closes the subscription at the end
+        """
+        try:
+            while True:
+                frame = await subscription.next()
+                try:
+                    await asyncio.wait_for(send(frame), self.send_timeout)
+                except asyncio.TimeoutError:
+                    metrics.inc("scrabble_spectator_frames_total", result="dropped")
+                    return
+                metrics.inc("scrabble_spectator_frames_total", result="sent")
+        finally:
+            subscription.close()
@@ -0,0 +1,190 @@
+"""
+Endgame solver for two player games once the tile bag is empty.
+
+With the bag empty both racks are known, so the rest of the game can be
+searched exactly. We run iterative-deepening negamax with alpha-beta over
+every legal move plus passing, letting Board.apply_move apply the end of game
+rules: the finalize_scores penalty and bonus when someone goes out, and game
+over after consecutive_passes reaches two passes per player. Moves are played
+on one board and taken back with Board.undo_move, so nothing gets copied.
+
+Values are the future score difference for the player to move, not counting
+points already scored, so a position reached by different move orders shares
+one transposition table entry.
+"""
+
+import dataclasses
+import math
+import time
+
+from .movegen import Move, generate_moves
+from .scrabble import Board
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+@dataclasses.dataclass
+class EndgameResult:
+    move: Move | None  # None is a pass
+    value: float  # Final score difference for the player to move
+    depth: int
+    nodes: int
+    complete: bool  # True if the search reached the end of every line
+
+
+def move_key(move: Move | None):
+    if move is None:
+        return None
+    return tuple(sorted((t.x, t.y, t.letter, t.is_blank) for t in move.tiles))
+
+
+def clone(board: Board) -> Board:
+    child = Board.from_save_dict(board.to_save_dict(), board.word_list)
+    # Same position, so make_move can keep updating the hash from here
+    child._zobrist = board.state_hash
+    return child
+
+
+class EndgameSolver:
+    def __init__(self, time_budget=5.0, max_moves=None, max_depth=20):
+        self.time_budget = time_budget
+        # Only search this many moves per position (best scoring first)
+        self.max_moves = max_moves
+        self.max_depth = max_depth
+
+        # {state hash: (depth, value, flag, best move key)}
+        self.table = {}
+        self.nodes = 0
+        self.deadline = None
+        self.hit_horizon = False
+
+    def moves(self, board: Board, first=None):
+        moves = sorted(generate_moves(board), key=lambda m: m.score, reverse=True)
+        if self.max_moves is not None:
+            moves = moves[: self.max_moves]
+        moves.append(None)  # Passing is always legal
+        if first is not None:
+            moves.sort(key=lambda m: move_key(m) != first)
+        return moves
+
+    def play(self, board: Board, move: Move | None):
+        """
+        Apply move in place, returning the undo record and the score swing it
+        gave the player who moved
+        """
+        record = board.apply_move(
+            [] if move is None else list(move.tiles), board.current_player
+        )
+        mover = record.player
+        gained = [p.score - s for p, s in zip(board.players, record.scores)]
+        return record, gained[mover] - gained[1 - mover]
+
+    def evaluate(self, board: Board):
+        # Out of depth: score it as if both players got stuck with their tiles
+        me = board.current_player
+        other = board.players[1 - board.players.index(me)]
+        return sum(t.points for t in other.word_bank.hand) - sum(
+            t.points for t in me.word_bank.hand
+        )
+
+    def negamax(self, board: Board, depth, alpha, beta):
+        self.nodes += 1
+        if time.monotonic() > self.deadline:
+            raise _OutOfTime
+
+        key = board.state_hash
+        entry = self.table.get(key)
+        first = None
+        if entry is not None:
+            entry_depth, value, flag, first = entry
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return value
+                if flag == LOWER:
+                    alpha = max(alpha, value)
+                elif flag == UPPER:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        if depth == 0:
+            self.hit_horizon = True
+            return self.evaluate(board)
+
+        original_alpha = alpha
+        best_value = -math.inf
+        best_key = None
+        for move in self.moves(board, first):
+            record, swing = self.play(board, move)
+            try:
+                if board.is_game_over:
+                    value = swing
+                else:
+                    value = swing - self.negamax(
+                        board, depth - 1, swing - beta, swing - alpha
+                    )
+            finally:
+                board.undo_move(record)
+
+            if value > best_value:
+                best_value = value
+                best_key = move_key(move)
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        if best_value <= original_alpha:
+            flag = UPPER
+        elif best_value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table[key] = (depth, best_value, flag, best_key)
+        return best_value
+
+    def solve(self, board: Board) -> EndgameResult:
+        if len(board.players) != 2:
+            raise ValueError("The endgame solver only handles two player games")
+        if len(board.tile_bag) != 0:
+            raise ValueError("The endgame solver needs an empty tile bag")
+        if board.is_game_over:
+            raise ValueError("Game is already over")
+
+        # The search plays moves on the board and takes them back, so work on
+        # a copy in case it stops halfway through
+        board = clone(board)
+        self.deadline = time.monotonic() + self.time_budget
+        self.nodes = 0
+        me = board.players.index(board.current_player)
+        current = board.players[me].score - board.players[1 - me].score
+
+        result = None
+        for depth in range(1, self.max_depth + 1):
+            self.hit_horizon = False
+            try:
+                value = self.negamax(board, depth, -math.inf, math.inf)
+            except _OutOfTime:
+                break
+            best_key = self.table[board.state_hash][3]
+            best = next(
+                (m for m in self.moves(board) if move_key(m) == best_key), None
+            )
+            result = EndgameResult(
+                move=best,
+                value=current + value,
+                depth=depth,
+                nodes=self.nodes,
+                complete=not self.hit_horizon,
+            )
+            if result.complete:
+                break
+
+        if result is None:
+            # Didn't finish even one ply, fall back to the top scoring move
+            moves = self.moves(board)
+            result = EndgameResult(moves[0], current, 0, self.nodes, False)
+        return result
@@ -0,0 +1,318 @@
+"""
+Load generator for the game API.
+
+Plays N games at once against the server and reports throughput, latency
+percentiles per endpoint, and error and conflict rates. By default the app
+runs in this process through httpx.ASGITransport, with InMemoryRedis standing
+in for Redis, so nothing needs to be running. Pass --url to drive a real
+server (uvicorn) instead, which then uses its own Redis.
+
+Each game is started with its own game_id and seed, then every turn the
+harness fetches /state and plays for the current player:
+
+- pass: always pass, which measures the API itself
+- greedy: the top scoring move, searched here in a thread
+- hints: the top move from GET /hints, so the server does the search
+
+With --watchers N, after every turn N more clients fetch /state at the same
+moment, like the clients and UIs that all wake up on the pub/sub message
+after a move. The server coalesces those into one Redis fetch per game (see
+singleflight.py); --no-coalesce turns that off to compare the Redis ops.
+
+An error is a failed request (exception or status >= 400). A conflict is a
+move the server turned down ("success": false), e.g. when --clients is above 1
+and two clients race for the same turn. If more than one of those racing
+moves is accepted, the extra ones are counted as lost updates: each request
+loaded the same state, so the last save wins.
+
+In process, the server and the harness share the CPU, so absolute numbers are
+lower than against a separate server; use it to compare changes.
+
+Usage:
+    python -m backend.loadtest --games 50 --turns 20 --moves greedy
+    python -m backend.loadtest --url http://localhost:8000 --games 20
+    python -m backend.loadtest --moves pass --watchers 20 [--no-coalesce]
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import time
+
+import httpx
+
+from . import metrics, scrabble
+
+ENDPOINTS = ("/start", "/state", "/make_move", "/hints")
+
+
+class InMemoryRedis:
+    """
+    Stands in for redis.asyncio in the server: JSON get/set (stored encoded,
+    so loads and saves pay for serialization like the real thing), exists,
+    publish and pipelined XADD.
+    Counts every operation in `ops`. Each one waits `latency` seconds, like a
+    round trip would, so other requests get to run meanwhile.
+    """
+
+    def __init__(self, latency=0.0):
+        self.data = {}
+        self.published = []
+        self.streams = collections.defaultdict(list)
+        self.ops = collections.Counter()
+        self.latency = latency
+
+    def json(self):
+        return self
+
+    async def get(self, key):
+        self.ops["json.get"] += 1
+        await asyncio.sleep(self.latency)
+        value = self.data.get(key)
+        return None if value is None else json.loads(value)
+
+    async def set(self, key, path, value):
+        self.ops["json.set"] += 1
+        await asyncio.sleep(self.latency)
+        self.data[key] = json.dumps(value)
+        return True
+
+    async def exists(self, *keys):
+        self.ops["exists"] += 1
+        await asyncio.sleep(self.latency)
+        return sum(key in self.data for key in keys)
+
+    async def publish(self, channel, message):
+        self.ops["publish"] += 1
+        await asyncio.sleep(self.latency)
+        self.published.append((channel, message))
+        return 0
+
+    def pipeline(self, transaction=True):
+        return InMemoryPipeline(self)
+
+
+class InMemoryPipeline:
+    """Buffers XADDs until execute(), which is one round trip"""
+
+    def __init__(self, redis: InMemoryRedis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.commands = []
+
+    def xadd(self, name, fields, maxlen=None, approximate=True):
+        self.commands.append((name, fields, maxlen))
+        return self
+
+    async def execute(self):
+        self.redis.ops["pipeline"] += 1
+        await asyncio.sleep(self.redis.latency)
+        for name, fields, maxlen in self.commands:
+            self.redis.ops["xadd"] += 1
+            stream = self.redis.streams[name]
+            stream.append(fields)
+            if maxlen is not None and len(stream) > maxlen:
+                del stream[: len(stream) - maxlen]
+        results, self.commands = [True] * len(self.commands), []
+        return results
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self.moves = 0
+        self.conflicts = 0
+        self.lost_updates = 0
+
+    async def request(self, client, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.errors[path] += 1
+            return None
+        finally:
+            self.latencies[path].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[path] += 1
+            return None
+        return response
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def top_hint(client, recorder, game_id, player):
+    response = await recorder.request(
+        client, "GET", "/hints", params={"player": player, "k": 1, "game_id": game_id}
+    )
+    if response is None:
+        return []
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    done = lines[-1] if lines else {}
+    return done["moves"][0]["locations"] if done.get("moves") else []
+
+
+def top_move(state, word_list):
+    from .movegen import generate_moves
+
+    board = scrabble.Board.from_save_dict(state, word_list)
+    best = max(generate_moves(board), key=lambda m: m.score, default=None)
+    return best.to_locations() if best else []
+
+
+async def play_game(client, recorder, game_id, seed, args, word_list):
+    params = {"game_id": game_id}
+    response = await recorder.request(
+        client, "POST", "/start", params=params, json={"num_players": 2, "seed": seed}
+    )
+    if response is None:
+        return
+
+    for _ in range(args.turns):
+        response = await recorder.request(client, "GET", "/state", params=params)
+        if response is None:
+            continue
+        state = response.json()
+        if state["is_game_over"]:
+            break
+        player = state["current_player"]
+
+        if args.moves == "greedy":
+            locations = await asyncio.to_thread(top_move, state, word_list)
+        elif args.moves == "hints":
+            locations = await top_hint(client, recorder, game_id, player)
+        else:
+            locations = []
+
+        # Several clients of the same game all try to play this turn
+        responses = await asyncio.gather(
+            *(
+                recorder.request(
+                    client,
+                    "POST",
+                    "/make_move",
+                    params=params,
+                    json={"locations": locations, "player_index": player},
+                )
+                for _ in range(args.clients)
+            )
+        )
+        accepted = 0
+        for response in responses:
+            if response is None:
+                continue
+            recorder.moves += 1
+            if response.json().get("success"):
+                accepted += 1
+            else:
+                recorder.conflicts += 1
+        recorder.lost_updates += max(0, accepted - 1)
+
+        # Everyone hears about the move at once and reloads
+        await asyncio.gather(
+            *(
+                recorder.request(client, "GET", "/state", params=params)
+                for _ in range(args.watchers)
+            )
+        )
+
+
+async def run(args) -> tuple[Recorder, float, InMemoryRedis | None]:
+    fake = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        fake = scrabble.rd = InMemoryRedis(args.redis_latency / 1000)
+        from .server import AUDIT, STATES, app
+
+        STATES.enabled = not args.no_coalesce
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=60
+        )
+
+    word_list = scrabble.WordList.load_word_list() if args.moves == "greedy" else None
+    recorder = Recorder()
+    async with client:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                play_game(client, recorder, f"load-{i}", i, args, word_list)
+                for i in range(args.games)
+            )
+        )
+        elapsed = time.perf_counter() - start
+    if fake is not None:
+        # So the report counts the audit log's writes too
+        await AUDIT.flush()
+    return recorder, elapsed, fake
+
+
+def report(recorder: Recorder, elapsed, fake=None):
+    requests = sum(len(v) for v in recorder.latencies.values())
+    print(
+        f"{requests} requests in {elapsed:.2f}s: {requests / elapsed:.1f} req/s, "
+        f"{recorder.moves / elapsed:.1f} moves/s"
+    )
+    print(
+        f"{'endpoint':<11} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}"
+    )
+    for endpoint in ENDPOINTS:
+        samples = sorted(recorder.latencies.get(endpoint, []))
+        if not samples:
+            continue
+        p50, p95, p99 = (percentile(samples, q) * 1000 for q in (0.5, 0.95, 0.99))
+        errors = recorder.errors[endpoint] / len(samples)
+        print(
+            f"{endpoint:<11} {len(samples):>7} {p50:>7.1f}ms {p95:>7.1f}ms "
+            f"{p99:>7.1f}ms {errors:>6.1%}"
+        )
+    conflicts = recorder.conflicts / recorder.moves if recorder.moves else 0.0
+    print(
+        f"moves {recorder.moves}, conflicts {recorder.conflicts} ({conflicts:.1%}), "
+        f"lost updates {recorder.lost_updates}"
+    )
+    if fake is not None:
+        print("redis ops: " + ", ".join(f"{k} {v}" for k, v in sorted(fake.ops.items())))
+        loads = {
+            dict(labels)["result"]: count
+            for labels, count in metrics.counters.get("scrabble_coalesced_loads_total", {}).items()
+        }
+        if loads:
+            print(f"state loads: {loads.get('loaded', 0)}, joined {loads.get('joined', 0)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the game API")
+    parser.add_argument("--games", type=int, default=20, help="Games played at once")
+    parser.add_argument("--turns", type=int, default=20, help="Turns per game at most")
+    parser.add_argument("--moves", choices=["pass", "greedy", "hints"], default="greedy")
+    parser.add_argument(
+        "--clients", type=int, default=1, help="Clients submitting each turn"
+    )
+    parser.add_argument(
+        "--watchers", type=int, default=0, help="Extra /state requests after each turn"
+    )
+    parser.add_argument("--url", help="Server to drive, default in process")
+    parser.add_argument(
+        "--redis-latency", type=float, default=0.2, help="In process, ms per Redis op"
+    )
+    parser.add_argument(
+        "--no-coalesce", action="store_true", help="In process, one load per /state"
+    )
+    args = parser.parse_args(argv)
+
+    report(*asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
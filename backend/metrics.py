@@ -0,0 +1,223 @@
+"""
+Timing hooks and counters for the server, rendered in the Prometheus text
+format for GET /metrics.
+
+Set SCRABBLE_METRICS=0 to turn everything off. When off, timer() hands back
+a shared no-op context manager and inc() returns straight away, so the hooks
+left in the hot paths cost one function call.
+"""
+
+import bisect
+import collections
+import contextlib
+import os
+import time
+
+ENABLED = os.getenv("SCRABBLE_METRICS", "1") != "0"
+
+# Upper bounds in seconds. Most phases are well under a millisecond, so the
+# low end is dense.
+BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Latency summaries keep this many recent samples to compute quantiles from
+SUMMARY_WINDOW = 1024
+
+HELP = {
+    "scrabble_phase_seconds": "Time spent in each phase of handling a move",
+    "scrabble_redis_seconds": "Redis round trip time",
+    "scrabble_request_seconds": "Request latency by endpoint",
+    "scrabble_requests_total": "Requests handled by endpoint",
+    "scrabble_moves_total": "Moves by result (accepted/rejected)",
+    "scrabble_spectators": "Spectators connected to /spectate",
+    "scrabble_spectator_frames_total": "Spectator frames by result (sent/coalesced/dropped)",
+    "scrabble_bot_queue_depth": "Bot turns queued or being searched",
+    "scrabble_bot_move_seconds": "Time to find a server-side bot move",
+    "scrabble_bot_moves_total": "Server-side bot moves by result",
+    "scrabble_games_archived_total": "Finished games archived, or lost to an error",
+    "scrabble_coalesced_loads_total": "Loads started, or joined while in flight",
+    "scrabble_audit_queue_depth": "Audit records waiting to be written",
+    "scrabble_audit_records_total": "Audit records written, or lost to a sink error",
+    "scrabble_audit_dropped_total": "Audit records dropped because the queue was full",
+    "scrabble_profiles_total": "Request profiles written, or lost to an error",
+}
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Summary:
+    def __init__(self, window=SUMMARY_WINDOW):
+        self.samples = collections.deque(maxlen=window)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        if not self.samples:
+            return float("nan")
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# {metric name: {label tuple: Histogram | Summary | int}}
+histograms = collections.defaultdict(dict)
+summaries = collections.defaultdict(dict)
+counters = collections.defaultdict(dict)
+gauges = collections.defaultdict(dict)
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(metric, value, **labels):
+    if not ENABLED:
+        return
+    key = _key(labels)
+    hist = histograms[metric].get(key)
+    if hist is None:
+        hist = histograms[metric][key] = Histogram()
+    hist.observe(value)
+
+
+def observe_summary(metric, value, **labels):
+    if not ENABLED:
+        return
+    key = _key(labels)
+    summary = summaries[metric].get(key)
+    if summary is None:
+        summary = summaries[metric][key] = Summary()
+    summary.observe(value)
+
+
+def inc(metric, amount=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(labels)
+    counters[metric][key] = counters[metric].get(key, 0) + amount
+
+
+def set_gauge(metric, value, **labels):
+    if not ENABLED:
+        return
+    gauges[metric][_key(labels)] = value
+
+
+@contextlib.contextmanager
+def _timer(metric, labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(metric, time.perf_counter() - start, **labels)
+
+
+def timer(metric, **labels):
+    """Time the body of a with block into the histogram `metric`"""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _timer(metric, labels)
+
+
+def phase(name):
+    return timer("scrabble_phase_seconds", phase=name)
+
+
+def reset():
+    histograms.clear()
+    summaries.clear()
+    counters.clear()
+    gauges.clear()
+
+
+def _escape(value):
+    # The exposition format only allows these three escapes in label values
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, **extra):
+    items = list(key) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Render every metric in the Prometheus text exposition format"""
+    lines = []
+
+    def header(metric, kind):
+        if metric in HELP:
+            lines.append(f"# HELP {metric} {HELP[metric]}")
+        lines.append(f"# TYPE {metric} {kind}")
+
+    for metric, series in sorted(counters.items()):
+        header(metric, "counter")
+        for key, value in sorted(series.items()):
+            lines.append(f"{metric}{_format_labels(key)} {value}")
+
+    for metric, series in sorted(gauges.items()):
+        header(metric, "gauge")
+        for key, value in sorted(series.items()):
+            lines.append(f"{metric}{_format_labels(key)} {_format_value(value)}")
+
+    for metric, series in sorted(histograms.items()):
+        header(metric, "histogram")
+        for key, hist in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(hist.buckets + (float("inf"),), hist.counts):
+                cumulative += count
+                le = _format_labels(key, le=_format_value(float(bound)))
+                lines.append(f"{metric}_bucket{le} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(key)} {hist.sum!r}")
+            lines.append(f"{metric}_count{_format_labels(key)} {hist.count}")
+
+    for metric, series in sorted(summaries.items()):
+        header(metric, "summary")
+        for key, summary in sorted(series.items()):
+            for q in QUANTILES:
+                labels = _format_labels(key, quantile=q)
+                lines.append(f"{metric}{labels} {summary.quantile(q)!r}")
+            lines.append(f"{metric}_sum{_format_labels(key)} {summary.sum!r}")
+            lines.append(f"{metric}_count{_format_labels(key)} {summary.count}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,351 @@
+"""
+Legal move generation for a rack on a Board.
+
+Every row and column is cut into segments that could hold one word: a run of
+squares with no letter just before or after it, holding between one and
+len(rack) empty squares and touching the existing tiles (or covering the
+center on the first move). For each segment we look up the words that fit:
+
+- Segments with no board letters and no neighbours (only on the first move)
+  take every word the rack can make, from the anagram index.
+- Everything else is a query on the pattern index: board letters pin their
+  positions, and an empty square next to a perpendicular word only allows the
+  letters that make that cross word valid.
+
+The moves that come out are the ones Board.make_move accepts, including its
+rule that a single tile is read as a vertical word.
+"""
+
+import collections
+import dataclasses
+import functools
+import heapq
+import time
+
+from .anagram import ALPHABET
+from .scrabble import BLANK_SLOT, RACK_SIZE, Board, Tile, TileBank
+from .wordsearch import WILDCARD, PatternIndex, _bit_indices
+
+LETTER_MULTIPLIER = {"DLS": 2, "TLS": 3}
+
+
+@dataclasses.dataclass
+class Move:
+    tiles: list[Tile]
+    score: int
+    word: str
+    x: int
+    y: int
+    direction: str  # "h" or "v"
+    words: list[str] = dataclasses.field(default_factory=list)
+    rack_size: int = RACK_SIZE  # Of the board's variant, playing all of them is a bingo
+
+    @property
+    def is_bingo(self):
+        return len(self.tiles) == self.rack_size
+
+    def to_locations(self):
+        # Same shape as the /make_move payload
+        return [
+            {"letter": t.letter, "x": t.x, "y": t.y, "is_blank": t.is_blank}
+            for t in self.tiles
+        ]
+
+    def to_dict(self):
+        return {
+            "word": self.word,
+            "x": self.x,
+            "y": self.y,
+            "direction": self.direction,
+            "score": self.score,
+            "words": self.words,
+            "locations": self.to_locations(),
+        }
+
+
+def rack_string(hand: list[Tile]) -> str:
+    return "".join("_" if t.is_blank else t.letter.upper() for t in hand)
+
+
+# The helpers below only depend on the word list, so they are cached across
+# calls. Searches generate moves for thousands of similar positions.
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def cross_letters(index: PatternIndex, prefix: str, suffix: str) -> frozenset:
+    """Letters that can go between prefix and suffix to make a word"""
+    length = len(prefix) + 1 + len(suffix)
+    bucket = index.by_length.get(length, [])
+    mask = index.candidates(prefix + WILDCARD + suffix, length)
+    return frozenset(bucket[i][len(prefix)] for i in _bit_indices(mask))
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def allowed_mask(index: PatternIndex, length, pos, allowed: frozenset) -> int:
+    mask = 0
+    for letter in allowed:
+        mask |= index.positions.get((length, pos, letter), 0)
+    return mask
+
+
+@functools.lru_cache(maxsize=1 << 14)
+def usable_mask(index: PatternIndex, length, usable: frozenset, blanks) -> int:
+    """
+    Words that use at most one letter outside `usable` per blank. It's a quick
+    filter; letter counts are checked word by word afterwards.
+    """
+    # levels[n] = words with exactly n different letters from outside
+    levels = [(1 << len(index.by_length[length])) - 1]
+    for letter in ALPHABET:
+        if letter in usable:
+            continue
+        has = index.contains.get((length, letter), 0)
+        if not has:
+            continue
+        levels = [levels[0] & ~has] + [
+            (levels[n] & ~has if n < len(levels) else 0) | (levels[n - 1] & has)
+            for n in range(1, min(len(levels), blanks) + 1)
+        ]
+    mask = 0
+    for level in levels:
+        mask |= level
+    return mask
+
+
+class MoveGenerator:
+    def __init__(self, board: Board, hand: TileBank | list[Tile]):
+        self.board = board
+        self.word_list = board.word_list
+        self.index = board.word_list.pattern_index
+
+        # A player's TileBank already has the letter counts
+        bank = hand if isinstance(hand, TileBank) else TileBank(hand=list(hand))
+        self.rack = collections.Counter(
+            {ALPHABET[slot]: n for slot, n in enumerate(bank.counts[:BLANK_SLOT]) if n}
+        )
+        self.blanks = bank.counts[BLANK_SLOT]
+        self.rack_size = len(bank.hand)
+
+        self.grid = [[t.letter.upper() for t in row] for row in board.board]
+        self.size = len(self.grid)
+        self.variant = board.variant
+        self.first_move = board.is_first_word
+
+        self._rack_words = None
+
+        # False if generate() ran out of time before covering the board
+        self.complete = False
+
+    def letter_at(self, direction, line, i):
+        return self.grid[line][i] if direction == "h" else self.grid[i][line]
+
+    def coords(self, direction, line, i):
+        return (i, line) if direction == "h" else (line, i)
+
+    def cross_check(self, x, y, direction):
+        """
+        Letters allowed at empty (x, y) by the word running across `direction`,
+        or None if there are no tiles either side
+        """
+        dx, dy = (0, 1) if direction == "h" else (1, 0)
+        before = []
+        cx, cy = x - dx, y - dy
+        while 0 <= cx < self.size and 0 <= cy < self.size and self.grid[cy][cx]:
+            before.append(self.grid[cy][cx])
+            cx, cy = cx - dx, cy - dy
+        after = []
+        cx, cy = x + dx, y + dy
+        while 0 <= cx < self.size and 0 <= cy < self.size and self.grid[cy][cx]:
+            after.append(self.grid[cy][cx])
+            cx, cy = cx + dx, cy + dy
+        if not before and not after:
+            return None
+
+        return cross_letters(self.index, "".join(reversed(before)), "".join(after))
+
+    def rack_words(self, length):
+        # Only used for open segments, so the whole word comes from the rack
+        if self._rack_words is None:
+            self._rack_words = collections.defaultdict(list)
+            rack = "".join(self.rack.elements()) + "_" * self.blanks
+            for word in self.word_list.anagrams(rack):
+                self._rack_words[len(word)].append(word)
+        return self._rack_words.get(length, [])
+
+    def segment_words(self, letters, checks):
+        """Words that fit a segment of board letters ("" if empty) and checks"""
+        length = len(letters)
+        if not any(letters) and all(c is None for c in checks):
+            yield from self.rack_words(length)
+            return
+
+        bucket = self.index.by_length.get(length)
+        if not bucket:
+            return
+        mask = (1 << len(bucket)) - 1
+        for pos, letter in enumerate(letters):
+            if letter:
+                mask &= self.index.positions.get((length, pos, letter), 0)
+            elif checks[pos] is not None:
+                mask &= allowed_mask(self.index, length, pos, checks[pos])
+            if not mask:
+                return
+        usable = frozenset(self.rack) | frozenset(letters)
+        mask &= usable_mask(self.index, length, usable, self.blanks)
+
+        for i in _bit_indices(mask):
+            word = bucket[i]
+            needed = collections.Counter(
+                c for c, on_board in zip(word, letters) if not on_board
+            )
+            missing = sum(
+                max(0, n - self.rack.get(c, 0)) for c, n in needed.items()
+            )
+            if missing <= self.blanks:
+                yield word
+
+    def place(self, word, direction, line, start, letters):
+        """Turn a word into the tiles to put down, choosing where blanks go"""
+        new = [
+            (i, c) for i, (c, on_board) in enumerate(zip(word, letters)) if not on_board
+        ]
+        # Blanks go on the squares where a letter is worth least
+        by_letter = collections.defaultdict(list)
+        for i, c in new:
+            x, y = self.coords(direction, line, start + i)
+            premium = self.variant.multipliers[y][x]
+            by_letter[c].append((LETTER_MULTIPLIER.get(premium, 1), i))
+        blank_at = set()
+        for c, spots in by_letter.items():
+            extra = len(spots) - self.rack.get(c, 0)
+            if extra > 0:
+                blank_at.update(i for _, i in sorted(spots)[:extra])
+
+        tiles = []
+        for i, c in new:
+            x, y = self.coords(direction, line, start + i)
+            is_blank = i in blank_at
+            tiles.append(
+                Tile(
+                    letter=c,
+                    x=x,
+                    y=y,
+                    is_blank=is_blank,
+                    points=0 if is_blank else self.variant.tiles[c][1],
+                )
+            )
+        return tiles
+
+    def segments(self, direction, line):
+        """(start, letters, checks) for every segment on a line that could be played"""
+        # Occupancy bitmasks from the board: tiles on this line, and empty
+        # squares with a tile just across the line (the ones with cross words)
+        masks = self.board.rows if direction == "h" else self.board.cols
+        occupied = masks[line]
+        across = 0
+        if line > 0:
+            across |= masks[line - 1]
+        if line + 1 < self.size:
+            across |= masks[line + 1]
+        across &= ~occupied
+
+        # Nothing on or next to this line, so nothing can be played on it
+        cx, cy = self.variant.center
+        center = (cy, cx) if direction == "h" else (cx, cy)  # (line, position)
+        on_center = self.first_move and line == center[0]
+        if not occupied and not across and not on_center:
+            return
+
+        checks = [None] * self.size
+        for i in _bit_indices(across):
+            x, y = self.coords(direction, line, i)
+            checks[i] = self.cross_check(x, y, direction)
+
+        for start in range(self.size):
+            if start > 0 and occupied >> (start - 1) & 1:
+                continue
+            empties = 0
+            connected = False
+            for end in range(start, self.size):
+                if occupied >> end & 1:
+                    connected = True
+                else:
+                    empties += 1
+                    if empties > self.rack_size:
+                        break
+                    if checks[end] is not None:
+                        connected = True
+                    if self.first_move and (line, end) == center:
+                        connected = True
+
+                if end == start or not empties or not connected:
+                    continue
+                if occupied >> (end + 1) & 1:
+                    continue
+                # make_move reads a lone tile as a vertical word
+                if empties == 1 and direction == "h":
+                    continue
+
+                letters = [
+                    self.letter_at(direction, line, i) for i in range(start, end + 1)
+                ]
+                yield start, letters, checks[start : end + 1]
+
+    def generate(self, deadline=None):
+        """Yield every legal move, stopping early at `deadline` (time.monotonic)"""
+        self.complete = False
+        if self.rack_size == 0:
+            self.complete = True
+            return
+        for direction in ("h", "v"):
+            for line in range(self.size):
+                if deadline is not None and time.monotonic() > deadline:
+                    return
+                for start, letters, checks in self.segments(direction, line):
+                    for word in self.segment_words(letters, checks):
+                        tiles = self.place(word, direction, line, start, letters)
+                        words, score = self.board.score_move(tiles)
+                        x, y = self.coords(direction, line, start)
+                        yield Move(
+                            tiles=tiles,
+                            score=score,
+                            word=word,
+                            x=x,
+                            y=y,
+                            direction=direction,
+                            words=[w for w, _ in words],
+                            rack_size=self.board.variant.rack_size,
+                        )
+        self.complete = True
+
+
+def generate_moves(board: Board, hand: TileBank | list[Tile] = None, deadline=None):
+    if hand is None:
+        hand = board.current_player.word_bank
+    return MoveGenerator(board, hand).generate(deadline)
+
+
+def best_moves(board: Board, hand: list[Tile] = None, k=10, deadline=None):
+    return sorted(
+        generate_moves(board, hand, deadline), key=lambda m: m.score, reverse=True
+    )[:k]
+
+
+def stream_top_moves(board: Board, hand: list[Tile], k=10, deadline=None):
+    """
+    Yield ("candidate", move) each time a move makes it into the current top
+    k, then ("done", best k moves, whether the whole board was searched)
+    """
+    generator = MoveGenerator(board, hand)
+    top = []  # Min-heap of (score, order, move)
+    for order, move in enumerate(generator.generate(deadline)):
+        if len(top) < k:
+            heapq.heappush(top, (move.score, order, move))
+        elif move.score > top[0][0]:
+            heapq.heapreplace(top, (move.score, order, move))
+        else:
+            continue
+        yield "candidate", move
+
+    best = [move for _, _, move in sorted(top, key=lambda t: (-t[0], t[1]))]
+    yield "done", best, generator.complete
@@ -0,0 +1,324 @@
+"""
+Opening book: the best scoring first move for every possible 7-tile rack.
+
+On an empty board the only thing that matters is the rack, so the first move
+can be worked out ahead of time. Every distinct rack (letters and blanks, no
+more of a letter than the bag holds) gets a number from 0 to RACKS - 1 by
+counting racks in order of their letter counts, so the book needs no keys:
+the record for a rack is at its rank. A record is 8 bytes: the word (5 bits
+a letter), which letters are blanks, where it starts on the center row and
+its score. About 3.2 million racks make a 26MB file.
+
+The search is specific to the first move. Every word the rack can make is
+tried at every offset that covers the center square, with the blanks on every
+choice of copies of their letters, and scored by Board.score_move on an empty
+board, so the book always agrees with make_move. Moves are always across the
+center row; the board is symmetric, so going down would score the same. Only
+the standard variant has a book, lookups for any other are refused.
+
+Building the whole book is hours of CPU, so it runs across a process pool and
+a book can be partial: racks that haven't been worked out yet read as missing
+and bots fall back to searching.
+
+Usage:
+    python -m backend.opening build [--out PATH] [--workers N] [--limit N]
+    python -m backend.opening lookup RACK
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import mmap
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+
+from .anagram import ALPHABET, BLANK_CHARS, blank_letters
+from .movegen import Move
+from .scrabble import (BLANK_SLOT, STANDARD, Board, Player, Tile, TileBag, TileBank,
+                       Variant, WordList, tile_points, tile_slot)
+
+# The only variant with a book
+VARIANT = STANDARD
+RACK_SIZE = VARIANT.rack_size
+CENTER_X, CENTER_Y = VARIANT.center
+# How many of each letter there are, blanks last like TileBank.counts
+CAPS = [VARIANT.tiles[c][0] for c in ALPHABET] + [VARIANT.tiles[""][0]]
+SLOTS = len(CAPS)
+
+BOOK_PATH = os.getenv(
+    "SCRABBLE_OPENING_BOOK", str(Path(__file__).resolve().parent / "opening.book")
+)
+MAGIC = b"SCRBOOK1"
+HEADER = struct.Struct("<8sII")  # magic, rack size, number of racks
+RECORD = struct.Struct("<Q")
+# Chunks of racks handed to each worker
+CHUNK = 4096
+
+# Record bits, from the bottom: word length (0 = no move), start column,
+# blank mask, letters, score. The top bit marks the rack as worked out
+LETTER_BITS = 5
+SCORE_SHIFT = 7 + RACK_SIZE + LETTER_BITS * RACK_SIZE
+COMPUTED = 1 << 63
+
+
+def _rack_counts_table():
+    # ways[i][k]: how many racks of k tiles use only slots i and up
+    ways = [[0] * (RACK_SIZE + 1) for _ in range(SLOTS + 1)]
+    ways[SLOTS][0] = 1
+    for i in reversed(range(SLOTS)):
+        for k in range(RACK_SIZE + 1):
+            ways[i][k] = sum(ways[i + 1][k - j] for j in range(min(CAPS[i], k) + 1))
+    return ways
+
+
+WAYS = _rack_counts_table()
+RACKS = WAYS[0][RACK_SIZE]
+
+
+def rack_rank(counts) -> int:
+    """Position of a rack (counts per slot, 7 tiles) in the book"""
+    rank, left = 0, RACK_SIZE
+    for i, count in enumerate(counts):
+        for j in range(count):
+            rank += WAYS[i + 1][left - j]
+        left -= count
+    return rank
+
+
+def rack_unrank(rank) -> list[int]:
+    counts, left = [], RACK_SIZE
+    for i in range(SLOTS):
+        j = 0
+        while rank >= WAYS[i + 1][left - j]:
+            rank -= WAYS[i + 1][left - j]
+            j += 1
+        counts.append(j)
+        left -= j
+    return counts
+
+
+def rack_counts(hand) -> list[int]:
+    if isinstance(hand, TileBank):
+        return list(hand.counts)
+    counts = [0] * SLOTS
+    for tile in hand:
+        counts[tile_slot(tile.letter, tile.is_blank)] += 1
+    return counts
+
+
+def counts_to_rack(counts) -> str:
+    return "".join(
+        ("_" if slot == BLANK_SLOT else ALPHABET[slot]) * n for slot, n in enumerate(counts)
+    )
+
+
+def empty_board() -> Board:
+    # Only scored against, nobody plays on it
+    return Board(
+        players=[Player(), Player()], tile_bag=TileBag.full(0, VARIANT.tiles), variant=VARIANT
+    )
+
+
+def first_move_tiles(word: str, start: int, mask: int) -> list[Tile]:
+    """Tiles of `word` across the center row from column `start`, mask bits are blanks"""
+    tiles = []
+    for i, c in enumerate(word):
+        is_blank = bool(mask >> i & 1)
+        points = tile_points(c, is_blank)
+        tiles.append(Tile(letter=c, x=start + i, y=CENTER_Y, is_blank=is_blank, points=points))
+    return tiles
+
+
+def best_first_move(rack: str, word_list: WordList, board: Board = None):
+    """(score, word, start column, blank mask) of the best first move, or None"""
+    board = board or empty_board()
+    best = None
+    for word in sorted(word_list.anagrams(rack, 2)):
+        # Every way of putting the blanks on copies of the letters they stand for
+        choices = [
+            itertools.combinations([i for i, c in enumerate(word) if c == letter], n)
+            for letter, n in collections.Counter(blank_letters(word, rack)).items()
+        ]
+        masks = [
+            sum(1 << i for spots in picked for i in spots)
+            for picked in itertools.product(*choices)
+        ]
+        length = len(word)
+        for start in range(max(0, CENTER_X - length + 1), min(CENTER_X, VARIANT.size - length) + 1):
+            for mask in masks:
+                score = board.score_move(first_move_tiles(word, start, mask))[1]
+                if best is None or score > best[0]:
+                    best = (score, word, start, mask)
+    return best
+
+
+def pack(best) -> int:
+    if best is None:
+        return COMPUTED  # Worked out, no legal first move
+    score, word, start, mask = best
+    letters = 0
+    for i, c in enumerate(word):
+        letters |= ALPHABET.index(c) << (LETTER_BITS * i)
+    return (
+        COMPUTED
+        | score << SCORE_SHIFT
+        | letters << (7 + RACK_SIZE)
+        | mask << 7
+        | start << 3
+        | len(word)
+    )
+
+
+def unpack(record: int) -> Move | None:
+    length = record & 0b111
+    if not length:
+        return None
+    start = record >> 3 & 0b1111
+    mask = record >> 7 & ((1 << RACK_SIZE) - 1)
+    letters = record >> (7 + RACK_SIZE)
+    word = "".join(
+        ALPHABET[letters >> (LETTER_BITS * i) & ((1 << LETTER_BITS) - 1)] for i in range(length)
+    )
+    score = record >> SCORE_SHIFT & ((1 << 10) - 1)
+    return Move(first_move_tiles(word, start, mask), score, word, start, CENTER_Y, "h", [word])
+
+
+class OpeningBook:
+    def __init__(self, path=BOOK_PATH):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, rack_size, racks = HEADER.unpack_from(self._map)
+        if magic != MAGIC or rack_size != RACK_SIZE or racks != RACKS:
+            raise ValueError(f"{self.path} is not an opening book for this tile set")
+
+    def close(self):
+        self._map.close()
+
+    def record(self, rank) -> int:
+        return RECORD.unpack_from(self._map, HEADER.size + rank * RECORD.size)[0]
+
+    def lookup(self, hand, variant: Variant = VARIANT) -> Move | None:
+        """
+        Best first move for a 7-tile hand (list of Tiles or a TileBank), None
+        if there is none. KeyError if the rack isn't in the book (yet),
+        ValueError for a game of another variant
+        """
+        if variant is not VARIANT:
+            raise ValueError(f"The opening book is for {VARIANT.name} games, not {variant.name}")
+        counts = rack_counts(hand)
+        if sum(counts) != RACK_SIZE:
+            raise KeyError(counts_to_rack(counts))
+        record = self.record(rack_rank(counts))
+        if not record & COMPUTED:
+            raise KeyError(counts_to_rack(counts))
+        return unpack(record)
+
+    def __len__(self):
+        """How many racks have been worked out"""
+        return sum(
+            1 for rank in range(RACKS) if self.record(rank) & COMPUTED
+        )
+
+
+_DEFAULT_BOOK = None
+
+
+def default_book() -> OpeningBook | None:
+    """The book at SCRABBLE_OPENING_BOOK, or None if there isn't one"""
+    global _DEFAULT_BOOK
+    if _DEFAULT_BOOK is None and os.path.exists(BOOK_PATH):
+        _DEFAULT_BOOK = OpeningBook(BOOK_PATH)
+    return _DEFAULT_BOOK
+
+
+_WORKER_WORD_LIST = None
+
+
+def _init_worker():
+    global _WORKER_WORD_LIST
+    _WORKER_WORD_LIST = WordList.load_word_list()
+    _WORKER_WORD_LIST.anagram_index
+
+
+def _build_chunk(start, end, word_list=None):
+    word_list = word_list or _WORKER_WORD_LIST
+    board = empty_board()
+    records = bytearray()
+    for rank in range(start, end):
+        rack = counts_to_rack(rack_unrank(rank))
+        records += RECORD.pack(pack(best_first_move(rack, word_list, board)))
+    return start, bytes(records)
+
+
+def build(path=BOOK_PATH, workers=None, limit=None):
+    """Work out the first `limit` racks (all of them by default) into `path`"""
+    total = RACKS if limit is None else min(limit, RACKS)
+    path = Path(path)
+    # Racks not worked out stay zero, so a partial book is still valid
+    if not path.exists() or path.stat().st_size != HEADER.size + RACKS * RECORD.size:
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, RACK_SIZE, RACKS))
+            f.truncate(HEADER.size + RACKS * RECORD.size)
+
+    chunks = [(start, min(start + CHUNK, total)) for start in range(0, total, CHUNK)]
+    begin = time.monotonic()
+    done = 0
+    with open(path, "r+b") as f, concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker
+    ) as executor:
+        # Results are written as they come in, so memory stays flat
+        futures = [executor.submit(_build_chunk, start, end) for start, end in chunks]
+        for future in concurrent.futures.as_completed(futures):
+            start, records = future.result()
+            f.seek(HEADER.size + start * RECORD.size)
+            f.write(records)
+            done += len(records) // RECORD.size
+            rate = done / (time.monotonic() - begin)
+            print(
+                f"\r{done}/{total} racks, {rate:.0f}/s, "
+                f"{(total - done) / rate / 60:.1f} min left",
+                end="",
+                file=sys.stderr,
+            )
+    print(file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Work out the book in parallel")
+    build_parser.add_argument("--out", default=BOOK_PATH)
+    build_parser.add_argument("--workers", type=int, default=None, help="Default: one per core")
+    build_parser.add_argument("--limit", type=int, default=None, help="Only the first N racks")
+    lookup_parser = commands.add_parser("lookup", help="Best first move for a rack")
+    lookup_parser.add_argument("rack", help='7 tiles, "_" or "?" for blanks')
+    lookup_parser.add_argument("--book", default=BOOK_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        print(f"{RACKS} racks, {HEADER.size + RACKS * RECORD.size} bytes")
+        build(args.out, args.workers, args.limit)
+        return
+
+    hand = [
+        Tile(letter="" if c in BLANK_CHARS else c, is_blank=c in BLANK_CHARS)
+        for c in args.rack.upper()
+    ]
+    try:
+        move = OpeningBook(args.book).lookup(hand)
+    except KeyError:
+        print(f"{args.rack} isn't in the book")
+        return
+    if move is None:
+        print("No legal first move, pass")
+    else:
+        print(f"{move.word} at ({move.x}, {move.y}) across for {move.score} points")
+
+
+if __name__ == "__main__":
+    main()
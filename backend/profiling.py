@@ -0,0 +1,159 @@
+"""
+Opt-in cProfile around individual requests.
+
+A request is profiled when it carries the `X-Scrabble-Profile: 1` header, or
+when it is picked by SCRABBLE_PROFILE_SAMPLE_RATE (0 to 1, off by default).
+Each profile is written as a `.prof` file named after the game id and turn, so
+it can be opened with `python -m pstats`, snakeviz, or turned into a flamegraph
+with flameprof.
+
+The profiler is only on while the request's own coroutine runs: whatever
+else the event loop runs while the request waits (on Redis, say) isn't blamed
+on it. Work it hands to another task, like a /state load coalesced with other
+requests, isn't in the profile either.
+
+To keep the overhead bounded only one request is profiled at a time, profiles
+are at least SCRABBLE_PROFILE_MIN_INTERVAL seconds apart (asked for with the
+header or sampled), and the output directory is pruned (oldest first) to
+SCRABBLE_PROFILE_MAX_FILES files and SCRABBLE_PROFILE_MAX_BYTES bytes. Files
+are written and pruned off the event loop. A profile that can't be written is
+logged and counted, the request still gets its response.
+"""
+
+import asyncio
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from . import metrics
+
+PROFILE_HEADER = "x-scrabble-profile"
+
+PROFILE_DIR = os.getenv("SCRABBLE_PROFILE_DIR", "profiles")
+SAMPLE_RATE = float(os.getenv("SCRABBLE_PROFILE_SAMPLE_RATE", 0))
+MIN_INTERVAL = float(os.getenv("SCRABBLE_PROFILE_MIN_INTERVAL", 1))
+MAX_FILES = int(os.getenv("SCRABBLE_PROFILE_MAX_FILES", 200))
+MAX_BYTES = int(os.getenv("SCRABBLE_PROFILE_MAX_BYTES", 50 * 1024 * 1024))
+
+log = logging.getLogger(__name__)
+
+
+class ProfileRun:
+    """Handed to the request handler so it can report the turn it worked on"""
+
+    def __init__(self, game_id: str, endpoint: str):
+        self.game_id = game_id
+        self.endpoint = endpoint
+        self.turn = None
+        self.path = None
+
+
+class _Profiled:
+    """Awaits coro with the profiler on only while coro itself is running"""
+
+    def __init__(self, coro, profiler: cProfile.Profile):
+        self.coro = coro
+        self.profiler = profiler
+
+    def __await__(self):
+        send, message = self.coro.send, None
+        while True:
+            self.profiler.enable()
+            try:
+                signal = send(message)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profiler.disable()
+            # Suspended, other tasks run now
+            try:
+                message, send = (yield signal), self.coro.send
+            except BaseException as exc:
+                message, send = exc, self.coro.throw
+
+
+class RequestProfiler:
+    def __init__(
+        self,
+        directory=PROFILE_DIR,
+        sample_rate=SAMPLE_RATE,
+        min_interval=MIN_INTERVAL,
+        max_files=MAX_FILES,
+        max_bytes=MAX_BYTES,
+    ):
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.min_interval = min_interval
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+
+        # cProfile can't nest, and one profile at a time is our overhead cap
+        self._lock = threading.Lock()
+        self._last_sampled = 0.0
+
+    def wants_profile(self, headers) -> bool:
+        # The header too, or any client could have every request profiled
+        if time.monotonic() - self._last_sampled < self.min_interval:
+            return False
+        if headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes"):
+            return True
+        if self.sample_rate <= 0:
+            return False
+        return random.random() < self.sample_rate
+
+    async def profile(self, headers, game_id: str, endpoint: str, handler):
+        """await handler(run), under cProfile if this request is picked"""
+        run = ProfileRun(game_id, endpoint)
+        if not self.wants_profile(headers) or not self._lock.acquire(blocking=False):
+            return await handler(run)
+
+        self._last_sampled = time.monotonic()
+        profiler = cProfile.Profile()
+        try:
+            result = await _Profiled(handler(run), profiler)
+            # Files block, keep them off the event loop. The move is saved by
+            # now, a full disk mustn't turn it into an error the client retries
+            try:
+                await asyncio.to_thread(self.write, profiler, run)
+            except Exception:
+                log.exception("Writing the %s profile for %r failed", endpoint, game_id)
+                metrics.inc("scrabble_profiles_total", result="failed")
+            else:
+                metrics.inc("scrabble_profiles_total", result="written")
+            return result
+        finally:
+            self._lock.release()
+
+    def write(self, profiler: cProfile.Profile, run: ProfileRun):
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        game = re.sub(r"[^A-Za-z0-9_-]", "_", run.game_id)
+        turn = "na" if run.turn is None else f"{run.turn:04d}"
+        # Unique, two requests can land in the same millisecond
+        suffix = uuid.uuid4().hex[:12]
+        run.path = self.directory / f"{game}-turn{turn}-{run.endpoint}-{suffix}.prof"
+
+        profiler.dump_stats(run.path)
+        self.prune()
+
+    def prune(self):
+        files = []  # (mtime, size, path)
+        for path in self.directory.glob("*.prof"):
+            # Another request's prune may have got to it first
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        while files and (len(files) > self.max_files or total > self.max_bytes):
+            _, size, oldest = files.pop(0)
+            total -= size
+            oldest.unlink(missing_ok=True)
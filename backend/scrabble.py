@@ -40,7 +40,6 @@
 [ ] TODO: Ask about EE
 """
 
-import copy
 import dataclasses
 import json
 import random
@@ -48,66 +47,43 @@ from pathlib import Path
 
 import redis.asyncio as aredis
 
+from . import metrics, zobrist
+from .anagram import ALPHABET, AnagramIndex
+from .variants import (BOARD_MULTIPLIERS, BOARD_SIZE, RACK_SIZE, STANDARD, SUPER,
+                       TILE_INFO, VARIANTS, Variant)
+from .wordsearch import PatternIndex
+
 rd = aredis.Redis(host="ai.thewcl.com", port=6379, db=4, password="atmega328")
 REDIS_KEY = "scrabble:game_state"
 ROOT_PATH = "."
+DEFAULT_GAME = "default"
+
+
+def tile_points(letter: str, is_blank: bool = False) -> int:
+    return 0 if is_blank else TILE_INFO[letter.upper()][1]
+
+
+def redis_key(game_id: str = DEFAULT_GAME):
+    # The default game keeps the original key so older clients still work
+    if game_id == DEFAULT_GAME:
+        return REDIS_KEY
+    return f"{REDIS_KEY}:{game_id}"
+
+
+async def game_exists(game_id: str = DEFAULT_GAME) -> bool:
+    with metrics.timer("scrabble_redis_seconds", op="exists"):
+        return bool(await rd.exists(redis_key(game_id)))
 
-# {letter: (count, points)}
-
-TILE_INFO = {
-    "E": (12, 1),
-    "A": (9, 1),
-    "I": (9, 1),
-    "O": (8, 1),
-    "N": (6, 1),
-    "R": (6, 1),
-    "T": (6, 1),
-    "L": (4, 1),
-    "S": (4, 1),
-    "U": (4, 1),
-    "D": (4, 2),
-    "G": (3, 2),
-    "B": (2, 3),
-    "C": (2, 3),
-    "M": (2, 3),
-    "P": (2, 3),
-    "F": (2, 4),
-    "H": (2, 4),
-    "V": (2, 4),
-    "W": (2, 4),
-    "Y": (2, 4),
-    "K": (1, 5),
-    "J": (1, 8),
-    "X": (1, 8),
-    "Q": (1, 10),
-    "Z": (1, 10),
-    "": (2, 0),  # Blanks as ''
-}
-
-BOARD_MULTIPLIERS = [
-    ["TWS", 0, 0, "DLS", 0, 0, 0, "TWS", 0, 0, 0, "DLS", 0, 0, "TWS"],
-    [0, "DWS", 0, 0, 0, "TLS", 0, 0, 0, "TLS", 0, 0, 0, "DWS", 0],
-    [0, 0, "DWS", 0, 0, 0, "DLS", 0, "DLS", 0, 0, 0, "DWS", 0, 0],
-    ["DLS", 0, 0, "DWS", 0, 0, 0, "DLS", 0, 0, 0, "DWS", 0, 0, "DLS"],
-    [0, 0, 0, 0, "DWS", 0, 0, 0, 0, 0, "DWS", 0, 0, 0, 0],
-    [0, "TLS", 0, 0, 0, "TLS", 0, 0, 0, "TLS", 0, 0, 0, "TLS", 0],
-    [0, 0, "DLS", 0, 0, 0, "DLS", 0, "DLS", 0, 0, 0, "DLS", 0, 0],
-    ["TWS", 0, 0, "DLS", 0, 0, 0, "DWS", 0, 0, 0, "DLS", 0, 0, "TWS"],
-    [0, 0, "DLS", 0, 0, 0, "DLS", 0, "DLS", 0, 0, 0, "DLS", 0, 0],
-    [0, "TLS", 0, 0, 0, "TLS", 0, 0, 0, "TLS", 0, 0, 0, "TLS", 0],
-    [0, 0, 0, 0, "DWS", 0, 0, 0, 0, 0, "DWS", 0, 0, 0, 0],
-    ["DLS", 0, 0, "DWS", 0, 0, 0, "DLS", 0, 0, 0, "DWS", 0, 0, "DLS"],
-    [0, 0, "DWS", 0, 0, 0, "DLS", 0, "DLS", 0, 0, 0, "DWS", 0, 0],
-    [0, "DWS", 0, 0, 0, "TLS", 0, 0, 0, "TLS", 0, 0, 0, "DWS", 0],
-    ["TWS", 0, 0, "DLS", 0, 0, 0, "TWS", 0, 0, 0, "DLS", 0, 0, "TWS"],
-]
 
 # https://stackoverflow.com/q/8421337
 rotate_list = lambda x: list(zip(*x[::-1]))
 
 
-def initialize_board():
-    return [[Tile(letter="", x=cell, y=row) for cell in range(15)] for row in range(15)]
+EMPTY = " "  # Empty squares in Board.row_strings and col_strings
+
+
+def initialize_board(size: int = BOARD_SIZE):
+    return [[Tile(letter="", x=cell, y=row) for cell in range(size)] for row in range(size)]
 
 
 @dataclasses.dataclass
@@ -116,6 +92,14 @@ class WordList:
 
     word_list: set[str] = None
 
+    # Built on first use, see anagram_index and pattern_index
+    _anagram_index: AnagramIndex = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _pattern_index: PatternIndex = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+
     @classmethod
     def load_word_list(cls):
         with open(Path(__file__).resolve().parent / "words.txt", "r") as f:
@@ -124,6 +108,26 @@ class WordList:
     def is_valid_word(self, word):
         return word.upper() in self.word_list
 
+    @property
+    def anagram_index(self) -> AnagramIndex:
+        if self._anagram_index is None:
+            self._anagram_index = AnagramIndex(self.word_list)
+        return self._anagram_index
+
+    def anagrams(self, rack: str, min_length: int = 2) -> set[str]:
+        # Rack is a string of letters, "_" or "?" for blanks
+        return self.anagram_index.subanagrams(rack, min_length)
+
+    @property
+    def pattern_index(self) -> PatternIndex:
+        if self._pattern_index is None:
+            self._pattern_index = PatternIndex(self.word_list)
+        return self._pattern_index
+
+    def search(self, pattern="*", min_length=2, max_length=None, rack=None, limit=None):
+        # Generator, see wordsearch.py for the pattern syntax
+        return self.pattern_index.search(pattern, min_length, max_length, rack, limit)
+
 
 @dataclasses.dataclass
 class Tile:
@@ -166,43 +170,150 @@ class Tile:
         )
 
 
-def create_tile_bag():
-    # TODO: Points
-    bag = []
-    for letter, (count, points) in TILE_INFO.items():
-        for _ in range(count):
-            # x/y will be set when placed on board
-            if letter == "":
-                bag.append(
-                    Tile(
-                        letter=letter,
-                        points=points,
-                        multiplier=0,
-                        x=None,
-                        y=None,
-                        is_blank=True,
-                    )
-                )
-            else:
-                bag.append(
-                    Tile(letter=letter, points=points, multiplier=0, x=None, y=None)
-                )
-    return bag
+# Tiles are counted per letter, with blanks in the last slot
+BLANK_SLOT = len(ALPHABET)
+SLOT_LETTERS = list(ALPHABET) + [""]
+_MASK64 = (1 << 64) - 1
+
+
+def tile_slot(letter: str, is_blank: bool = False) -> int:
+    if is_blank:
+        return BLANK_SLOT
+    if len(letter) != 1 or letter.upper() not in ALPHABET:
+        raise ValueError(f"Invalid tile letter {letter!r}")
+    return ALPHABET.index(letter.upper())
 
 
 @dataclasses.dataclass
+class TileBag:
+    """
+    The tiles left to draw, as a count per letter (blanks last) plus the state
+    of the game's own random number generator. A draw is O(1), the bag saves
+    as 27 numbers, and the same seed always deals the same game.
+    """
+
+    counts: list[int] = dataclasses.field(default_factory=lambda: [0] * (BLANK_SLOT + 1))
+    rng: int = 0
+
+    @classmethod
+    def full(cls, seed: int = None, tiles: dict = TILE_INFO):
+        if seed is None:
+            seed = random.getrandbits(64)
+        counts = [0] * (BLANK_SLOT + 1)
+        for letter, (count, _points) in tiles.items():
+            counts[tile_slot(letter, letter == "")] = count
+        return cls(counts=counts, rng=seed & _MASK64)
+
+    @classmethod
+    def from_tiles(cls, tiles, seed: int = None):
+        bag = cls(rng=random.getrandbits(64) if seed is None else seed & _MASK64)
+        for tile in tiles:
+            bag.put_back(tile)
+        return bag
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def __iter__(self):
+        # Fresh tiles, in slot order
+        for slot, count in enumerate(self.counts):
+            for _ in range(count):
+                yield self.make_tile(slot)
+
+    @staticmethod
+    def make_tile(slot: int) -> Tile:
+        letter = SLOT_LETTERS[slot]
+        is_blank = slot == BLANK_SLOT
+        return Tile(letter=letter, points=tile_points(letter, is_blank), is_blank=is_blank)
+
+    def next_random(self) -> int:
+        # splitmix64, small and good enough to shuffle tiles
+        self.rng = (self.rng + 0x9E3779B97F4A7C15) & _MASK64
+        z = self.rng
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+        return z ^ (z >> 31)
+
+    def draw(self) -> Tile:
+        """Take a random tile out of the bag"""
+        total = len(self)
+        if not total:
+            raise IndexError("Tile bag is empty")
+        pick = self.next_random() % total
+        for slot, count in enumerate(self.counts):
+            if pick < count:
+                self.counts[slot] -= 1
+                return self.make_tile(slot)
+            pick -= count
+
+    def put_back(self, tile: Tile):
+        self.counts[tile_slot(tile.letter, tile.is_blank)] += 1
+
+    def to_save_dict(self):
+        # Hex, RedisJSON only takes signed 64-bit ints
+        return {"counts": list(self.counts), "rng": f"{self.rng:016x}"}
+
+    @classmethod
+    def from_save_dict(cls, data):
+        if isinstance(data, list):
+            # Saved before the bag was counted: [(letter, is_blank), ...]
+            return cls.from_tiles(Tile(letter=l, is_blank=b) for l, b in data)
+        return cls(counts=list(data["counts"]), rng=int(data["rng"], 16))
+
+
+def create_tile_bag(seed: int = None, variant: "Variant" = STANDARD) -> TileBag:
+    return TileBag.full(seed, variant.tiles)
+
+
 class TileBank:
     """
     The hand for a player
     """
 
-    hand: list[Tile] = dataclasses.field(default_factory=list)
+    def __init__(self, hand: list[Tile] = ()):
+        self.hand = hand
 
-    def get_new_hand(self, tile_bag):
-        to_add = 7 - len(self.hand)
+    @property
+    def hand(self) -> tuple[Tile, ...]:
+        # A tuple, so it can't be changed behind counts' back. Change it with
+        # the methods below or by assigning a whole new hand
+        return self._hand
+
+    @hand.setter
+    def hand(self, tiles):
+        # counts[slot] is how many of each letter are in hand, blanks last
+        self._hand = tuple(tiles)
+        self.counts = [0] * (BLANK_SLOT + 1)
+        for tile in self._hand:
+            self.counts[tile_slot(tile.letter, tile.is_blank)] += 1
+
+    def __repr__(self):
+        return f"TileBank(hand={list(self._hand)!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, TileBank):
+            return NotImplemented
+        return self._hand == other._hand
+
+    def add(self, tile: Tile):
+        self._hand += (tile,)
+        self.counts[tile_slot(tile.letter, tile.is_blank)] += 1
+
+    def pop(self) -> Tile:
+        tile = self._hand[-1]
+        self._hand = self._hand[:-1]
+        self.counts[tile_slot(tile.letter, tile.is_blank)] -= 1
+        return tile
+
+    def get_new_hand(self, tile_bag: TileBag, rack_size: int = RACK_SIZE):
+        # Returns the tiles drawn so a draw can be undone
+        drawn = []
+        to_add = rack_size - len(self.hand)
         for _ in range(min(to_add, len(tile_bag))):
-            tile = tile_bag.pop(random.randrange(len(tile_bag)))
-            self.hand.append(tile)
+            tile = tile_bag.draw()
+            self.add(tile)
+            drawn.append(tile)
+        return drawn
     """
     def remove_tiles(self, tiles: list[Tile]):
         for tile in tiles:
@@ -222,65 +333,82 @@ class TileBank:
                     f"Unable to remove tile {tile} because it was not in the hand"
                 )
     """
-    def remove_tiles(self, tiles: list[Tile]):
-        # Make a copy of hand so we can remove by index
-        hand_tiles = list(self.hand)
-
-        # Build lists of indices for non-blanks and blanks
-        indices_by_letter = {}
-        blank_indices = []
-        for i, hand_tile in enumerate(hand_tiles):
-            if hand_tile.is_blank:
-                blank_indices.append(i)
+    def _take(self, tiles: list[Tile]) -> list[int]:
+        """How many to take from each slot to play tiles, raises if we can't"""
+        take = [0] * (BLANK_SLOT + 1)
+        for tile in tiles:
+            slot = tile_slot(tile.letter, tile.is_blank)
+            if slot != BLANK_SLOT and take[slot] < self.counts[slot]:
+                take[slot] += 1
+            elif take[BLANK_SLOT] < self.counts[BLANK_SLOT]:
+                # No real tile left, but have a blank; use it (should only happen if a blank was played as this letter)
+                take[BLANK_SLOT] += 1
+            elif slot == BLANK_SLOT:
+                raise ValueError("No blank tile left in hand to remove")
             else:
-                indices_by_letter.setdefault(hand_tile.letter, []).append(i)
+                raise ValueError(f"Tile {tile.letter} not in hand")
+        return take
+
+    def can_play(self, tiles: list[Tile]) -> bool:
+        """True if the hand holds all of tiles at once"""
+        try:
+            self._take(tiles)
+        except ValueError:
+            return False
+        return True
 
-        # Build up list of indices to remove (avoid removing twice)
-        to_remove = []
-        for tile in tiles:
-            if tile.is_blank:
-                # Remove a blank tile
-                if not blank_indices:
-                    raise ValueError("No blank tile left in hand to remove")
-                to_remove.append(blank_indices.pop())
+    def remove_tiles(self, tiles: list[Tile]):
+        take = self._take(tiles)
+        # Take the last matching tiles first
+        kept = []
+        for tile in reversed(self._hand):
+            slot = tile_slot(tile.letter, tile.is_blank)
+            if take[slot]:
+                take[slot] -= 1
+                self.counts[slot] -= 1
             else:
-                # Try to remove matching non-blank letter first
-                if indices_by_letter.get(tile.letter):
-                    to_remove.append(indices_by_letter[tile.letter].pop())
-                elif blank_indices:
-                    # No real tile left, but have a blank; use it (should only happen if a blank was played as this letter)
-                    to_remove.append(blank_indices.pop())
-                else:
-                    raise ValueError(f"Tile {tile.letter} not in hand")
-
-        # Remove by indices, largest first (so earlier removals don't shift indices)
-        for idx in sorted(to_remove, reverse=True):
-            del self.hand[idx]
+                kept.append(tile)
+        self._hand = tuple(reversed(kept))
 
     def __contains__(self, item):
-        for hand_tile in self.hand:
-            if item.is_blank and hand_tile.is_blank:
-                return True
-            else:
-                if hand_tile.letter == item.letter and not hand_tile.is_blank:
-                    return True
-        return False
+        return self.counts[tile_slot(item.letter, item.is_blank)] > 0
 
 
 @dataclasses.dataclass
 class Player:
     word_bank: TileBank = dataclasses.field(default_factory=TileBank)
     score: int = 0
+    # Name of the server-side bot playing this seat (see botpool.py), None for
+    # a person or a client-side AI
+    bot: str | None = None
+
+
+@dataclasses.dataclass
+class UndoRecord:
+    """What Board.apply_move changed, for Board.undo_move"""
+
+    player: int  # Index of the player who moved
+    hand: list[Tile]  # Their hand before the move
+    bag_rng: int
+    scores: list[int]  # Everyone's, the game can end on this move
+    turn: int
+    consecutive_passes: int
+    is_game_over: bool
+    is_first_word: bool
+    state_hash: int = None
+    squares: list[tuple[int, int, Tile]] = dataclasses.field(default_factory=list)
+    drawn: list[Tile] = dataclasses.field(default_factory=list)
 
 
 @dataclasses.dataclass
 class Board:
     players: list[Player]
 
-    tile_bag: list[Tile]
+    tile_bag: TileBag
 
     # TODO: Single line
-    board: list[list[Tile]] = dataclasses.field(default_factory=initialize_board)
+    # An empty board of the variant's size by default
+    board: list[list[Tile]] = None
     # Word list needs to stay client side -- so do not make as dict work on this
     word_list: WordList = dataclasses.field(
         default=None, repr=False, compare=False, init=False
@@ -294,18 +422,99 @@ class Board:
 
     consecutive_passes: int = 0
 
+    # The bag's rng when the tiles were first dealt, and every move played
+    # since as [(letter, x, y, is_blank), ...] ([] for a pass). Together they
+    # replay the game, see archive.py
+    seed: int = None
+    moves: list[list[tuple]] = dataclasses.field(default_factory=list)
+
+    variant: Variant = STANDARD
+
+    # New on every /start. The same seed deals the same game, this tells a
+    # restarted game from the old one (see botpool.py)
+    start_id: str = None
+
+    # Built on first use and then updated by make_move, see state_hash
+    _zobrist: int = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def index_board(self):
+        # rows[y] has bit x set if (x, y) has a tile, cols[x] has bit y set.
+        # row_strings and col_strings hold the letters of each line, with a
+        # space for an empty square. Built once here, set_square keeps them
+        # in step
+        self.rows = [0] * len(self.board)
+        self.cols = [0] * len(self.board)
+        for y, row in enumerate(self.board):
+            for x, tile in enumerate(row):
+                if tile.letter:
+                    self.rows[y] |= 1 << x
+                    self.cols[x] |= 1 << y
+        letters = [[t.letter or EMPTY for t in row] for row in self.board]
+        self.row_strings = ["".join(row) for row in letters]
+        self.col_strings = ["".join(col) for col in zip(*letters)]
+
+    def set_square(self, x, y, tile: Tile):
+        self.board[y][x] = tile
+        if tile.letter:
+            self.rows[y] |= 1 << x
+            self.cols[x] |= 1 << y
+        else:
+            self.rows[y] &= ~(1 << x)
+            self.cols[x] &= ~(1 << y)
+        letter = tile.letter or EMPTY
+        row, col = self.row_strings[y], self.col_strings[x]
+        self.row_strings[y] = row[:x] + letter + row[x + 1 :]
+        self.col_strings[x] = col[:y] + letter + col[y + 1 :]
+
+    def line_mask(self, direction, line) -> int:
+        """Occupied squares along row `line` ("h") or column `line` ("v")"""
+        return self.rows[line] if direction == "h" else self.cols[line]
+
+    def is_free(self, direction, line, start, end) -> bool:
+        """True if squares start..end (inclusive) along the line are empty"""
+        span = ((1 << (end - start + 1)) - 1) << start
+        return not self.line_mask(direction, line) & span
+
+    def anchors(self, direction, line) -> int:
+        """
+        Empty squares along the line that have a tile next to them, the places
+        a new word has to touch
+        """
+        occupied = self.line_mask(direction, line)
+        masks = self.rows if direction == "h" else self.cols
+        near = (occupied << 1) | (occupied >> 1)
+        if line > 0:
+            near |= masks[line - 1]
+        if line + 1 < len(masks):
+            near |= masks[line + 1]
+        return near & ~occupied & self.variant.full_line
+
     def __post_init__(self):
         if not (2 <= len(self.players) <= 4):
             raise ValueError("Invalid amount of players. Need 2-4 players inclusive.")
+        if self.board is None:
+            self.board = initialize_board(self.variant.size)
+        elif len(self.board) != self.variant.size:
+            raise ValueError(f"Board isn't {self.variant.size}x{self.variant.size}")
+        self.index_board()
 
     def initialize(self, word_list):
         self.word_list = word_list
         # Can't use post init because this depends on word list
         self.current_player = self.players[0]
+        if self.seed is None:
+            self.seed = self.tile_bag.rng
         for player in self.players:
-            player.word_bank.get_new_hand(self.tile_bag)
+            player.word_bank.get_new_hand(self.tile_bag, self.variant.rack_size)
 
     def make_move(self, move: list[Tile], i_am: Player) -> bool:
+        # See apply_move, this is the same without keeping the undo record
+        self.apply_move(move, i_am)
+        return True
+
+    def apply_move(self, move: list[Tile], i_am: Player) -> UndoRecord:
         # https://playscrabble.com/news-blog/scrabble-rules-official-scrabble-web-games-rules-play-scrabble
         # [x] If it is the first move, it must be on the center square
         # [x] Validate all values -- they must all be in the word bank
@@ -313,27 +522,43 @@ class Board:
         # [x] There should be no incomplete words at the end of the turn
         # [x] Words can be horizontal or vertical
 
+        # Everything undo_move needs to put the board back. Nothing below
+        # changes the board until the move has been validated
+        record = UndoRecord(
+            player=self.players.index(self.current_player),
+            hand=list(self.current_player.word_bank.hand),
+            bag_rng=self.tile_bag.rng,
+            scores=[p.score for p in self.players],
+            turn=self.turn,
+            consecutive_passes=self.consecutive_passes,
+            is_game_over=self.is_game_over,
+            is_first_word=self.is_first_word,
+            state_hash=self._zobrist,
+        )
+
+        # Racks, passes and whose turn it is get re-hashed at the end
+        before = zobrist.turn_key(self) if self._zobrist is not None else None
+
         # If move is 0, pass turn
         if len(move) == 0:
 
             self.consecutive_passes += 1
+            self.moves.append([])
 
-            self.next_turn()
+            record.drawn = self.next_turn()
 
             if self.consecutive_passes >= len(self.players) * 2:  # TODO: Magic number
                 self.do_game_over()
 
-            return True
-        else:
-            # Reset passes once a valid move has been made
-            self.consecutive_passes = 0
+            self._update_hash(before, [])
+            return record
 
         # Correct points
         for tile in move:
             if tile.is_blank:
                 tile.points = 0
             else:
-                tile.points = TILE_INFO.get(tile.letter.upper())[1]
+                tile.points = self.variant.tiles[tile.letter.upper()][1]
 
         if i_am != self.current_player:
             raise ValueError("Incorrect player selected")
@@ -341,7 +566,7 @@ class Board:
         # locations: [(letter, x, y), ...]
         # If it is the first move, it must be on the center square
         if self.is_first_word:
-            if not any(tile.x == 7 and tile.y == 7 for tile in move):
+            if not any((tile.x, tile.y) == self.variant.center for tile in move):
                 raise ValueError(
                     "First move on first turn must contain a letter on the center square"
                 )
@@ -365,6 +590,11 @@ class Board:
                         f"You don't have the tile {tile.letter} in your word bank"
                     )
 
+        # Each tile is there on its own, check there are enough of them too.
+        # They all come out of the hand at the end
+        if not self.current_player.word_bank.can_play(move):
+            raise ValueError("You don't have enough tiles in your word bank")
+
         if not self.is_contiguous(move):
             raise ValueError("Move is not contiguous")
 
@@ -373,152 +603,223 @@ class Board:
         ):
             raise ValueError("Move must touch an existing tile")
 
-        # 1 – lay tiles on a temporary board
-        temp_board = copy.deepcopy(self.board)
-        for tile in move:
-            temp_board[tile.y][tile.x] = Tile.from_another(tile)
-
-        # 2 – build all words just formed
-        words = self.extract_words(move, temp_board)
+        # 1 – build all words just formed. The new tiles are read from the move,
+        # so the board doesn't need a copy and stays untouched until step 3
+        with metrics.phase("extract_words"):
+            words = self.extract_words(move, self.board)
 
-        # 3 – validate each word
-        for word, _tiles in words:
-            if len(word) < 2:
-                raise ValueError("Every word must be at least two letters")
-            if not self.word_list.is_valid_word(word):
-                raise ValueError(f"‘{word}’ is not in the dictionary")
+        # 2 – validate each word
+        with metrics.phase("word_lookup"):
+            for word, _tiles in words:
+                if len(word) < 2:
+                    raise ValueError("Every word must be at least two letters")
+                if not self.word_list.is_valid_word(word):
+                    raise ValueError(f"‘{word}’ is not in the dictionary")
 
-        total_score = sum([self.score_word(tiles) for word, tiles in words])
+        with metrics.phase("scoring"):
+            total_score = sum([self.score_word(tiles) for word, tiles in words])
 
         # Bingo -- use all tiles = increase score by 50s
-        if len(move) == 7:
-            total_score += 50
+        if len(move) == self.variant.rack_size:
+            total_score += self.variant.bingo_bonus
 
         self.current_player.score += total_score
 
-        # 4 – everything passed → commit the temp board
-        self.board = temp_board
+        # Reset passes once a valid move has been made
+        self.consecutive_passes = 0
+
+        # 3 – everything passed → lay the tiles
+        for tile in move:
+            record.squares.append((tile.x, tile.y, self.board[tile.y][tile.x]))
+            self.set_square(tile.x, tile.y, Tile.from_another(tile))
         # TODO: Do not remove tile already played
         self.current_player.word_bank.remove_tiles(move)  # TODO: Implement
+        self.moves.append([(t.letter, t.x, t.y, t.is_blank) for t in move])
 
         # Once the word has been made for the first time, continue
         self.is_first_word = False
 
-        self.next_turn()
+        record.drawn = self.next_turn()
+
+        self._update_hash(
+            before, [(old, self.board[y][x]) for x, y, old in record.squares]
+        )
+        return record
+
+    def undo_move(self, record: UndoRecord):
+        """Take back the move apply_move returned record for, in O(move size)"""
+        # Tiles drawn at the start of the next turn go back in the bag, and the
+        # bag's rng goes back so the same tiles get drawn again
+        for tile in record.drawn:
+            self.current_player.word_bank.pop()
+            self.tile_bag.put_back(tile)
+        self.tile_bag.rng = record.bag_rng
+
+        for x, y, old in reversed(record.squares):
+            self.set_square(x, y, old)
+        self.moves.pop()
+
+        self.players[record.player].word_bank.hand = list(record.hand)
+        for player, score in zip(self.players, record.scores):
+            player.score = score
+        self.turn = record.turn
+        self.current_player = self.players[record.player]
+        self.consecutive_passes = record.consecutive_passes
+        self.is_game_over = record.is_game_over
+        self.is_first_word = record.is_first_word
+        self._zobrist = record.state_hash
+
+
+    @property
+    def state_hash(self) -> int:
+        """
+        64-bit Zobrist hash of the board, racks, player to move and pass count.
+        If you change any of those without make_move, call rehash() after.
+
+        Scores, the turn number and the bag aren't in it, so two states with
+        the same hash can still differ in those (and in the tiles still to be
+        drawn). Fine as a search or move cache key, not for caching whole
+        /state responses or checking that a replay matches.
+        """
+        if self._zobrist is None:
+            self._zobrist = zobrist.board_hash(self)
+        return self._zobrist
+
+    def rehash(self):
+        self._zobrist = None
+
+    def _update_hash(self, before, squares):
+        # before is turn_key() from the start of the move, squares is a list
+        # of (old tile, new tile) for every square the move touched
+        if before is None:
+            return
+        h = self._zobrist ^ before ^ zobrist.turn_key(self)
+        for old, new in squares:
+            for tile in (old, new):
+                if tile.letter:
+                    h ^= zobrist.square_key(tile.x, tile.y, tile.letter, tile.is_blank)
+        self._zobrist = h
 
     def next_turn(self):
         self.turn += 1
         self.current_player = self.players[self.turn % len(self.players)]
 
-        self.current_player.word_bank.get_new_hand(self.tile_bag)
+        drawn = self.current_player.word_bank.get_new_hand(
+            self.tile_bag, self.variant.rack_size
+        )
 
         self.check_game_over()
+        return drawn
 
     def is_contiguous(self, move: list[Tile]):
         if not move:
             return False
 
-        xs = [t.x for t in move]
-        ys = [t.y for t in move]
-        new_positions = {(t.x, t.y) for t in move}
-
+        first = move[0]
+        new = 0
         # Vertical line
-        if len(set(xs)) == 1:
-            x = xs[0]
-            for y in range(min(ys), max(ys) + 1):
-                if (x, y) not in new_positions and not self.board[y][x].letter:
-                    return False
-            return True
-
+        if all(t.x == first.x for t in move):
+            occupied = self.cols[first.x]
+            for tile in move:
+                new |= 1 << tile.y
         # Horizontal line
-        if len(set(ys)) == 1:
-            y = ys[0]
-            for x in range(min(xs), max(xs) + 1):
-                if (x, y) not in new_positions and not self.board[y][x].letter:
-                    return False
-            return True
+        elif all(t.y == first.y for t in move):
+            occupied = self.rows[first.y]
+            for tile in move:
+                new |= 1 << tile.x
+        else:
+            return False
 
-        return False
+        # Every square from the lowest new bit to the highest is either new or
+        # already has a tile
+        span = (1 << new.bit_length()) - (new & -new)
+        return (occupied | new) & span == span
 
     def touches_existing_tile(self, move: list[Tile], is_first_turn):
         if is_first_turn:
             return False
 
-        positions = {(t.x, t.y) for t in move}
+        # {y: bits of the squares being played on in that row}
+        placed = {}
         for tile in move:
-            for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                x, y = tile.x + dx, tile.y + dy
-                if 0 <= x < 15 and 0 <= y < 15:
-                    # If not a just-placed tile and has a letter
-                    if (x, y) not in positions and self.board[y][x].letter:
-                        return True
+            placed[tile.y] = placed.get(tile.y, 0) | 1 << tile.x
+
+        for y, bits in placed.items():
+            # Left and right in the same row, then the rows above and below,
+            # not counting the squares being played on
+            beside = ((bits << 1) | (bits >> 1)) & ~bits
+            if beside & self.rows[y] & self.variant.full_line:
+                return True
+            for ny in (y - 1, y + 1):
+                if 0 <= ny < len(self.rows) and bits & self.rows[ny] & ~placed.get(ny, 0):
+                    return True
         return False
 
     def extract_words(self, move: list[Tile], board_post_move: list):
+        # Words are sliced out of the cached row and column strings of the
+        # board as it is (before the move), with the move's letters dropped
+        # in. Tiles are only looked up for the squares inside each word
         words = []
-        new_pos = {(t.x, t.y): t for t in move}
 
         vertical = len({t.x for t in move}) == 1
-        primary_axis = "y" if vertical else "x"
 
         # --- build main word ---
         if vertical:
             x = move[0].x
-            all_ys = [t.y for t in move]
-            y_start = min(all_ys)
-            # walk upward to first letter
-            while y_start > 0 and board_post_move[y_start - 1][x].letter:
-                y_start -= 1
-            tiles = []
-            y = y_start
-            while y < 15 and (board_post_move[y][x].letter or (x, y) in new_pos):
-                tiles.append(new_pos.get((x, y), board_post_move[y][x]))
-                y += 1
+            line = self.col_strings[x]
+            new = {t.y: t for t in move if t.x == x}
         else:
             y = move[0].y
-            all_xs = [t.x for t in move]
-            x_start = min(all_xs)
-            while x_start > 0 and board_post_move[y][x_start - 1].letter:
-                x_start -= 1
-            tiles = []
-            x = x_start
-            while x < 15 and (board_post_move[y][x].letter or (x, y) in new_pos):
-                tiles.append(new_pos.get((x, y), board_post_move[y][x]))
-                x += 1
-
-        word = "".join(t.letter for t in tiles)
-        words.append((word, tiles))
+            line = self.row_strings[y]
+            new = {t.x: t for t in move if t.y == y}
+
+        # Walk back from the first new tile over old letters, then forward
+        # until an empty square that no new tile covers
+        first = min(new)
+        start = line.rfind(EMPTY, 0, first) + 1
+        end = line.find(EMPTY, first)
+        while end in new:
+            end = line.find(EMPTY, end + 1)
+        if end == -1:
+            end = len(line)
+
+        letters = list(line[start:end])
+        if vertical:
+            tiles = [board_post_move[i][x] for i in range(start, end)]
+        else:
+            tiles = board_post_move[y][start:end]
+        for i, t in new.items():
+            if start <= i < end:
+                letters[i - start] = t.letter
+                tiles[i - start] = t
+        words.append(("".join(letters), tiles))
 
         # --- build cross words ---
+        last = len(line) - 1
         for t in move:
             if vertical:  # cross words are horizontal
-                horiz_tiles = (
-                    list(self._scan(t.x, t.y, -1, 0))[::-1]
-                    + [t]
-                    + list(self._scan(t.x, t.y, 1, 0))
-                )
-                if len(horiz_tiles) > 1:
-                    words.append(
-                        ("".join(tt.letter for tt in horiz_tiles), horiz_tiles)
-                    )
+                cross, at = self.row_strings[t.y], t.x
             else:  # cross words are vertical
-                vert_tiles = (
-                    list(self._scan(t.x, t.y, 0, -1))[::-1]
-                    + [t]
-                    + list(self._scan(t.x, t.y, 0, 1))
-                )
-                if len(vert_tiles) > 1:
-                    words.append(("".join(tt.letter for tt in vert_tiles), vert_tiles))
+                cross, at = self.col_strings[t.x], t.y
+            # Most tiles have nothing either side
+            if (at == 0 or cross[at - 1] == EMPTY) and (
+                at == last or cross[at + 1] == EMPTY
+            ):
+                continue
+            start = cross.rfind(EMPTY, 0, at) + 1
+            end = cross.find(EMPTY, at + 1)
+            if end == -1:
+                end = len(cross)
+            if vertical:
+                tiles = self.board[t.y][start:end]
+                tiles[at - start] = t
+            else:
+                tiles = [self.board[i][t.x] for i in range(start, end)]
+                tiles[at - start] = t
+            words.append((cross[start:at] + t.letter + cross[at + 1 : end], tiles))
 
         return words
 
-    def _scan(self, start_x, start_y, dx, dy):
-        x, y = start_x + dx, start_y + dy
-        while 0 <= x < 15 and 0 <= y < 15 and self.board[y][x].letter:
-            yield self.board[y][x]
-            x += dx
-            y += dy
-
     def to_save_dict(self):
         # HACK: This is done manually. If a field is added to anything, MAKE
         # SURE to add here and to cls.from_save_dict
@@ -527,13 +828,14 @@ class Board:
                 {
                     "hand": [(t.letter, t.is_blank) for t in player.word_bank.hand],
                     "score": player.score,
+                    "bot": player.bot,
                 }
                 for player in self.players
             ],
-            "tile_bag": [(t.letter, t.is_blank) for t in self.tile_bag],
+            "tile_bag": self.tile_bag.to_save_dict(),
             "board": [
                 [
-                    (t.letter, t.is_blank, BOARD_MULTIPLIERS[y][x])
+                    (t.letter, t.is_blank, self.variant.multipliers[y][x])
                     for x, t in enumerate(row)
                 ]
                 for y, row in enumerate(self.board)
@@ -542,7 +844,12 @@ class Board:
             "current_player": self.players.index(self.current_player),
             "is_game_over": self.is_game_over,
             "consecutive_passes": self.consecutive_passes,
-            "is_first_word": self.is_first_word
+            "is_first_word": self.is_first_word,
+            # Hex, like the bag's rng
+            "seed": None if self.seed is None else f"{self.seed:016x}",
+            "moves": self.moves,
+            "variant": self.variant.name,
+            "start_id": self.start_id,
         }
 
     @classmethod
@@ -551,14 +858,18 @@ class Board:
         players = [
             Player(
                 word_bank=TileBank(
-                    hand=[Tile(letter=l, is_blank=b) for (l, b) in player_data["hand"]]
+                    hand=[
+                        Tile(letter=l, is_blank=b, points=tile_points(l, b))
+                        for (l, b) in player_data["hand"]
+                    ]
                 ),
                 score=player_data["score"],
+                bot=player_data.get("bot"),
             )
             for player_data in data["players"]
         ]
         # Reconstruct tile bag
-        tile_bag = [Tile(letter=l, is_blank=b) for (l, b) in data["tile_bag"]]
+        tile_bag = TileBag.from_save_dict(data["tile_bag"])
 
         # Reconstruct board
         # Even though we have multipliers stored inside the board in to_save_dict,
@@ -576,7 +887,12 @@ class Board:
             current_player=players[data["current_player"]],
             is_game_over=data["is_game_over"],
             consecutive_passes=data["consecutive_passes"],
-            is_first_word=data["is_first_word"]
+            is_first_word=data["is_first_word"],
+            # Not saved by older versions
+            seed=int(data["seed"], 16) if data.get("seed") else None,
+            moves=[[tuple(t) for t in move] for move in data.get("moves", [])],
+            variant=VARIANTS[data.get("variant", STANDARD.name)],
+            start_id=data.get("start_id"),
         )
         board_obj.word_list = word_list  # inject client word list
         return board_obj
@@ -584,15 +900,35 @@ class Board:
     def serialize(self):
         return json.dumps(self.to_save_dict())
 
-    async def save_to_redis(self):
-        return await rd.json().set(REDIS_KEY, ROOT_PATH, self.to_save_dict())
+    async def save_to_redis(self, game_id: str = DEFAULT_GAME):
+        data = self.to_save_dict()
+        with metrics.phase("redis_save"), metrics.timer(
+            "scrabble_redis_seconds", op="json.set"
+        ):
+            return await rd.json().set(redis_key(game_id), ROOT_PATH, data)
 
     @classmethod
-    async def load_from_redis(cls, word_list: WordList):
-        data = await rd.json().get(REDIS_KEY)
-        obj = Board.from_save_dict(data, word_list)
+    async def load_from_redis(cls, word_list: WordList, game_id: str = DEFAULT_GAME):
+        with metrics.phase("redis_load"), metrics.timer(
+            "scrabble_redis_seconds", op="json.get"
+        ):
+            data = await rd.json().get(redis_key(game_id))
+        with metrics.phase("from_save_dict"):
+            obj = Board.from_save_dict(data, word_list)
         return obj
 
+    def score_move(self, move: list[Tile]):
+        """
+        Words formed by move and its total score, bingo included, without
+        validating or committing it
+        """
+        # extract_words only needs the new tiles on top of the current board
+        words = self.extract_words(move, self.board)
+        total_score = sum(self.score_word(tiles) for word, tiles in words)
+        if len(move) == self.variant.rack_size:
+            total_score += self.variant.bingo_bonus
+        return words, total_score
+
     def score_word(self, tiles: list[Tile]) -> int:
         # TODO: Add multiplier
         word_multiplier = 1
@@ -606,7 +942,7 @@ class Board:
             if spot.letter == "" and not spot.is_blank:
 
                 letter_score = 0 if tile.is_blank else tile.points
-                multiplier = BOARD_MULTIPLIERS[tile.y][tile.x]
+                multiplier = self.variant.multipliers[tile.y][tile.x]
                 match multiplier:
                     case "DLS":  # double letter score
                         total += letter_score * 2
@@ -662,6 +998,19 @@ class Board:
             out_player.score += bonus
 
 
+def _set_tile_bag(board: Board, value):
+    # A plain list of tiles still works as a bag, it keeps the game's rng
+    if not isinstance(value, TileBag):
+        old = board.__dict__.get("_tile_bag")
+        value = TileBag.from_tiles(value, old.rng if old is not None else None)
+    board._tile_bag = value
+
+
+# A property rather than a plain field only so the list case above works. Set
+# after the class so the dataclass still sees tile_bag as a required field
+Board.tile_bag = property(lambda board: board._tile_bag, _set_tile_bag)
+
+
 if __name__ == "__main__":
     # Tests are located in ./test
     pass
@@ -1,17 +1,129 @@
-from fastapi import FastAPI, HTTPException, Query
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import logging
+import os
+import time
+import types
+import uuid
+from typing import Literal
+
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
-from .scrabble import (BOARD_MULTIPLIERS, Board, Player, Tile, TileBank,
-                       WordList, create_tile_bag)
+from . import metrics
+from .anagram import blank_letters, parse_rack
+from .archive import Archive, ArchivedGame
+from .audit import AuditLog, make_sink
+from .botpool import BotPool
+from .broadcast import BroadcastHub
+from .movegen import stream_top_moves
+from .profiling import RequestProfiler
+from .singleflight import SingleFlight
+from .wordsearch import parse_pattern
+from .scrabble import (BOARD_MULTIPLIERS, DEFAULT_GAME, RACK_SIZE, VARIANTS, Board,
+                       Player, Tile, TileBank, WordList, create_tile_bag,
+                       game_exists)
 
 WORD_LIST = WordList.load_word_list()
+# Upper bound on how long /hints searches for
+HINT_BUDGET_SECONDS = 2.0
+# Each blank multiplies the /anagrams lookups by up to 26
+ANAGRAM_MAX_BLANKS = 2
+# game_id ends up in Redis keys and archive records
+GAME_ID_MAX_LENGTH = 64
+# The game_id query parameter every endpoint takes
+GAME_ID = Query(DEFAULT_GAME, max_length=GAME_ID_MAX_LENGTH)
+# Build the indexes up front so the first query doesn't pay for them
+WORD_LIST.anagram_index
+WORD_LIST.pattern_index
+PROFILER = RequestProfiler()
+HUB = BroadcastHub()
+ARCHIVE = Archive()
+# One thread, so games go into the archive in order and one at a time
+ARCHIVE_WRITER = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+# Every move attempt, written in the background, see audit.py
+AUDIT = AuditLog(make_sink())
+# Concurrent /state requests for a game share one load, see singleflight.py
+STATES = SingleFlight("state", enabled=os.getenv("SCRABBLE_COALESCE_STATE", "1") != "0")
+
+
+log = logging.getLogger(__name__)
+
+
+def after_move(game_id: str, board: Board):
+    STATES.forget(game_id)
+    HUB.publish(game_id, state_payload(board))
+    # Games from before moves were recorded have no seed and can't be replayed
+    if board.is_game_over and board.seed is not None:
+        archive_game(ArchivedGame.from_board(game_id, board))
+
+
+def archive_game(game: ArchivedGame):
+    # Compressing and writing a block blocks, keep it off the event loop. The
+    # move is saved already, so a failure here is logged rather than raised
+    future = asyncio.get_running_loop().run_in_executor(ARCHIVE_WRITER, ARCHIVE.append, game)
+
+    def done(future):
+        if future.cancelled():
+            return
+        if future.exception() is None:
+            # GET /archive finds it again by game id
+            log.info("Archived game %r as %d", game.game_id, future.result())
+            metrics.inc("scrabble_games_archived_total", result="archived")
+            return
+        log.error("Archiving game %r failed", game.game_id, exc_info=future.exception())
+        metrics.inc("scrabble_games_archived_total", result="failed")
+
+    future.add_done_callback(done)
+    return future
+
+
+# Spectators hear about bot moves the same way as everyone else's
+BOTS = BotPool(WORD_LIST, on_move=after_move, audit=AUDIT)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Don't lose the audit records still queued, or the games being archived
+    await AUDIT.flush()
+    await asyncio.to_thread(ARCHIVE_WRITER.shutdown)
+
+
+app = FastAPI(title="Scrabble Board API", version="0.2.0", lifespan=lifespan)
 
 
-app = FastAPI(title="Scrabble Board API", version="0.2.0")
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    if not metrics.ENABLED:
+        return await call_next(request)
+
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    # The route's path template, not the URL, so scanners can't make a series
+    # per path they try
+    route = request.scope.get("route")
+    endpoint = route.path if route is not None else "other"
+    metrics.inc(
+        "scrabble_requests_total", endpoint=endpoint, status=response.status_code
+    )
+    metrics.observe_summary("scrabble_request_seconds", elapsed, endpoint=endpoint)
+    return response
 
 
 class StartGameRequest(BaseModel):
     num_players: int = Field(ge=2, le=4)
+    # Same seed, same tiles drawn in the same order. Random if not given
+    seed: int | None = Field(None, ge=0)
+    # Seats the server plays itself, e.g. {"1": "greedy"}
+    bots: dict[int, Literal["greedy", "sim"]] = {}
+    # Board size, premiums and tiles, see scrabble.VARIANTS
+    variant: Literal["standard", "super"] = "standard"
 
 
 class Location(BaseModel):
@@ -26,22 +138,74 @@ class MakeMoveRequest(BaseModel):
     player_index: int | None
 
 
+def state_payload(board: Board):
+    # Hex so the full 64 bits survive JSON parsers that use doubles
+    return {**board.to_save_dict(), "state_hash": f"{board.state_hash:016x}"}
+
+
+async def load_state(game_id: str):
+    """
+    (turn, state_payload) of the saved game. Concurrent callers get the same
+    payload, so it's a read-only view: copy it (dict(payload)) to change it
+    """
+
+    async def load():
+        board = await Board.load_from_redis(WORD_LIST, game_id)
+        return board.turn, types.MappingProxyType(state_payload(board))
+
+    return await STATES.do(game_id, load)
+
+
 @app.post("/start")
-async def start_game(req: StartGameRequest):
+async def start_game(req: StartGameRequest, game_id: str = GAME_ID):
+    if any(not 0 <= seat < req.num_players for seat in req.bots):
+        raise HTTPException(status_code=400, detail="bot seat out of range")
 
-    players = [Player() for _ in range(req.num_players)]
+    players = [Player(bot=req.bots.get(i)) for i in range(req.num_players)]
 
-    board = Board(players=players, tile_bag=create_tile_bag())
+    variant = VARIANTS[req.variant]
+    board = Board(
+        players=players,
+        tile_bag=create_tile_bag(req.seed, variant),
+        variant=variant,
+        start_id=uuid.uuid4().hex,
+    )
     board.initialize(WORD_LIST)
 
-    await board.save_to_redis()
+    await board.save_to_redis(game_id)
+    STATES.forget(game_id)
+    HUB.publish(game_id, state_payload(board))
+    BOTS.schedule(game_id, board)
     return {"message": "Game started/reset", "success": True}
 
 
 @app.post("/make_move")
-async def make_move(req: MakeMoveRequest):
-    # Defaults to current player if not passed
-    board = await Board.load_from_redis(WORD_LIST)
+async def make_move(req: MakeMoveRequest, request: Request, game_id: str = GAME_ID):
+    return await PROFILER.profile(
+        request.headers, game_id, "make_move", lambda prof: apply_move(req, game_id, prof)
+    )
+
+
+async def apply_move(req: MakeMoveRequest, game_id: str, prof):
+    start = time.perf_counter()
+
+    def audit(player, accepted, reason=None):
+        AUDIT.record(
+            game_id,
+            player,
+            [loc.model_dump() for loc in req.locations],
+            accepted,
+            reason,
+            time.perf_counter() - start,
+        )
+
+    try:
+        board = await Board.load_from_redis(WORD_LIST, game_id)
+    except Exception as exc:
+        # No such game, or Redis is down; still a move attempt
+        audit(req.player_index, False, f"{type(exc).__name__}: {exc}")
+        raise
+    prof.turn = board.turn
     # build Tile objects from the payload
     tiles = [
         Tile(
@@ -54,26 +218,185 @@ async def make_move(req: MakeMoveRequest):
         for loc in req.locations
     ]
 
-    # pick the acting player
+    # pick the acting player, defaults to current player if not passed
     if req.player_index is None:
         player_obj = board.current_player
     else:
         if req.player_index >= len(board.players):
+            audit(req.player_index, False, "player_index out of range")
             raise HTTPException(status_code=400, detail="player_index out of range")
         player_obj = board.players[req.player_index]
+    player = board.players.index(player_obj)
+
+    if player_obj.bot is not None:
+        message = "That seat is played by the server"
+        audit(player, False, message)
+        return {"message": message, "success": False}
 
     # delegate to backend; it will raise on illegal moves
     try:
         move = board.make_move(tiles, player_obj)
     except Exception as exc:
+        metrics.inc("scrabble_moves_total", result="rejected")
+        audit(player, False, str(exc))
         return {"message": str(exc), "success": False}
 
-    await board.save_to_redis()
+    metrics.inc("scrabble_moves_total", result="accepted")
+    await board.save_to_redis(game_id)
+    audit(player, True)
+    after_move(game_id, board)
+    BOTS.schedule(game_id, board)
     return {"message": "Move applied", "success": True}
 
 
 @app.get("/state")
-async def status():
-    board = await Board.load_from_redis(WORD_LIST)
-    # No need to save as to_save_dict() doesn't modify the state of the board -- HACK
-    return board.to_save_dict()
+async def status(request: Request, game_id: str = GAME_ID):
+    async def handler(prof):
+        # Shared with every other /state for this game in flight, not ours to change
+        prof.turn, payload = await load_state(game_id)
+        return payload
+
+    return await PROFILER.profile(request.headers, game_id, "state", handler)
+
+
+@app.websocket("/spectate")
+async def spectate(websocket: WebSocket, game_id: str = GAME_ID):
+    # Same JSON as /state, sent on connect and after every change. Slow
+    # spectators skip to the newest state, see broadcast.py
+    await websocket.accept()
+    subscription = HUB.subscribe(game_id)
+    try:
+        # Not started yet, the first frame comes with /start
+        if subscription.channel.frame is None and await game_exists(game_id):
+            _, payload = await load_state(game_id)
+            # A move may have been published while we were loading. The
+            # payload is a shared read-only view, json.dumps needs a dict
+            if subscription.channel.frame is None:
+                HUB.publish(game_id, dict(payload))
+
+        async def serve():
+            # A closed socket shows up as a failed send
+            with contextlib.suppress(Exception):
+                await HUB.serve(subscription, websocket.send_text)
+
+        async def until_disconnect():
+            # Spectators have nothing to say, this is only to hear them leave
+            with contextlib.suppress(Exception):
+                while (await websocket.receive())["type"] != "websocket.disconnect":
+                    pass
+
+        # Whichever comes first, without waiting for the next publish to notice
+        tasks = [asyncio.ensure_future(serve()), asyncio.ensure_future(until_disconnect())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+    finally:
+        subscription.close()
+
+
+@app.get("/anagrams")
+async def anagrams(rack: str = Query(max_length=15), min_length: int = Query(2, ge=1)):
+    try:
+        counts, blanks = parse_rack(rack)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if sum(counts.values()) + blanks > RACK_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {RACK_SIZE} tiles")
+    if blanks > ANAGRAM_MAX_BLANKS:
+        raise HTTPException(status_code=400, detail=f"At most {ANAGRAM_MAX_BLANKS} blanks")
+
+    # Still milliseconds of CPU with blanks, keep it off the event loop
+    words = await asyncio.to_thread(WORD_LIST.anagrams, rack, min_length)
+
+    # Longest words first
+    ordered = sorted(words, key=lambda word: (-len(word), word))
+    return {
+        "rack": rack,
+        "words": [
+            {"word": word, "blanks": blank_letters(word, rack)} for word in ordered
+        ],
+    }
+
+
+@app.get("/words")
+async def search_words(
+    pattern: str = Query("*", max_length=32),
+    min_length: int = Query(2, ge=1),
+    max_length: int | None = Query(None, ge=1),
+    rack: str | None = Query(None, max_length=15),
+    limit: int = Query(100, ge=1, le=10000),
+):
+    try:
+        parse_pattern(pattern)
+        if rack is not None:
+            parse_rack(rack)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    # One JSON object per line, written as the words are found
+    results = WORD_LIST.search(pattern, min_length, max_length, rack, limit)
+    return StreamingResponse(
+        (json.dumps({"word": word}) + "\n" for word in results),
+        media_type="application/x-ndjson",
+    )
+
+
+def hint_lines(board: Board, hand: TileBank, k: int, budget: float):
+    start = time.monotonic()
+    for event in stream_top_moves(board, hand, k, start + budget):
+        if event[0] == "candidate":
+            line = {"type": "candidate", **event[1].to_dict()}
+        else:
+            _, best, complete = event
+            line = {
+                "type": "done",
+                "moves": [move.to_dict() for move in best],
+                "complete": complete,
+                "elapsed_ms": round((time.monotonic() - start) * 1000),
+            }
+        yield json.dumps(line) + "\n"
+
+
+@app.get("/hints")
+async def hints(
+    player: int = Query(ge=0),
+    k: int = Query(10, ge=1, le=100),
+    budget_ms: int = Query(int(HINT_BUDGET_SECONDS * 1000), ge=1),
+    game_id: str = GAME_ID,
+):
+    board = await Board.load_from_redis(WORD_LIST, game_id)
+    if player >= len(board.players):
+        raise HTTPException(status_code=400, detail="player out of range")
+    hand = board.players[player].word_bank
+
+    # Moves are streamed as NDJSON: a "candidate" line whenever the top k
+    # changes, then one "done" line with the final ranking
+    budget = min(budget_ms / 1000, HINT_BUDGET_SECONDS)
+    return StreamingResponse(
+        hint_lines(board, hand, k, budget), media_type="application/x-ndjson"
+    )
+
+
+def archived_games(game_id: str) -> list[dict]:
+    return [
+        {"archive_id": archive_id, **ARCHIVE.get(archive_id).to_dict()}
+        for archive_id in ARCHIVE.find(game_id)
+    ]
+
+
+@app.get("/archive")
+async def archive(game_id: str = GAME_ID):
+    # Reads blocks from disk, on the archive's own thread so it never runs
+    # alongside an append
+    loop = asyncio.get_running_loop()
+    games = await loop.run_in_executor(ARCHIVE_WRITER, archived_games, game_id)
+    return {"games": games}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,265 @@
+"""
+Simulation bot: picks a move by playing the game forward a few plies from each
+of its best candidates, instead of taking the highest score.
+
+Candidates are the top moves by static equity (score plus the value of the
+tiles left on the rack). Each rollout deals the opponents random hands from
+the tiles we can't see (the bag plus their racks), plays our candidate, then
+lets every player make their highest scoring move for a few plies. A
+candidate's equity is its score plus the average of what we gained minus what
+the best opponent gained during the rollouts. The rollouts play the kept tiles
+out, so the leave value only ranks candidates that got no rollouts.
+
+Rollouts run in a process pool and stop at a wall-clock budget. With
+workers=0 everything runs in this process, which is what the tests use. Once
+the bag is empty in a two player game the endgame solver takes over.
+"""
+
+import concurrent.futures
+import dataclasses
+import os
+import random
+import time
+
+from .endgame import EndgameSolver
+from .movegen import Move, generate_moves, rack_string
+from .scrabble import Board, Tile, TileBag, WordList
+
+# Rough worth of keeping each tile for the next turn
+LEAVE_VALUES = {
+    "_": 25.0,
+    "S": 8.0,
+    "Z": 3.0,
+    "X": 3.0,
+    "R": 1.5,
+    "H": 1.0,
+    "E": 1.0,
+    "N": 0.5,
+    "D": 0.5,
+    "L": 0.0,
+    "T": 0.0,
+    "C": 0.0,
+    "A": 0.5,
+    "M": 0.5,
+    "I": -1.0,
+    "O": -1.0,
+    "P": -0.5,
+    "Y": -0.5,
+    "K": -1.0,
+    "G": -2.0,
+    "B": -2.0,
+    "F": -2.0,
+    "W": -3.0,
+    "U": -3.0,
+    "J": -2.5,
+    "V": -5.0,
+    "Q": -7.0,
+}
+VOWELS = set("AEIOU")
+DUPLICATE_PENALTY = 3.0
+IMBALANCE_PENALTY = 2.0
+
+# Worker processes load their own word list once, see _init_worker
+_WORKER_WORD_LIST = None
+
+
+def leave_value(rack: str) -> float:
+    """Heuristic value of the tiles kept on the rack ("_" for blanks)"""
+    value = sum(LEAVE_VALUES.get(c, 0.0) for c in rack)
+
+    # Repeated letters are hard to play together
+    for letter in set(rack) - {"_"}:
+        value -= DUPLICATE_PENALTY * (rack.count(letter) - 1)
+
+    vowels = sum(1 for c in rack if c in VOWELS)
+    consonants = sum(1 for c in rack if c not in VOWELS and c != "_")
+    value -= IMBALANCE_PENALTY * max(0, abs(vowels - consonants) - 1)
+
+    if "Q" in rack and "U" not in rack:
+        value -= 5.0
+    return value
+
+
+def leave_after(hand: list[Tile], move: Move | None) -> str:
+    rack = list(rack_string(hand))
+    for tile in move.tiles if move else []:
+        rack.remove("_" if tile.is_blank else tile.letter.upper())
+    return "".join(rack)
+
+
+def tiles_from_locations(locations):
+    return [
+        Tile(letter=l["letter"], x=l["x"], y=l["y"], is_blank=l["is_blank"])
+        for l in locations
+    ]
+
+
+def rollout(state, word_list, player_index, locations, plies, seed) -> float:
+    """
+    Play `locations` for player_index from the saved state, then `plies` more
+    greedy moves. Returns our points minus the best opponent's, after our move.
+    """
+    rng = random.Random(seed)
+    board = Board.from_save_dict(state, word_list)
+    me = board.players[player_index]
+    others = [p for p in board.players if p is not me]
+
+    # We can't see the opponents' racks, so deal them from the unseen tiles
+    unseen = list(board.tile_bag)
+    for player in others:
+        unseen += player.word_bank.hand
+    rng.shuffle(unseen)
+    for player in others:
+        size = len(player.word_bank.hand)
+        player.word_bank.hand, unseen = unseen[:size], unseen[size:]
+    # Draws come from the bag's own rng, seeded so rollouts are reproducible
+    board.tile_bag = TileBag.from_tiles(unseen, seed)
+
+    board.make_move(tiles_from_locations(locations), me)
+    start = [p.score for p in board.players]
+    for _ in range(plies):
+        if board.is_game_over:
+            break
+        best = max(generate_moves(board), key=lambda m: m.score, default=None)
+        board.make_move(best.tiles if best else [], board.current_player)
+
+    gains = [p.score - s for p, s in zip(board.players, start)]
+    mine = gains[player_index]
+    theirs = max(g for i, g in enumerate(gains) if i != player_index)
+    return mine - theirs
+
+
+def _init_worker():
+    global _WORKER_WORD_LIST
+    _WORKER_WORD_LIST = WordList.load_word_list()
+    _WORKER_WORD_LIST.pattern_index
+    _WORKER_WORD_LIST.anagram_index
+
+
+def _worker_rollout(state, player_index, locations, plies, seed):
+    return rollout(state, _WORKER_WORD_LIST, player_index, locations, plies, seed)
+
+
+@dataclasses.dataclass
+class Candidate:
+    move: Move | None  # None is a pass
+    static_equity: float
+    total: float = 0.0
+    rollouts: int = 0
+
+    @property
+    def equity(self):
+        if not self.rollouts:
+            return self.static_equity
+        # Not the leave on top, the rollouts have already played those tiles
+        score = self.move.score if self.move is not None else 0
+        return score + self.total / self.rollouts
+
+
+class SimBot:
+    def __init__(
+        self,
+        word_list: WordList,
+        candidates=8,
+        rollouts=16,
+        plies=2,
+        time_budget=10.0,
+        workers=None,
+        seed=None,
+    ):
+        self.word_list = word_list
+        self.candidates = candidates
+        self.rollouts = rollouts
+        self.plies = plies
+        self.time_budget = time_budget
+        self.workers = os.cpu_count() if workers is None else workers
+        self.rng = random.Random(seed)
+        self._executor = None
+
+    @property
+    def executor(self):
+        # Kept between moves so workers only load the word list once
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker
+            )
+        return self._executor
+
+    def warm_up(self):
+        """Start the workers now so loading the word list isn't on the clock"""
+        if self.workers:
+            list(self.executor.map(int, range(self.workers)))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def candidate_moves(self, board: Board, player_index: int) -> list[Candidate]:
+        hand = board.players[player_index].word_bank.hand
+        scored = [
+            Candidate(move, move.score + leave_value(leave_after(hand, move)))
+            for move in generate_moves(board, hand)
+        ]
+        scored.sort(key=lambda c: c.static_equity, reverse=True)
+        return scored[: self.candidates]
+
+    def rank(self, board: Board, player_index: int) -> list[Candidate]:
+        deadline = time.monotonic() + self.time_budget
+        candidates = self.candidate_moves(board, player_index)
+        if len(candidates) <= 1 or self.rollouts <= 0:
+            return candidates
+
+        state = board.to_save_dict()
+        # One round of rollouts for every candidate at a time, so they all get
+        # a fair share if the budget runs out. Candidates in a round share a
+        # seed, so they are compared against the same opponent racks and draws.
+        seeds = [self.rng.getrandbits(32) for _ in range(self.rollouts)]
+        jobs = [(candidate, seed) for seed in seeds for candidate in candidates]
+
+        if self.workers == 0:
+            for candidate, seed in jobs:
+                if time.monotonic() > deadline:
+                    break
+                candidate.total += rollout(
+                    state,
+                    self.word_list,
+                    player_index,
+                    candidate.move.to_locations(),
+                    self.plies,
+                    seed,
+                )
+                candidate.rollouts += 1
+        else:
+            futures = {
+                self.executor.submit(
+                    _worker_rollout,
+                    state,
+                    player_index,
+                    candidate.move.to_locations(),
+                    self.plies,
+                    seed,
+                ): candidate
+                for candidate, seed in jobs
+            }
+            done, pending = concurrent.futures.wait(
+                futures, timeout=max(0.0, deadline - time.monotonic())
+            )
+            for future in pending:
+                future.cancel()
+            for future in done:
+                if future.exception() is None:
+                    futures[future].total += future.result()
+                    futures[future].rollouts += 1
+
+        candidates.sort(key=lambda c: c.equity, reverse=True)
+        return candidates
+
+    def choose_move(self, board: Board, player_index: int) -> Move | None:
+        """Best move by simulated equity, or None to pass"""
+        # With the bag empty there is nothing to sample, so solve it instead
+        if not board.tile_bag and len(board.players) == 2:
+            return EndgameSolver(time_budget=self.time_budget).solve(board).move
+
+        ranked = self.rank(board, player_index)
+        return ranked[0].move if ranked else None
@@ -0,0 +1,48 @@
+"""
+Coalescing of concurrent loads of the same thing.
+
+After a move every client and UI hears about it at once and asks for /state
+at the same moment. Instead of one Redis fetch and one from_save_dict each,
+the first request starts the load and everyone who asks for the same key
+while it is in flight waits for that same result.
+
+Only for reads: everyone gets the same object back, so they must not change
+it. Call forget(key) after writing, so requests that come in after the write
+don't join a load that started before it.
+"""
+
+import asyncio
+
+from . import metrics
+
+
+class SingleFlight:
+    def __init__(self, name: str, enabled: bool = True):
+        # Label for scrabble_coalesced_loads_total
+        self.name = name
+        # Off, every call loads on its own (to compare, see loadtest.py)
+        self.enabled = enabled
+        self.in_flight = {}  # key -> task
+
+    async def do(self, key, load):
+        """Result of load() (a coroutine function), shared with concurrent callers"""
+        if not self.enabled:
+            return await load()
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            metrics.inc("scrabble_coalesced_loads_total", load=self.name, result="loaded")
+        else:
+            metrics.inc("scrabble_coalesced_loads_total", load=self.name, result="joined")
+        # One caller going away (client disconnect) mustn't cancel it for the rest
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+
+    def forget(self, key):
+        """The next do(key) starts a new load, whatever is in flight"""
+        self.in_flight.pop(key, None)
@@ -1,4 +1,19 @@
+import asyncio
+import dataclasses
+import json
+import logging
+import random
+import sys
+
+import pytest
+
+from . import metrics, zobrist
+from .profiling import RequestProfiler
+from .endgame import EndgameSolver, clone
+from .movegen import best_moves, generate_moves, stream_top_moves
 from .scrabble import *
+from .simbot import Candidate, SimBot, leave_value
+from .wordsearch import PatternIndex, brute_force_search
 
 
 def test_scrabble():
@@ -200,5 +215,1299 @@ def test_scrabble():
     print("All asserts passed for Scrabble tests.")
 
 
+def test_metrics():
+    metrics.reset()
+    with metrics.phase("scoring"):
+        pass
+    metrics.inc("scrabble_moves_total", result="accepted")
+    metrics.observe_summary("scrabble_request_seconds", 0.01, endpoint="/state")
+
+    text = metrics.render()
+    assert '# TYPE scrabble_phase_seconds histogram' in text
+    assert 'scrabble_phase_seconds_bucket{phase="scoring",le="+Inf"} 1' in text
+    assert 'scrabble_moves_total{result="accepted"} 1' in text
+    assert 'scrabble_request_seconds{endpoint="/state",quantile="0.5"} 0.01' in text
+    metrics.reset()
+
+    # Label values are escaped, so one odd value can't break the whole page
+    metrics.inc("scrabble_requests_total", endpoint='a"b\\c\nd', status=404)
+    assert 'endpoint="a\\"b\\\\c\\nd"' in metrics.render()
+    metrics.reset()
+
+    # Requests are labelled with their route, not whatever path was asked for
+    httpx = pytest.importorskip("httpx")
+    from .server import app
+
+    async def get(*paths):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for path in paths:
+                await client.get(path)
+
+    asyncio.run(get("/metrics", "/wp-admin/1", "/wp-admin/2"))
+    text = metrics.render()
+    assert 'scrabble_requests_total{endpoint="/metrics",status="200"} 1' in text
+    assert 'scrabble_requests_total{endpoint="other",status="404"} 2' in text
+    assert "wp-admin" not in text
+    metrics.reset()
+
+
+def test_anagrams():
+    word_list = WordList.load_word_list()
+
+    assert "RETAINS" in word_list.anagram_index.anagrams("NASTIER")
+
+    # Compare against a linear scan, with a blank in the rack
+    rack = "QUIE_TS"
+    expected = set()
+    for word in word_list.word_list:
+        if 2 <= len(word) <= len(rack):
+            missing = sum(
+                max(0, word.count(letter) - rack.count(letter)) for letter in set(word)
+            )
+            if missing <= rack.count("_"):
+                expected.add(word)
+    assert word_list.anagrams(rack) == expected
+    assert "QUIETEST" not in expected and "QUIETS" in expected
+
+    # Racks that would take too long are turned down
+    httpx = pytest.importorskip("httpx")
+    from .server import app
+
+    async def get(rack):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/anagrams", params={"rack": rack})
+
+    response = asyncio.run(get("QUIE_TS"))
+    assert response.status_code == 200
+    assert {"word": "QUIETS", "blanks": []} in response.json()["words"]
+    assert asyncio.run(get("AE???")).status_code == 400
+    assert asyncio.run(get("AEIOUBCD")).status_code == 400
+
+
+def test_wordsearch():
+    words = ["CAT", "CATS", "COAT", "CUTE", "CUTER", "QUIT", "QUIZ", "QI", "ZIZ"]
+    index = PatternIndex(words)
+
+    assert list(index.search("QU*")) == ["QUIT", "QUIZ"]
+    assert list(index.search("C?T*", max_length=4)) == ["CAT", "CATS", "CUTE"]
+    assert list(index.search("??", rack="QI")) == ["QI"]
+    # Pattern letters are on the board, only the gaps use the rack
+    assert list(index.search("C?T?", rack="AE")) == []
+    assert list(index.search("C?T?", rack="U_")) == ["CUTE"]
+    assert len(list(index.search("*", limit=3))) == 3
+
+    for query in [
+        dict(pattern="*T*"),
+        dict(pattern="*Z*Z*"),
+        dict(pattern="C*", rack="AOST"),
+        dict(pattern="?U*", rack="_", min_length=4),
+    ]:
+        assert list(index.search(**query)) == list(brute_force_search(words, **query))
+
+
+def test_movegen():
+    word_list = WordList.load_word_list()
+    b = Board(players=[Player(), Player()], tile_bag=create_tile_bag())
+    b.initialize(word_list)
+    b.players[0].word_bank.hand = [Tile(letter=c) for c in "HELLO"]
+    b.make_move([Tile(letter=c, x=5 + i, y=7) for i, c in enumerate("HELLO")], b.players[0])
+
+    hand = [Tile(letter=c) for c in "RATES"] + [Tile(letter="", is_blank=True)]
+    b.current_player.word_bank.hand = hand
+    moves = list(generate_moves(b))
+    assert moves
+    assert len({frozenset((t.x, t.y, t.letter) for t in m.tiles) for m in moves}) == len(
+        moves
+    )
+    # A bingo uses the variant's whole rack, six tiles can't be one here
+    assert all(m.rack_size == b.variant.rack_size and not m.is_bingo for m in moves)
+    six = max(moves, key=lambda m: len(m.tiles))
+    assert len(six.tiles) == 6
+    assert dataclasses.replace(six, rack_size=6).is_bingo
+
+    # Every generated move is accepted by make_move, for the score we said
+    for move in moves[:: max(1, len(moves) // 50)]:
+        copy = Board.from_save_dict(b.to_save_dict(), word_list)
+        copy.current_player.word_bank.hand = list(hand)
+        before = copy.current_player.score
+        player = copy.current_player
+        copy.make_move([Tile.from_another(t) for t in move.tiles], player)
+        assert player.score - before == move.score, move
+
+    *candidates, done = stream_top_moves(b, hand, k=5)
+    assert done[0] == "done" and done[2]
+    best = done[1]
+    assert [m.score for m in best] == sorted((m.score for m in moves), reverse=True)[:5]
+
+
+def test_simbot():
+    assert leave_value("S_") > leave_value("QVW")
+    assert leave_value("EEE") < leave_value("ERS")
+
+    word_list = WordList.load_word_list()
+    b = Board(players=[Player(), Player()], tile_bag=create_tile_bag())
+    b.initialize(word_list)
+    b.players[0].word_bank.hand = [Tile(letter=c) for c in "QUIRTSE"]
+    state = b.to_save_dict()
+
+    def ranked():
+        bot = SimBot(word_list, candidates=3, rollouts=2, plies=1, workers=0, seed=7)
+        board = Board.from_save_dict(state, word_list)
+        return bot.rank(board, 0)
+
+    first = ranked()
+    assert len(first) == 3
+    assert all(c.rollouts == 2 for c in first)
+    assert [c.equity for c in first] == sorted((c.equity for c in first), reverse=True)
+    # The leave only counts before rollouts, they play the kept tiles out
+    assert all(c.equity == c.move.score + c.total / c.rollouts for c in first)
+    unrolled = Candidate(first[0].move, first[0].static_equity)
+    assert unrolled.equity == unrolled.static_equity
+    # Offline rollouts are reproducible from the seed
+    assert [(c.move.word, c.equity) for c in first] == [
+        (c.move.word, c.equity) for c in ranked()
+    ]
+
+
+def test_endgame():
+    word_list = WordList.load_word_list()
+    b = Board(players=[Player(), Player()], tile_bag=create_tile_bag())
+    b.initialize(word_list)
+    b.players[0].word_bank.hand = [Tile(letter=c) for c in "HELLO"]
+    b.make_move([Tile(letter=c, x=5 + i, y=7) for i, c in enumerate("HELLO")], b.players[0])
+
+    b.tile_bag = []
+    b.players[0].word_bank.hand = [Tile(letter=c, points=tile_points(c)) for c in "QI"]
+    b.players[1].word_bank.hand = [Tile(letter=c, points=tile_points(c)) for c in "AX"]
+    b.current_player = b.players[0]
+
+    def minimax(board):
+        # Plain exhaustive search to check the solver against
+        me = board.players.index(board.current_player)
+        best = None
+        for move in list(generate_moves(board)) + [None]:
+            child = clone(board)
+            child.make_move([] if move is None else list(move.tiles), child.current_player)
+            swing = (child.players[me].score - board.players[me].score) - (
+                child.players[1 - me].score - board.players[1 - me].score
+            )
+            value = swing if child.is_game_over else swing - minimax(child)
+            best = value if best is None else max(best, value)
+        return best
+
+    result = EndgameSolver(time_budget=30).solve(b)
+    assert result.complete
+    assert result.value == b.players[0].score - b.players[1].score + minimax(b)
+
+    try:
+        EndgameSolver().solve(Board(players=[Player(), Player()], tile_bag=create_tile_bag()))
+        assert False, "Should have raised error for a non-empty bag"
+    except ValueError as e:
+        assert "empty tile bag" in str(e)
+
+
+def test_tile_bag():
+    bag = create_tile_bag(seed=42)
+    assert len(bag) == 100
+    assert sum(1 for t in bag if t.is_blank) == 2
+
+    # Same seed, same game, even across a save
+    other = create_tile_bag(seed=42)
+    first = [bag.draw() for _ in range(10)]
+    assert first == [other.draw() for _ in range(10)]
+    other = TileBag.from_save_dict(json.loads(json.dumps(bag.to_save_dict())))
+    assert [bag.draw() for _ in range(10)] == [other.draw() for _ in range(10)]
+    assert len(bag) == 80
+    assert all(t.points == tile_points(t.letter, t.is_blank) for t in first)
+
+    while bag:
+        bag.draw()
+    try:
+        bag.draw()
+        assert False, "Should have raised error for an empty bag"
+    except IndexError:
+        pass
+
+    # Bags saved as a list of tiles still load
+    old = TileBag.from_save_dict([("A", False), ("", True), ("A", False)])
+    assert len(old) == 3 and old.counts[0] == 2 and old.counts[BLANK_SLOT] == 1
+
+    b = Board(players=[Player(), Player()], tile_bag=create_tile_bag(seed=7))
+    b.tile_bag = [Tile(letter="Q")]
+    assert isinstance(b.tile_bag, TileBag) and len(b.tile_bag) == 1
+
+
+def test_tile_bank():
+    bank = TileBank(hand=[Tile(letter=c) for c in "AAB"] + [Tile(letter="", is_blank=True)])
+    assert bank.counts[0] == 2 and bank.counts[1] == 1 and bank.counts[BLANK_SLOT] == 1
+    assert Tile(letter="A") in bank
+    assert Tile(letter="C") not in bank
+    assert Tile(letter="C", is_blank=True) in bank
+
+    # A, A and a blank for the third A, but then no blank left for C
+    assert bank.can_play([Tile(letter="A")] * 3)
+    assert not bank.can_play([Tile(letter="A")] * 3 + [Tile(letter="C")])
+
+    bank.remove_tiles([Tile(letter="A"), Tile(letter="Z")])
+    assert [t.letter for t in bank.hand] == ["A", "B"]
+    assert bank.counts[0] == 1 and bank.counts[BLANK_SLOT] == 0
+    try:
+        bank.remove_tiles([Tile(letter="B"), Tile(letter="B")])
+        assert False, "Should have raised error for a missing tile"
+    except ValueError:
+        pass
+    assert len(bank.hand) == 2, "A failed removal leaves the hand alone"
+
+    bank.get_new_hand(create_tile_bag(seed=1))
+    assert sum(bank.counts) == len(bank.hand) == 7
+
+    # Only changed through the bank, so counts can't fall out of step
+    try:
+        bank.hand.append(Tile(letter="A"))
+        assert False, "Should not be able to change the hand in place"
+    except AttributeError:
+        pass
+    bank.hand = bank.hand[:3]
+    assert sum(bank.counts) == 3
+
+
+def test_occupancy():
+    word_list = WordList.load_word_list()
+    b = Board(players=[Player(), Player()], tile_bag=create_tile_bag(seed=5))
+    b.initialize(word_list)
+
+    def check_masks(board):
+        for y in range(BOARD_SIZE):
+            for x in range(BOARD_SIZE):
+                filled = bool(board.board[y][x].letter)
+                assert bool(board.rows[y] >> x & 1) == filled
+                assert bool(board.cols[x] >> y & 1) == filled
+                letter = board.board[y][x].letter or " "
+                assert board.row_strings[y][x] == board.col_strings[x][y] == letter
+
+    b.players[0].word_bank.hand = [Tile(letter=c) for c in "HELLO"]
+    record = b.apply_move(
+        [Tile(letter=c, x=5 + i, y=7) for i, c in enumerate("HELLO")], b.players[0]
+    )
+    check_masks(b)
+    assert b.rows[7] == 0b11111 << 5
+    assert not b.is_free("h", 7, 4, 5) and b.is_free("h", 7, 10, 14)
+    assert b.is_free("v", 5, 0, 6) and not b.is_free("v", 5, 0, 7)
+    # Squares around HELLO: both ends of the row, and above and below it
+    assert b.anchors("h", 7) == (1 << 4) | (1 << 10)
+    assert b.anchors("h", 6) == b.anchors("h", 8) == 0b11111 << 5
+    assert b.anchors("v", 4) == 1 << 7
+
+    assert b.is_contiguous([Tile(letter="S", x=10, y=7)])
+    assert b.is_contiguous([Tile(letter="A", x=4, y=7), Tile(letter="S", x=10, y=7)])
+    assert not b.is_contiguous([Tile(letter="A", x=3, y=7), Tile(letter="S", x=10, y=7)])
+    assert b.touches_existing_tile([Tile(letter="A", x=6, y=8)], False)
+    assert not b.touches_existing_tile([Tile(letter="A", x=6, y=9)], False)
+
+    record_rng = b.tile_bag.rng
+    b.undo_move(record)
+    check_masks(b)
+    assert not any(b.rows) and not any(b.cols)
+
+    # Masks are built once, not on every attribute write
+    assert Board.__setattr__ is object.__setattr__
+    b.tile_bag = [Tile(letter="A")]
+    assert isinstance(b.tile_bag, TileBag) and b.tile_bag.rng == record_rng
+
+
+def test_batch():
+    np = pytest.importorskip("numpy")
+    from . import batch
+
+    word_list = WordList.load_word_list()
+    rng = random.Random(4)
+    b = Board(players=[Player(), Player()], tile_bag=create_tile_bag(seed=4))
+    b.initialize(word_list)
+
+    boards, moves = [], []
+    for _ in range(6):
+        generated = list(generate_moves(b))
+        for move in rng.sample(generated, min(10, len(generated))):
+            boards.append(Board.from_save_dict(b.to_save_dict(), word_list))
+            moves.append(move.tiles)
+        best = max(generated, key=lambda m: m.score)
+        b.make_move(best.tiles, b.current_player)
+
+    letters, blanks = batch.stack_boards(boards)
+    new_letters, new_blanks = batch.stack_moves(moves)
+    assert letters.shape == (len(boards), BOARD_SIZE, BOARD_SIZE)
+
+    scores = batch.move_scores(letters, new_letters, new_blanks)
+    vertical, main, cross = batch.move_words(letters, new_letters)
+    both = np.where(new_letters > 0, new_letters, letters)
+    for i, (board, move) in enumerate(zip(boards, moves)):
+        words, score = board.score_move(move)
+        assert scores[i] == score
+        squares = main[i].T if vertical[i] else main[i]
+        grid = both[i].T if vertical[i] else both[i]
+        assert "".join(ALPHABET[c - 1] for c in grid[squares]) == words[0][0]
+        assert cross[i].sum() == len(words) - 1
+
+        anchors = batch.anchors(letters[i : i + 1])[0]
+        for y in range(BOARD_SIZE):
+            assert sum(1 << x for x in range(BOARD_SIZE) if anchors[y, x]) == board.anchors("h", y)
+
+    up, down, left, right = batch.cross_extents(batch.occupancy(letters[-1:]))
+    # left[y, x] counts the tiles running left from each square
+    last = boards[-1]
+    for y in range(BOARD_SIZE):
+        for x in range(BOARD_SIZE):
+            run = 0
+            while x - run - 1 >= 0 and last.board[y][x - run - 1].letter:
+                run += 1
+            assert left[0, y, x] == run
+
+
+def test_zobrist():
+    word_list = WordList.load_word_list()
+    random.seed(3)
+    b = Board(players=[Player(), Player()], tile_bag=create_tile_bag())
+    b.initialize(word_list)
+    start = b.state_hash
+
+    # Incremental updates match hashing from scratch for a whole game
+    while not b.is_game_over:
+        best = max(generate_moves(b), key=lambda m: m.score, default=None)
+        b.make_move(best.tiles if best else [], b.current_player)
+        assert b.state_hash == zobrist.board_hash(b)
+    assert b.state_hash != start
+
+    # Rejected moves leave the hash alone
+    b = Board(players=[Player(), Player()], tile_bag=create_tile_bag())
+    b.initialize(word_list)
+    before = b.state_hash
+    try:
+        b.make_move([Tile(letter="Q", x=0, y=0)], b.current_player)
+    except ValueError:
+        pass
+    assert b.state_hash == before
+
+    # Only the state counts, not how we got there
+    b.make_move([], b.current_player)
+    copy = Board.from_save_dict(b.to_save_dict(), word_list)
+    assert copy.state_hash == b.state_hash
+    bank = copy.players[1].word_bank
+    bank.hand = reversed(bank.hand)
+    copy.rehash()
+    assert copy.state_hash == b.state_hash
+    bank.pop()
+    copy.rehash()
+    assert copy.state_hash != b.state_hash
+
+
+def test_apply_undo():
+    word_list = WordList.load_word_list()
+    rng = random.Random(11)
+
+    for game in range(3):
+        random.seed(game)
+        b = Board(players=[Player() for _ in range(2 + game)], tile_bag=create_tile_bag())
+        b.initialize(word_list)
+        # Random walk: play a random legal move (or pass), or take the last one
+        # back, and check every undo gets back exactly to where we were
+        history = []
+        for _ in range(40):
+            if history and (b.is_game_over or rng.random() < 0.3):
+                saved, saved_hash, record = history.pop()
+                b.undo_move(record)
+                assert b.to_save_dict() == saved
+                assert b.state_hash == saved_hash == zobrist.board_hash(b)
+                continue
+            moves = list(generate_moves(b))
+            move = rng.choice(moves) if moves and rng.random() < 0.9 else None
+            saved, saved_hash = b.to_save_dict(), b.state_hash
+            record = b.apply_move([] if move is None else move.tiles, b.current_player)
+            history.append((saved, saved_hash, record))
+
+    # Rejected moves don't need undoing
+    before = b.to_save_dict()
+    try:
+        b.apply_move([Tile(letter="Q", x=0, y=0)], b.current_player)
+    except ValueError:
+        pass
+    assert b.to_save_dict() == before
+
+
+def test_profiling(monkeypatch, tmp_path):
+    import pstats
+
+    profiler = RequestProfiler(directory=tmp_path, sample_rate=0, min_interval=0, max_files=2)
+
+    async def handler(run, turn=3):
+        run.turn = turn
+        sum(range(1000))
+        return turn
+
+    assert asyncio.run(profiler.profile({}, "g1", "state", handler)) == 3
+    assert not list(tmp_path.glob("*.prof")), "Should not profile without the header or sampling"
+
+    async def profiled(turn):
+        runs = []
+
+        async def record(run):
+            runs.append(run)
+            return await handler(run, turn)
+
+        await profiler.profile({"x-scrabble-profile": "1"}, "g/1", "make_move", record)
+        return runs[0]
+
+    for turn in range(3):
+        run = asyncio.run(profiled(turn))
+        assert run.path.name.startswith(f"g_1-turn{turn:04d}-make_move-")
+
+    # Pruned down to max_files
+    assert len(list(tmp_path.glob("*.prof"))) == 2
+
+    # What other tasks run while the request waits isn't blamed on it
+    def someone_else():
+        return sum(range(1000))
+
+    async def waits(run):
+        await asyncio.sleep(0.01)
+        return run
+
+    async def both():
+        asyncio.get_running_loop().call_soon(someone_else)
+        return await profiler.profile({"x-scrabble-profile": "1"}, "g2", "state", waits)
+
+    stats = pstats.Stats(str(asyncio.run(both()).path))
+    assert not any(name == "someone_else" for _, _, name in stats.stats)
+    assert any(name == "waits" for _, _, name in stats.stats)
+
+    # The header is rate limited like sampling
+    limited = RequestProfiler(directory=tmp_path / "limited", sample_rate=0, min_interval=60)
+    for turn in range(2):
+        asyncio.run(limited.profile({"x-scrabble-profile": "1"}, "g3", "state", handler))
+    assert len(list((tmp_path / "limited").glob("*.prof"))) == 1
+
+    # A profile that can't be written doesn't fail the request it was for
+    metrics.reset()
+    blocked = tmp_path / "blocked"
+    blocked.write_text("a file, not a directory")
+    broken = RequestProfiler(directory=blocked, sample_rate=0, min_interval=0)
+    assert asyncio.run(broken.profile({"x-scrabble-profile": "1"}, "g4", "state", handler)) == 3
+    assert metrics.counters["scrabble_profiles_total"][(("result", "failed"),)] == 1
+
+    # A file another request's prune removed after we listed it is skipped
+    gone = tmp_path / "gone.prof"
+    monkeypatch.setattr(type(tmp_path), "glob", lambda self, pattern: iter([gone]))
+    RequestProfiler(directory=tmp_path, max_files=0).prune()
+
+
+def test_llm_player():
+    httpx = pytest.importorskip("httpx")
+    from frontend.llm import LLMPlayer, check_move, proposal_to_locations
+
+    word_list = WordList.load_word_list()
+    b = Board(players=[Player(), Player()], tile_bag=create_tile_bag(seed=3))
+    b.initialize(word_list)
+    b.players[0].word_bank.hand = [Tile(letter=c) for c in "HELLOXZ"]
+    state = b.to_save_dict()
+
+    legal = {"word": "HELLO", "start": [5, 7], "direction": "h", "blanks": []}
+    off_center = {"word": "HELLO", "start": [0, 0], "direction": "h", "blanks": []}
+    answers = [off_center, legal, {"word": None}]
+    calls = []
+
+    # Stands in for the OpenAI proxy
+    def proxy(request):
+        calls.append(json.loads(request.content))
+        answer = answers[(len(calls) - 1) % len(answers)]
+        return httpx.Response(
+            200, json={"output": [{"content": [{"text": json.dumps(answer)}]}]}
+        )
+
+    async def play(player, state):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(proxy)) as client:
+            return await player.choose(client, state, 0)
+
+    player = LLMPlayer("gpt-4.1-nano", word_list, "http://proxy", candidates=3)
+    locations = asyncio.run(play(player, state))
+    assert [(l["letter"], l["x"]) for l in locations] == list(zip("HELLO", range(5, 10)))
+    assert calls[0]["model"] == "gpt-4.1-nano" and len(calls) == 3
+
+    # Same position and rack, answered from the cache
+    assert asyncio.run(play(player, state)) == locations
+    assert len(calls) == 3
+    player.forget(state, 0)
+    asyncio.run(play(player, state))
+    assert len(calls) == 6
+
+    # Nothing legal after every round, so pass
+    answers[:] = [off_center]
+    calls.clear()
+    b.players[0].word_bank.hand = [Tile(letter=c) for c in "HELLOXY"]
+    player = LLMPlayer("gpt-4.1-nano", word_list, "http://proxy", candidates=2, rounds=2)
+    assert asyncio.run(play(player, b.to_save_dict())) == []
+    assert len(calls) == 4
+
+    # Letters already on the board are part of the word, not new tiles
+    b.make_move([Tile(letter=c, x=5 + i, y=7) for i, c in enumerate("HELLO")], b.players[0])
+    locations = proposal_to_locations(
+        {"word": "HELLOS", "start": [5, 7], "direction": "h", "blanks": [6]}, b
+    )
+    assert locations == [{"letter": "S", "x": 10, "y": 7, "is_blank": True}]
+
+    # Garbage from the model is skipped, not a crash
+    for bad in [
+        {"word": "ÉTÉ", "start": [7, 7], "direction": "h", "blanks": []},
+        {"word": "HELLO", "start": ["7", "7"], "direction": "h", "blanks": []},
+        {"word": "HELLO", "start": [7.0, 7], "direction": "h", "blanks": []},
+        {"word": "HELLO", "start": [7, 7], "direction": "h", "blanks": "1"},
+        ["HELLO", 7, 7],
+    ]:
+        try:
+            proposal_to_locations(bad, b)
+            assert False, f"Should have raised error for {bad!r}"
+        except ValueError:
+            pass
+    assert check_move(b, [{"letter": "É", "x": 7, "y": 8, "is_blank": False}], 1)
+
+    # Prompt sizes follow the variant
+    answers[:] = [["not", "a", "move"], legal]
+    calls.clear()
+    b = Board(players=[Player(), Player()], tile_bag=create_tile_bag(seed=3), variant=SUPER)
+    b.initialize(word_list)
+    b.players[0].word_bank.hand = [Tile(letter=c) for c in "HELLOXZ"]
+    legal["start"] = [8, 10]
+    player = LLMPlayer("gpt-4.1-nano", word_list, "http://proxy", candidates=2)
+    locations = asyncio.run(play(player, b.to_save_dict()))
+    assert [(l["letter"], l["x"], l["y"]) for l in locations][0] == ("H", 8, 10)
+    prompt = calls[0]["system_prompt"]
+    assert "(20,20)" in prompt and "cover (10, 10)" in prompt and "0-20" in prompt
+
+
+def test_broadcast():
+    from .broadcast import BroadcastHub
+
+    metrics.reset()
+
+    async def scenario():
+        hub = BroadcastHub(send_timeout=0.01)
+        assert hub.publish("g", {"turn": 0}) == 0  # Nobody watching
+        fast, slow = hub.subscribe("g"), hub.subscribe("g")
+        assert hub.spectators == 2
+
+        hub.publish("g", {"turn": 1})
+        assert json.loads(await fast.next()) == json.loads(await slow.next()) == {"turn": 1}
+        hub.publish("g", {"turn": 2})
+        assert json.loads(await fast.next())["turn"] == 2
+        hub.publish("g", {"turn": 3})
+        assert json.loads(await fast.next())["turn"] == 3
+        # The slow one skips straight to the newest state
+        assert json.loads(await slow.next())["turn"] == 3
+
+        waiting = asyncio.create_task(fast.next())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        hub.publish("g", {"turn": 4})
+        assert json.loads(await waiting)["turn"] == 4
+        fast.close()
+
+        # A send that hangs past the timeout drops the spectator
+        async def hang(frame):
+            await asyncio.sleep(1)
+
+        await hub.serve(slow, hang)
+        assert hub.spectators == 0 and "g" not in hub.channels
+
+    asyncio.run(scenario())
+    frames = metrics.counters["scrabble_spectator_frames_total"]
+    assert frames[(("result", "coalesced"),)] == 1
+    assert frames[(("result", "dropped"),)] == 1
+    assert "scrabble_spectators 0" in metrics.render()
+
+
+def test_spectate(monkeypatch):
+    testclient = pytest.importorskip("fastapi.testclient")
+    from . import loadtest, scrabble
+    from .server import HUB, app, spectate
+
+    monkeypatch.setattr(scrabble, "rd", loadtest.InMemoryRedis())
+
+    class Leaves:
+        # A spectator that disconnects straight away
+        async def accept(self):
+            pass
+
+        async def receive(self):
+            assert HUB.spectators == 1
+            return {"type": "websocket.disconnect", "code": 1000}
+
+        async def send_text(self, frame):
+            raise AssertionError("Nothing to send before /start")
+
+    # Leaving unsubscribes at once, not at the next publish
+    asyncio.run(asyncio.wait_for(spectate(Leaves(), "watched"), 1))
+    assert HUB.spectators == 0 and "watched" not in HUB.channels
+
+    client = testclient.TestClient(app)
+    client.post("/start?game_id=watched", json={"num_players": 2, "seed": 1})
+    with client.websocket_connect("/spectate?game_id=watched") as websocket:
+        state = json.loads(websocket.receive_text())
+        assert state["turn"] == 0 and len(state["players"]) == 2
+        assert HUB.spectators == 1
+    assert HUB.spectators == 0
+
+
+def test_live_renderer():
+    import io
+
+    from frontend.render import LiveRenderer
+
+    word_list = WordList.load_word_list()
+    b = Board(players=[Player(), Player()], tile_bag=create_tile_bag(seed=2))
+    b.initialize(word_list)
+    now = [0.0]
+    out = io.StringIO()
+    renderer = LiveRenderer(out, color=True, max_fps=10, clock=lambda: now[0])
+
+    assert renderer.update(b.to_save_dict())
+    assert out.getvalue().startswith("\x1b[2J")
+
+    b.players[0].word_bank.hand = [Tile(letter=c) for c in "HELLO"]
+    b.make_move([Tile(letter=c, x=5 + i, y=7) for i, c in enumerate("HELLO")], b.players[0])
+    # Too soon after the last frame, held back until flush
+    now[0] = 0.05
+    assert not renderer.update(b.to_save_dict())
+    out.seek(0)
+    out.truncate()
+    now[0] = 0.1
+    assert renderer.flush()
+    frame = out.getvalue()
+    assert "\x1b[2J" not in frame
+    # Five cells in row 7 (terminal row 10), then the changed panel lines
+    for i, c in enumerate("HELLO"):
+        assert f"\x1b[10;{5 + 3 * (5 + i)}H{c}" in frame
+    assert frame.count("\x1b[2K") == 3  # Turn line and both players change
+    assert not renderer.flush()
+
+    # Same state again, nothing to draw
+    now[0] = 1.0
+    out.seek(0)
+    out.truncate()
+    assert not renderer.update(b.to_save_dict())
+    assert out.getvalue() == ""
+
+    plain = io.StringIO()
+    LiveRenderer(plain, color=False).update(b.to_save_dict())
+    assert "\x1b" not in plain.getvalue()
+    assert " H  E  L  L  O " in plain.getvalue()
+
+
+def test_bot_pool(monkeypatch):
+    from . import botpool, scrabble
+    from .botpool import BotPool
+    from .loadtest import InMemoryRedis
+
+    metrics.reset()
+    fake = InMemoryRedis()
+    monkeypatch.setattr(scrabble, "rd", fake)
+    word_list = WordList.load_word_list()
+    moved = []
+
+    async def scenario():
+        pool = BotPool(
+            word_list,
+            on_move=lambda game_id, board: moved.append((game_id, board.turn)),
+            workers=0,
+            time_limit=2,
+        )
+        b = Board(players=[Player(bot="greedy"), Player()], tile_bag=create_tile_bag(7))
+        b.initialize(word_list)
+        await b.save_to_redis("bots")
+
+        # Queued once however many times it is asked for
+        task = pool.schedule("bots", b)
+        assert pool.schedule("bots", b) is task and len(pool.jobs) == 1
+        await task
+        assert not pool.jobs
+
+        after = await Board.load_from_redis(word_list, "bots")
+        assert after.turn == 1 and after.players[0].score > 0
+        assert after.current_player is after.players[1]
+        # The person's turn now, nothing queued
+        assert pool.schedule("bots", after) is None
+
+        # A job for a position that has moved on does nothing
+        after.make_move([], after.players[1])
+        await after.save_to_redis("bots")
+        await pool.play_turn("bots", b.start_id, b.state_hash)
+        assert (await Board.load_from_redis(word_list, "bots")).turn == 2
+
+        # Nor does one for a game restarted since, even with the same seed
+        again = Board(players=[Player(bot="greedy"), Player()], tile_bag=create_tile_bag(7))
+        again.start_id = "restarted"
+        again.initialize(word_list)
+        assert again.state_hash == b.state_hash
+        await again.save_to_redis("bots")
+        await pool.play_turn("bots", b.start_id, b.state_hash)
+        assert (await Board.load_from_redis(word_list, "bots")).turn == 0
+
+        # A search that blows up passes, so the game isn't stuck on the bot
+        async def broken(*args):
+            raise RuntimeError("worker died")
+
+        pool.search = broken
+        await pool.schedule("bots", again)
+        after = await Board.load_from_redis(word_list, "bots")
+        assert after.turn == 1 and after.moves == [[]]
+
+        # Failing anywhere else (Redis) is tried again
+        monkeypatch.setattr(botpool, "RETRY_DELAY", 0)
+        loads = []
+
+        async def flaky(cls, *args):
+            loads.append(1)
+            if len(loads) == 1:
+                raise ConnectionError("Redis went away")
+            return await load(*args)
+
+        load = Board.load_from_redis
+        monkeypatch.setattr(Board, "load_from_redis", classmethod(flaky))
+        after.make_move([], after.players[1])
+        await after.save_to_redis("bots")
+        await pool.schedule("bots", after)
+        assert (await load(word_list, "bots")).turn == 3
+
+    asyncio.run(scenario())
+    assert moved == [("bots", 1), ("bots", 1), ("bots", 3)]
+    assert fake.published[0] == ("scrabble:pubsub", "Player 0 made a move")
+    moves = metrics.counters["scrabble_bot_moves_total"]
+    assert moves[(("bot", "greedy"), ("result", "played"))] == 1
+    assert moves[(("bot", "greedy"), ("result", "error"))] == 2
+    assert moves[(("bot", "unknown"), ("result", "error"))] == 1
+
+
+def test_loadtest(monkeypatch):
+    import argparse
+
+    from . import loadtest, scrabble
+
+    monkeypatch.setattr(scrabble, "rd", scrabble.rd)  # run() swaps it out
+    args = argparse.Namespace(
+        games=3,
+        turns=3,
+        moves="greedy",
+        clients=2,
+        url=None,
+        watchers=0,
+        redis_latency=0,
+        no_coalesce=False,
+    )
+    recorder, elapsed, fake = asyncio.run(loadtest.run(args))
+
+    assert not recorder.errors
+    assert len(recorder.latencies["/start"]) == 3
+    assert len(recorder.latencies["/state"]) == len(recorder.latencies["/make_move"]) / 2 == 9
+    # Both clients submit every turn: one wins, or both do and one save is lost
+    assert recorder.conflicts + recorder.lost_updates == 9
+    assert fake.ops["json.set"] == 3 + 9 + recorder.lost_updates
+
+
+def test_opening_book(tmp_path):
+    from . import opening
+
+    assert opening.RACKS == 3199724
+    rng = random.Random(4)
+    for rank in [0, opening.RACKS - 1] + [rng.randrange(opening.RACKS) for _ in range(200)]:
+        assert opening.rack_rank(opening.rack_unrank(rank)) == rank
+
+    # The first-move search agrees with the full move generator
+    word_list = WordList.load_word_list()
+    bag = TileBag.full(0)
+    for _ in range(20):
+        counts = opening.rack_unrank(rng.randrange(opening.RACKS))
+        b = Board(players=[Player(), Player()], tile_bag=create_tile_bag(0))
+        b.initialize(word_list)
+        b.players[0].word_bank.hand = [
+            bag.make_tile(slot) for slot, n in enumerate(counts) for _ in range(n)
+        ]
+        best = opening.best_first_move(opening.counts_to_rack(counts), word_list)
+        expected = max((m.score for m in generate_moves(b)), default=None)
+        assert (best[0] if best else None) == expected
+
+    path = tmp_path / "opening.book"
+    opening.build(path, workers=1, limit=50)
+    assert path.stat().st_size == opening.HEADER.size + opening.RACKS * 8
+    book = opening.OpeningBook(path)
+    for rank in range(50):
+        counts = opening.rack_unrank(rank)
+        hand = [bag.make_tile(slot) for slot, n in enumerate(counts) for _ in range(n)]
+        best = opening.best_first_move(opening.counts_to_rack(counts), word_list)
+        move = book.lookup(hand)
+        if best is None:
+            assert move is None  # e.g. VWWXYYZ has no word
+            continue
+        assert (move.score, move.word, move.x) == best[:3]
+        # Legal, and worth what the book says
+        b = Board(players=[Player(), Player()], tile_bag=create_tile_bag(0))
+        b.initialize(word_list)
+        b.players[0].word_bank.hand = hand
+        b.make_move(move.tiles, b.players[0])
+        assert b.players[0].score == move.score
+    with pytest.raises(KeyError):
+        book.lookup(TileBank(hand=[Tile(letter=c) for c in "QUIETSX"]))
+    # Worked out for the standard board, no use on another
+    with pytest.raises(ValueError):
+        book.lookup(hand, VARIANTS["super"])
+    book.close()
+
+
+def test_archive(monkeypatch, tmp_path):
+    from .archive import HEADER, LENGTH, Archive, ArchivedGame
+
+    word_list = WordList.load_word_list()
+    boards = []
+    for seed in range(3):
+        b = Board(players=[Player(bot="greedy"), Player()], tile_bag=create_tile_bag(seed))
+        b.initialize(word_list)
+        for _ in range(4):
+            best = max(generate_moves(b), key=lambda m: m.score, default=None)
+            b.make_move(best.tiles if best else [], b.current_player)
+        while not b.is_game_over:
+            b.make_move([], b.current_player)
+        boards.append(b)
+        # Move history survives a save
+        assert Board.from_save_dict(b.to_save_dict(), word_list).moves == b.moves
+
+    # Tiny blocks and segments, so this crosses both
+    archive = Archive(tmp_path, segment_bytes=1, block_records=2)
+    ids = [archive.append(ArchivedGame.from_board(f"game-{i % 3}", boards[i % 3])) for i in range(7)]
+    assert ids == list(range(7))
+    assert archive.indexed == 6 and len(archive.pending) == 1
+    assert len(list(tmp_path.glob("segment-*.dat"))) == 3
+
+    # Reopened, the unflushed game is still there
+    archive = Archive(tmp_path, segment_bytes=1, block_records=2)
+    assert len(archive) == 7
+    for archive_id in (6, 0, 4, 3):
+        game = archive.get(archive_id)
+        b = boards[archive_id % 3]
+        assert game.game_id == f"game-{archive_id % 3}"
+        assert game.bots == ["greedy", None]
+        assert game.scores == [p.score for p in b.players]
+        # Replaying from the seed gets to the same place
+        replayed = game.replay(word_list)
+        assert replayed.is_game_over
+        assert replayed.state_hash == b.state_hash
+        assert [p.score for p in replayed.players] == game.scores
+    with pytest.raises(KeyError):
+        archive.get(7)
+
+    # Found again by game id, indexed or still pending, after a restart too
+    assert archive.find("game-0") == [0, 3, 6] and archive.find("game-1") == [1, 4]
+    assert archive.find("nope") == []
+    # Stopped after indexing blocks but before naming their games
+    (tmp_path / "games.dat").write_bytes((tmp_path / "games.dat").read_bytes()[:-3])
+    archive = Archive(tmp_path, segment_bytes=1, block_records=2)
+    assert archive.find("game-0") == [0, 3, 6] and archive.find("game-2") == [2, 5]
+    archive.append(ArchivedGame.from_board("game-2", boards[2]))
+    archive = Archive(tmp_path, segment_bytes=1, block_records=2)
+    assert archive.find("game-2") == [2, 5, 7] and archive.get(7).game_id == "game-2"
+
+    # A few bytes a tile
+    game = ArchivedGame.from_board("game-0", boards[0])
+    tiles = sum(len(m) for m in game.moves)
+    assert len(game.encode()) == HEADER.size + 2 + len("game-0") + 2 * 3 + len(game.moves) + 2 * tiles
+    assert ArchivedGame.decode(game.encode()) == game
+    long_id = ArchivedGame.from_board("é" * 300, boards[0])
+    assert ArchivedGame.decode(long_id.encode()) == long_id
+
+    # Stopped after a block was indexed but before pending.dat was cleared:
+    # the games in that block aren't archived twice
+    crashed = Archive(tmp_path / "crashed", block_records=2)
+    crashed.append(game)
+    before_flush = crashed.pending_path.read_bytes()
+    crashed.append(game)
+    record = game.encode()
+    crashed.pending_path.write_bytes(before_flush + LENGTH.pack(len(record)) + record)
+    crashed = Archive(tmp_path / "crashed", block_records=2)
+    assert len(crashed) == 2 and not crashed.pending
+    assert crashed.append(game) == 2
+
+    # The server archives in a thread, and a failure there doesn't fail the move
+    httpx = pytest.importorskip("httpx")
+    from . import server
+
+    metrics.reset()
+
+    async def archive_twice():
+        await server.archive_game(game)
+        monkeypatch.setattr(server.ARCHIVE, "append", lambda game: 1 / 0)
+        future = server.archive_game(game)
+        await asyncio.wait([future])
+
+    monkeypatch.setattr(server, "ARCHIVE", Archive(tmp_path / "server"))
+    asyncio.run(archive_twice())
+    archived = metrics.counters["scrabble_games_archived_total"]
+    assert archived[(("result", "archived"),)] == archived[(("result", "failed"),)] == 1
+    assert len(Archive(tmp_path / "server")) == 1
+    metrics.reset()
+
+    async def start(game_id):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(f"/start?game_id={game_id}", json={"num_players": 2})
+
+    assert asyncio.run(start("x" * 65)).status_code == 422
+
+    async def look_up():
+        await server.archive_game(game)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/archive", params={"game_id": game.game_id})
+            missing = await client.get("/archive", params={"game_id": "never-finished"})
+        return response.json()["games"], missing.json()["games"]
+
+    monkeypatch.setattr(server, "ARCHIVE", Archive(tmp_path / "lookup"))
+    found, missing = asyncio.run(look_up())
+    assert [g["archive_id"] for g in found] == [0] and found[0]["moves"] and not missing
+
+
+def test_analysis(monkeypatch, tmp_path, capsys):
+    import io
+
+    from .analysis import analyze
+    from .archive import ArchivedGame
+
+    word_list = WordList.load_word_list()
+    b = Board(players=[Player(), Player()], tile_bag=create_tile_bag(5))
+    b.initialize(word_list)
+    position = b.to_save_dict()
+    # Player 0 always plays their second best move, player 1 their best
+    for turn in range(4):
+        ranked = best_moves(b, k=2)
+        b.make_move(ranked[turn % 2 == 0 and len(ranked) > 1].tiles, b.current_player)
+    game = ArchivedGame.from_board("coached", b)
+    lines = [json.dumps(position), "", "not json", json.dumps(game.to_dict())]
+
+    for workers in (0, 1):
+        out = io.StringIO()
+        assert analyze(lines, out, workers=workers, window=1, top=2) == (3, 1)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [r["line"] for r in results] == [1, 3, 4]
+
+        first = results[0]
+        assert first["player"] == 0 and first["complete"]
+        assert [m["score"] for m in first["best"]] == [m.score for m in best_moves(
+            Board.from_save_dict(position, word_list), k=2
+        )]
+        assert "error" in results[1]
+
+        analysis = results[2]
+        assert analysis["game_id"] == "coached"
+        assert [t["player"] for t in analysis["turns"]] == [0, 1, 0, 1]
+        for t in analysis["turns"]:
+            assert t["score"] + t["lost"] == t["best"]["score"]
+        assert analysis["lost"][0] > 0 and analysis["lost"][1] == 0
+        assert analysis["lost"][0] == sum(t["lost"] for t in analysis["turns"][::2])
+
+    # A bingo is only missed if it would have scored more than the move played
+    from . import analysis as module
+    from .movegen import Move
+
+    def search_with_bingo(score):
+        def search(board, top, time_limit):
+            tiles = [Tile(letter="A", x=i, y=7) for i in range(7)]
+            return best_moves(board, k=1), Move(tiles, score, "A" * 7, 0, 7, "h"), True
+
+        return search
+
+    monkeypatch.setattr(module, "search", search_with_bingo(1))
+    assert not any(t["missed_bingo"] for t in module.analyze_game(game, word_list)["turns"])
+    monkeypatch.setattr(module, "search", search_with_bingo(999))
+    turns = module.analyze_game(game, word_list)["turns"]
+    assert all(bool(t["missed_bingo"]) == (len(t["played"]) != 7) for t in turns)
+    assert any(t["missed_bingo"] for t in turns)
+
+    # The CLI leaves stdout open for whoever prints next
+    monkeypatch.undo()
+    path = tmp_path / "positions.jsonl"
+    path.write_text(json.dumps(position) + "\n")
+    module.main([str(path), "--workers", "0", "--top", "1"])
+    assert not sys.stdout.closed
+    assert json.loads(capsys.readouterr().out)["line"] == 1
+
+
+def test_variants(tmp_path):
+    from .archive import Archive, ArchivedGame
+    from .variants import SUPER_MULTIPLIERS, SUPER_TILE_INFO, mirrored_layout
+
+    # The standard layout is one quarter mirrored, like the super one
+    quarter = {
+        (x, y): m for y, row in enumerate(BOARD_MULTIPLIERS[:8]) for x, m in enumerate(row[:8]) if m
+    }
+    assert mirrored_layout(15, quarter) == BOARD_MULTIPLIERS
+    assert SUPER.center == (10, 10) and SUPER_MULTIPLIERS[10][10] == "DWS"
+    assert sum(count for count, _ in SUPER_TILE_INFO.values()) == 200
+    with pytest.raises(ValueError):
+        Variant("broken", 21, BOARD_MULTIPLIERS, TILE_INFO)
+
+    word_list = WordList.load_word_list()
+    players = [Player() for _ in range(4)]
+    b = Board(players=players, tile_bag=create_tile_bag(3, SUPER), variant=SUPER)
+    b.initialize(word_list)
+    assert len(b.board) == 21 and len(b.tile_bag) == 200 - 4 * 7
+
+    # The first move has to cover the variant's center, not (7, 7)
+    hand = b.current_player.word_bank.hand
+    with pytest.raises(ValueError):
+        b.make_move([Tile(letter=hand[0].letter, x=7, y=7)], b.current_player)
+    for _ in range(8):
+        best = max(generate_moves(b), key=lambda m: m.score, default=None)
+        if b.is_first_word:
+            assert any((t.x, t.y) == (10, 10) for t in best.tiles)
+        b.make_move(best.tiles if best else [], b.current_player)
+        assert b.state_hash == zobrist.board_hash(b)
+
+    loaded = Board.from_save_dict(json.loads(json.dumps(b.to_save_dict())), word_list)
+    assert loaded.variant is SUPER and loaded.board == b.board
+    assert loaded.to_save_dict()["board"][0][0][2] == "TWS"
+
+    # Archived and replayed on the right board
+    while not b.is_game_over:
+        b.make_move([], b.current_player)
+    archive = Archive(tmp_path)
+    game = archive.get(archive.append(ArchivedGame.from_board("super", b)))
+    assert game.variant == "super"
+    assert game.replay(word_list).state_hash == b.state_hash
+
+
+def test_single_flight(monkeypatch):
+    import argparse
+
+    from . import loadtest, scrabble
+    from .singleflight import SingleFlight
+
+    calls = []
+
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def load():
+            calls.append(len(calls) + 1)
+            number = calls[-1]
+            await asyncio.sleep(0.01)
+            return number
+
+        # Ten at once share one load
+        results = await asyncio.gather(*(flight.do("g", load) for _ in range(10)))
+        assert results == [1] * 10 and not flight.in_flight
+
+        # One caller giving up doesn't cancel it for the others
+        first = asyncio.ensure_future(flight.do("g", load))
+        second = asyncio.ensure_future(flight.do("g", load))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == 2
+
+        # After forget, a new call doesn't join the load already in flight
+        before = asyncio.ensure_future(flight.do("g", load))
+        await asyncio.sleep(0)
+        flight.forget("g")
+        assert await flight.do("g", load) == 4 and await before == 3
+
+        async def broken():
+            raise TypeError("no game")
+
+        with pytest.raises(TypeError):
+            await asyncio.gather(flight.do("h", broken), flight.do("h", broken))
+        assert not flight.in_flight
+
+    asyncio.run(scenario())
+
+    # A burst of /state after every move is one Redis fetch per game
+    monkeypatch.setattr(scrabble, "rd", scrabble.rd)
+    args = argparse.Namespace(
+        games=2,
+        turns=2,
+        moves="pass",
+        clients=1,
+        url=None,
+        watchers=10,
+        redis_latency=1,
+        no_coalesce=False,
+    )
+    recorder, _, fake = asyncio.run(loadtest.run(args))
+    assert not recorder.errors and len(recorder.latencies["/state"]) == 2 * 2 * 11
+    # Each turn: the player's /state, /make_move, then one for all ten watchers
+    assert fake.ops["json.get"] == 2 * 2 * 3
+
+    async def shared():
+        import httpx
+
+        from .server import app, load_state
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post("/start", params={"game_id": "shared"}, json={"num_players": 2})
+            # Everyone waiting on the load gets the same payload, so nobody may change it
+            (_, first), (_, second) = await asyncio.gather(
+                load_state("shared"), load_state("shared")
+            )
+            assert first is second
+            with pytest.raises(TypeError):
+                first["turn"] = 5
+            response = await client.get("/state", params={"game_id": "shared"})
+            assert response.json()["state_hash"] == first["state_hash"]
+
+    asyncio.run(shared())
+
+
+def test_audit_log(monkeypatch, tmp_path, caplog):
+    import argparse
+
+    from . import loadtest, scrabble
+    from .audit import AuditLog, JsonlSink, RedisStreamSink
+
+    metrics.reset()
+
+    class Sink:
+        def __init__(self, delay=0.0, fail=False):
+            self.batches = []
+            self.delay = delay
+            self.fail = fail
+
+        async def write(self, records):
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise ConnectionError("sink down")
+            self.batches.append(records)
+
+    async def scenario():
+        # Batched in the background
+        sink = Sink()
+        log = AuditLog(sink, batch_size=3, flush_interval=0.01)
+        for i in range(7):
+            assert log.record("g", i % 2, [], True, seconds=0.001)
+        await asyncio.sleep(0.05)
+        assert [len(b) for b in sink.batches] == [3, 3, 1]
+        assert [r["player"] for b in sink.batches for r in b] == [0, 1, 0, 1, 0, 1, 0]
+
+        # A stuck sink fills the queue, then records are dropped, not waited on
+        stuck = Sink(delay=0.05)
+        log = AuditLog(stuck, queue_size=5, batch_size=2, flush_interval=0)
+        results = [log.record("g", 0, [], False, "bad word") for _ in range(20)]
+        assert results.count(True) == 5 and log.dropped == 15
+        # Shutting down writes what's queued, and the batch in hand
+        await asyncio.sleep(0.01)
+        await log.flush()
+        assert sum(len(b) for b in stuck.batches) == 5
+        assert stuck.batches[0][0]["reason"] == "bad word"
+
+        # Sink errors are counted, the writer carries on
+        broken = Sink(fail=True)
+        log = AuditLog(broken, flush_interval=0)
+        log.record("g", 0, [], True)
+        await asyncio.sleep(0.01)
+        broken.fail = False
+        log.record("g", 1, [], True)
+        await log.flush()
+        assert [len(b) for b in broken.batches] == [1]
+
+        log = AuditLog(JsonlSink(tmp_path), flush_interval=0)
+        log.record("g", 0, [{"letter": "A", "x": 7, "y": 7, "is_blank": False}], True)
+        await log.flush()
+        [path] = tmp_path.glob("audit-*.jsonl")
+        assert json.loads(path.read_text())["tiles"][0]["letter"] == "A"
+
+    asyncio.run(scenario())
+    counters = metrics.counters["scrabble_audit_records_total"]
+    assert counters[(("result", "failed"),)] == 1
+    assert metrics.counters["scrabble_audit_dropped_total"][()] == 15
+
+    # Every /make_move through the server lands in the Redis stream, rejected
+    # ones with the reason
+    monkeypatch.setattr(scrabble, "rd", scrabble.rd)
+    args = argparse.Namespace(
+        games=2,
+        turns=2,
+        moves="pass",
+        clients=1,
+        url=None,
+        watchers=0,
+        redis_latency=0,
+        no_coalesce=False,
+    )
+    recorder, _, fake = asyncio.run(loadtest.run(args))
+    records = [json.loads(r["record"]) for r in fake.streams["scrabble:audit"]]
+    assert len(records) == recorder.moves == 4 and fake.ops["pipeline"] == 1
+    assert all(r["accepted"] and r["game_id"].startswith("load-") for r in records)
+
+    async def rejected():
+        import httpx
+
+        from .server import AUDIT, app
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post("/start", params={"game_id": "audit"}, json={"num_players": 2})
+            move = {"locations": [{"letter": "Q", "x": 0, "y": 0}], "player_index": 0}
+            response = await client.post("/make_move", params={"game_id": "audit"}, json=move)
+            assert not response.json()["success"]
+        await AUDIT.flush()
+
+    asyncio.run(rejected())
+    record = json.loads(fake.streams["scrabble:audit"][-1]["record"])
+    assert not record["accepted"] and "center square" in record["reason"]
+    assert record["tiles"][0]["letter"] == "Q" and record["seconds"] > 0
+
+    async def refused():
+        import httpx
+
+        from .server import AUDIT, app
+
+        # A seat that isn't there and a game that isn't either are audited too
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            move = {"locations": [], "player_index": 5}
+            response = await client.post("/make_move", params={"game_id": "audit"}, json=move)
+            assert response.status_code == 400
+            response = await client.post("/make_move", params={"game_id": "nope"}, json=move)
+            assert response.status_code == 500
+        await AUDIT.flush()
+
+    asyncio.run(refused())
+    records = [json.loads(r["record"]) for r in fake.streams["scrabble:audit"][-2:]]
+    assert [r["game_id"] for r in records] == ["audit", "nope"]
+    assert records[0]["reason"] == "player_index out of range" and records[0]["player"] == 5
+    assert not records[1]["accepted"] and records[1]["reason"]
+
+    async def first_loop(log):
+        log.record("g", 0, [], True)
+
+    async def second_loop(log):
+        log.record("g", 1, [], True)
+        await log.flush()
+
+    # Records left queued when the loop changes are written by the next one
+    sink = Sink()
+    log = AuditLog(sink, flush_interval=0)
+    asyncio.run(first_loop(log))
+    asyncio.run(second_loop(log))
+    assert [r["player"] for b in sink.batches for r in b] == [0, 1]
+
+    # The first sink failure is logged, not every one after it
+    async def failing(log):
+        for player in range(3):
+            log.record("g", player, [], True)
+            await asyncio.sleep(0.01)
+        await log.flush()
+
+    caplog.clear()
+    with caplog.at_level(logging.ERROR, logger="backend.audit"):
+        asyncio.run(failing(AuditLog(Sink(fail=True), flush_interval=0)))
+    assert len(caplog.records) == 1 and "sink failed" in caplog.text
+
+
 if __name__ == "__main__":
     test_scrabble()
+    test_metrics()
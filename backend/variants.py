@@ -0,0 +1,165 @@
+"""
+Game variants: board size, premium squares, tiles and rack size.
+
+Kept apart from scrabble.py so modules that scrabble.py itself imports (like
+zobrist.py, which sizes its keys from the biggest board) can use them.
+"""
+
+import dataclasses
+
+# {letter: (count, points)}
+
+TILE_INFO = {
+    "E": (12, 1),
+    "A": (9, 1),
+    "I": (9, 1),
+    "O": (8, 1),
+    "N": (6, 1),
+    "R": (6, 1),
+    "T": (6, 1),
+    "L": (4, 1),
+    "S": (4, 1),
+    "U": (4, 1),
+    "D": (4, 2),
+    "G": (3, 2),
+    "B": (2, 3),
+    "C": (2, 3),
+    "M": (2, 3),
+    "P": (2, 3),
+    "F": (2, 4),
+    "H": (2, 4),
+    "V": (2, 4),
+    "W": (2, 4),
+    "Y": (2, 4),
+    "K": (1, 5),
+    "J": (1, 8),
+    "X": (1, 8),
+    "Q": (1, 10),
+    "Z": (1, 10),
+    "": (2, 0),  # Blanks as ''
+}
+
+BOARD_MULTIPLIERS = [
+    ["TWS", 0, 0, "DLS", 0, 0, 0, "TWS", 0, 0, 0, "DLS", 0, 0, "TWS"],
+    [0, "DWS", 0, 0, 0, "TLS", 0, 0, 0, "TLS", 0, 0, 0, "DWS", 0],
+    [0, 0, "DWS", 0, 0, 0, "DLS", 0, "DLS", 0, 0, 0, "DWS", 0, 0],
+    ["DLS", 0, 0, "DWS", 0, 0, 0, "DLS", 0, 0, 0, "DWS", 0, 0, "DLS"],
+    [0, 0, 0, 0, "DWS", 0, 0, 0, 0, 0, "DWS", 0, 0, 0, 0],
+    [0, "TLS", 0, 0, 0, "TLS", 0, 0, 0, "TLS", 0, 0, 0, "TLS", 0],
+    [0, 0, "DLS", 0, 0, 0, "DLS", 0, "DLS", 0, 0, 0, "DLS", 0, 0],
+    ["TWS", 0, 0, "DLS", 0, 0, 0, "DWS", 0, 0, 0, "DLS", 0, 0, "TWS"],
+    [0, 0, "DLS", 0, 0, 0, "DLS", 0, "DLS", 0, 0, 0, "DLS", 0, 0],
+    [0, "TLS", 0, 0, 0, "TLS", 0, 0, 0, "TLS", 0, 0, 0, "TLS", 0],
+    [0, 0, 0, 0, "DWS", 0, 0, 0, 0, 0, "DWS", 0, 0, 0, 0],
+    ["DLS", 0, 0, "DWS", 0, 0, 0, "DLS", 0, 0, 0, "DWS", 0, 0, "DLS"],
+    [0, 0, "DWS", 0, 0, 0, "DLS", 0, "DLS", 0, 0, 0, "DWS", 0, 0],
+    [0, "DWS", 0, 0, 0, "TLS", 0, 0, 0, "TLS", 0, 0, 0, "DWS", 0],
+    ["TWS", 0, 0, "DLS", 0, 0, 0, "TWS", 0, 0, 0, "DLS", 0, 0, "TWS"],
+]
+
+BOARD_SIZE = 15
+RACK_SIZE = 7
+
+
+def mirrored_layout(size: int, squares: dict) -> list[list]:
+    """
+    A full premium layout from the squares of the top left quarter, {(x, y):
+    premium}. Each one is mirrored across the diagonal and both center lines,
+    like the standard board
+    """
+    layout = [[0] * size for _ in range(size)]
+    last = size - 1
+    for (x, y), premium in squares.items():
+        for a, b in ((x, y), (y, x)):
+            for mx in (a, last - a):
+                for my in (b, last - b):
+                    layout[my][mx] = premium
+    return layout
+
+
+@dataclasses.dataclass(frozen=True)
+class Variant:
+    """
+    Everything about a game that isn't the rules: board size, premium squares,
+    the square the first move has to cover, the tiles in the bag and how many
+    a rack holds
+    """
+
+    name: str
+    size: int
+    multipliers: list[list]
+    tiles: dict  # {letter: (count, points)}, blanks as ''
+    center: tuple[int, int] = None  # (x, y), the middle by default
+    rack_size: int = RACK_SIZE
+    bingo_bonus: int = 50
+
+    def __post_init__(self):
+        if self.center is None:
+            object.__setattr__(self, "center", (self.size // 2, self.size // 2))
+        if len(self.multipliers) != self.size or any(
+            len(row) != self.size for row in self.multipliers
+        ):
+            raise ValueError(f"{self.name}: premium layout isn't {self.size}x{self.size}")
+
+    @property
+    def full_line(self) -> int:
+        return (1 << self.size) - 1
+
+
+STANDARD = Variant("standard", BOARD_SIZE, BOARD_MULTIPLIERS, TILE_INFO)
+
+# 21x21 with twice the tiles, for up to 4 players. Same letter values, the
+# premium squares are our own layout
+SUPER_TILE_INFO = {
+    "E": (24, 1),
+    "A": (16, 1),
+    "O": (15, 1),
+    "T": (15, 1),
+    "I": (13, 1),
+    "N": (13, 1),
+    "R": (13, 1),
+    "S": (10, 1),
+    "L": (7, 1),
+    "U": (7, 1),
+    "D": (8, 2),
+    "G": (5, 2),
+    "C": (6, 3),
+    "M": (6, 3),
+    "B": (4, 3),
+    "P": (4, 3),
+    "H": (5, 4),
+    "F": (4, 4),
+    "W": (4, 4),
+    "Y": (4, 4),
+    "V": (3, 4),
+    "K": (2, 5),
+    "J": (2, 8),
+    "X": (2, 8),
+    "Q": (2, 10),
+    "Z": (2, 10),
+    "": (4, 0),
+}
+SUPER_MULTIPLIERS = mirrored_layout(
+    21,
+    {
+        (0, 0): "TWS",
+        (10, 0): "TWS",
+        (3, 0): "DLS",
+        (7, 0): "DLS",
+        (1, 1): "DWS",
+        (2, 2): "DWS",
+        (3, 3): "DWS",
+        (4, 4): "DWS",
+        (5, 5): "DWS",
+        (6, 6): "TLS",
+        (8, 8): "DLS",
+        (10, 10): "DWS",
+        (6, 1): "TLS",
+        (8, 2): "DLS",
+        (10, 4): "DLS",
+        (9, 5): "TLS",
+    },
+)
+SUPER = Variant("super", 21, SUPER_MULTIPLIERS, SUPER_TILE_INFO)
+
+VARIANTS = {variant.name: variant for variant in (STANDARD, SUPER)}
@@ -0,0 +1,197 @@
+"""
+Pattern and prefix search over the word list.
+
+Patterns are made of letters, "?" for any one letter and "*" for any run of
+letters (including none). "QU*" is every word starting with QU, "C?T*" is
+every word with C first and T third.
+
+Words are bucketed by length, and for each (length, position, letter) we keep
+a bitset (a Python int) of the words in that bucket with that letter there.
+A query ANDs together the bitsets for the letters pinned by the pattern, and
+only the survivors are checked against the full pattern and the rack.
+
+A rack limits the letters that fill the wildcards, which is how a pattern of
+board letters and gaps is matched against a player's tiles. Letters written
+in the pattern are treated as already on the board and don't use up the rack.
+"""
+
+import collections
+import re
+
+from .anagram import ALPHABET, parse_rack
+
+WILDCARD = "?"
+ANY = "*"
+
+
+def _bit_indices(mask: int):
+    # Walking the binary string is much faster than peeling bits off big ints
+    bits = bin(mask)[:1:-1]
+    i = bits.find("1")
+    while i != -1:
+        yield i
+        i = bits.find("1", i + 1)
+
+
+def _bitset(indices, size: int) -> int:
+    # Building the bytes first avoids re-copying a growing int for every bit
+    data = bytearray((size + 7) // 8)
+    for i in indices:
+        data[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(data, "little")
+
+
+def parse_pattern(pattern: str) -> str:
+    pattern = pattern.upper()
+    for char in pattern:
+        if not (char.isalpha() or char in (WILDCARD, ANY)):
+            raise ValueError(f"Invalid pattern character {char!r}")
+    return pattern
+
+
+def pattern_regex(pattern: str) -> re.Pattern:
+    return re.compile(
+        "".join(
+            "." if c == WILDCARD else ".*" if c == ANY else re.escape(c)
+            for c in pattern
+        )
+    )
+
+
+def pattern_lengths(pattern: str, min_length: int, max_length: int) -> range:
+    fixed = len(pattern.replace(ANY, ""))
+    if ANY in pattern:
+        return range(max(fixed, min_length), max_length + 1)
+    return range(max(fixed, min_length), min(fixed, max_length) + 1)
+
+
+def fits_rack(word: str, pattern: str, rack_counts, blanks) -> bool:
+    # Whatever isn't pinned by the pattern has to come from the rack
+    needed = collections.Counter(word)
+    needed.subtract(c for c in pattern if c.isalpha())
+    missing = sum(
+        max(0, count - rack_counts.get(letter, 0)) for letter, count in needed.items()
+    )
+    return missing <= blanks
+
+
+class PatternIndex:
+    def __init__(self, words):
+        buckets = collections.defaultdict(list)
+        for word in words:
+            buckets[len(word)].append(word.upper())
+
+        # {length: [word, ...]} sorted so results come out alphabetically
+        self.by_length = {length: sorted(b) for length, b in buckets.items()}
+        # {(length, position, letter): bitset over by_length[length]}
+        self.positions = {}
+        # {(length, letter): bitset of words containing letter anywhere}
+        self.contains = {}
+        for length, bucket in self.by_length.items():
+            at = collections.defaultdict(list)
+            anywhere = collections.defaultdict(list)
+            for i, word in enumerate(bucket):
+                for pos, letter in enumerate(word):
+                    at[(length, pos, letter)].append(i)
+                for letter in set(word):
+                    anywhere[(length, letter)].append(i)
+            for key, indices in at.items():
+                self.positions[key] = _bitset(indices, len(bucket))
+            for key, indices in anywhere.items():
+                self.contains[key] = _bitset(indices, len(bucket))
+
+        self.max_length = max(self.by_length, default=0)
+
+    def candidates(self, pattern: str, length: int, allowed=None) -> int:
+        """
+        Bitset of words of this length that match the pinned letters, and
+        only use letters from `allowed` if it is given
+        """
+        bucket = self.by_length.get(length)
+        if not bucket:
+            return 0
+        head = pattern.partition(ANY)[0]
+        tail = pattern.rpartition(ANY)[2] if ANY in pattern else ""
+
+        pinned = [(pos, c) for pos, c in enumerate(head) if c != WILDCARD]
+        if ANY in pattern:
+            offset = length - len(tail)
+            pinned += [(offset + pos, c) for pos, c in enumerate(tail) if c != WILDCARD]
+
+        mask = (1 << len(bucket)) - 1
+        for pos, letter in pinned:
+            mask &= self.positions.get((length, pos, letter), 0)
+            if not mask:
+                return 0
+        # Letters between two *s can be anywhere, but they have to be there
+        middle = pattern[len(head) : len(pattern) - len(tail)]
+        for letter in set(middle) - {WILDCARD, ANY}:
+            mask &= self.contains.get((length, letter), 0)
+        if allowed is not None:
+            for letter in ALPHABET:
+                if letter not in allowed:
+                    mask &= ~self.contains.get((length, letter), 0)
+        return mask
+
+    def search(
+        self,
+        pattern: str = ANY,
+        min_length: int = 2,
+        max_length: int = None,
+        rack: str = None,
+        limit: int = None,
+    ):
+        """Yield words matching pattern, shortest first, then alphabetically"""
+        pattern = parse_pattern(pattern)
+        if max_length is None:
+            max_length = self.max_length
+        regex = pattern_regex(pattern)
+        # Only patterns with something between two *s need the regex
+        needs_regex = pattern.count(ANY) > 1
+        rack_counts, blanks = parse_rack(rack) if rack is not None else (None, 0)
+        # Without blanks a word can only use letters from the rack and pattern
+        allowed = None
+        if rack is not None and not blanks:
+            allowed = set(rack_counts) | set(pattern)
+
+        found = 0
+        for length in pattern_lengths(pattern, min_length, max_length):
+            bucket = self.by_length.get(length, [])
+            for i in _bit_indices(self.candidates(pattern, length, allowed)):
+                word = bucket[i]
+                if needs_regex and not regex.fullmatch(word):
+                    continue
+                if rack is not None and not fits_rack(
+                    word, pattern, rack_counts, blanks
+                ):
+                    continue
+                yield word
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+
+
+def brute_force_search(
+    words, pattern=ANY, min_length=2, max_length=None, rack=None, limit=None
+):
+    """Same results as PatternIndex.search, by scanning every word"""
+    pattern = parse_pattern(pattern)
+    if max_length is None:
+        max_length = max(map(len, words), default=0)
+    regex = pattern_regex(pattern)
+    rack_counts, blanks = parse_rack(rack) if rack is not None else (None, 0)
+
+    matches = sorted(
+        (w.upper() for w in words if min_length <= len(w) <= max_length),
+        key=lambda w: (len(w), w),
+    )
+    found = 0
+    for word in matches:
+        if not regex.fullmatch(word):
+            continue
+        if rack is not None and not fits_rack(word, pattern, rack_counts, blanks):
+            continue
+        yield word
+        found += 1
+        if limit is not None and found >= limit:
+            return
@@ -0,0 +1,75 @@
+"""
+Zobrist hashing of game states.
+
+Every (square, letter, blank) gets a random 64-bit key and a board hashes to
+the XOR of the keys of its tiles, so placing a tile is one XOR. Racks are
+multisets, so a rack hashes to the sum of one key per tile (mod 2**64), which
+doesn't care about order and handles repeated letters. The player to move,
+the pass counter and the game over flag get keys of their own.
+
+Scores, the turn number and the tile bag are left out on purpose: two states
+with the same board, racks and player to move have the same moves, which is
+what search (the endgame table) and move caches want. It is not a key for a
+whole /state response, which also has the scores, and it can't tell two bags
+(so two futures) apart. Board.state_hash keeps the hash up to date.
+"""
+
+import random
+
+from .anagram import ALPHABET
+from .variants import VARIANTS
+
+SIZE = max(variant.size for variant in VARIANTS.values())
+MAX_PLAYERS = 4
+MASK = (1 << 64) - 1
+BLANK = len(ALPHABET)  # Slot for blanks on a rack
+
+# Fixed seed so hashes are the same in every process and across restarts
+_rng = random.Random(0x5C4AB)
+
+
+def _keys(n):
+    return [_rng.getrandbits(64) for _ in range(n)]
+
+
+# SQUARE_KEYS[y][x][slot], slot is the letter index, plus 26 if it is a blank
+SQUARE_KEYS = [[_keys(2 * len(ALPHABET)) for _ in range(SIZE)] for _ in range(SIZE)]
+# RACK_KEYS[player][slot], slot 26 is a blank
+RACK_KEYS = [_keys(len(ALPHABET) + 1) for _ in range(MAX_PLAYERS)]
+TO_MOVE_KEYS = _keys(MAX_PLAYERS)
+PASS_KEYS = _keys(2 * MAX_PLAYERS + 1)
+GAME_OVER_KEY = _keys(1)[0]
+
+
+def square_key(x, y, letter, is_blank) -> int:
+    slot = ALPHABET.index(letter.upper())
+    return SQUARE_KEYS[y][x][slot + len(ALPHABET) if is_blank else slot]
+
+
+def rack_key(player_index, hand) -> int:
+    keys = RACK_KEYS[player_index]
+    return (
+        sum(keys[BLANK if t.is_blank else ALPHABET.index(t.letter.upper())] for t in hand)
+        & MASK
+    )
+
+
+def turn_key(board) -> int:
+    """Everything but the tiles on the board: racks, player to move, passes"""
+    h = TO_MOVE_KEYS[board.players.index(board.current_player)]
+    h ^= PASS_KEYS[min(board.consecutive_passes, len(PASS_KEYS) - 1)]
+    if board.is_game_over:
+        h ^= GAME_OVER_KEY
+    for i, player in enumerate(board.players):
+        h ^= rack_key(i, player.word_bank.hand)
+    return h
+
+
+def board_hash(board) -> int:
+    """Hash from scratch, Board.state_hash keeps it updated after this"""
+    h = turn_key(board)
+    for y, row in enumerate(board.board):
+        for x, tile in enumerate(row):
+            if tile.letter:
+                h ^= square_key(x, y, tile.letter, tile.is_blank)
+    return h
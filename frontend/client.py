@@ -10,6 +10,7 @@ import websockets
 from dotenv import load_dotenv
 from rich import print
 
+from .llm import LLMPlayer
 from .render import write_board
 
 """
@@ -32,96 +33,13 @@ WS_BASE_URL = "ws://ai.thewcl.com:8708"
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
 PUB_SUB_KEY = "scrabble:pubsub"
 
+WORD_LIST = None
+SIM_BOT = None
+LLM_PLAYER = None
+
 OPENAI_PROXY_URL = "http://ai.thewcl.com:6502"
 OPENAI_PROXY_AUTH = os.getenv("OPENAI_PROXY_AUTH")
 
-SYSTEM_PROMPT = """
-You are an expert Scrabble player. For the response, please think STEP-BY-STEP. THINK. THINK. THINK.
-Your job: **choose the highest-scoring legal move** for the current position, using only the tiles in your hand, and following official English-language Scrabble rules.
-
-The game engine will send you JSON like:
-
-```json
-{
-  "hand": "Q U I _ E T S",          // seven tiles; "_" = blank
-  "board": "<15×15 grid>"
-}
-````
-
----
-### Board input format
-
-The board passed in is a 2-dimentional list representing the board of the scrabble game. Position (0,0) represents the top left, while (14,14) represents the bottom right.
-Each item in the board contains second items. The first, is the letter. If it is an empty string, it is a free tile. The second item is them modifier.
-
-### Board legend
-
-`$` = TWS (Tripple Word Score) `#` = DWS (Double Word Score) `@` = TLS (Tripple Letter Score) `!` = DLS (Double Letter Score) `.` = empty square Upper-case letters = tiles already played
-
----
-
-### **MANDATORY rules** (read carefully)
-
-1. **Tile budget** You may place **only the tiles that appear in `"hand"`**, each at most once.
-   • The letters you physically place must exactly match a multiset drawn from your hand (blanks may stand for any letter).
-   • **Do NOT invent extra copies of a letter you don’t have.**
-
-2. **Empty squares only** Place tiles **only** on empty squares (`.` `!` `@` `#` `$`).
-   **Never overwrite** an existing letter.
-
-3. **Using board letters** You may incorporate letters already on the board to extend or cross words, but **you do not place a new tile on their squares**.
-
-4. **Connectivity**
-   • First move must cover (7, 7).
-   • Subsequent moves must touch the existing word structure.
-
-5. **Blanks** If you use a blank (`"_"`), list its **1-based position(s)** in the `"blanks"` array.
-
-6. **Word validity** Every word formed must be in the standard English Scrabble lexicon.
-
-7. **Pass condition** If there is literally **no legal move** with your hand, output
-
-   ```json
-   {"word": null, "start": null, "direction": null, "blanks": []}
-   ```
-
----
-
-### Output (one JSON object only)
-
-```json
-{
-  "word": "<WORD IN UPPERCASE>",
-  "start": [x, y],          // x = column 0-14, y = row 0-14
-  "direction": "h" or "v",  // h = left→right, v = top→bottom
-  "blanks": [positions]     // 1-based indices of blanks, [] if none
-}
-```
-
----
-
-#### Worked legality example
-
-Board already shows “WAG” at (7, 7)–(9, 7). Hand = `E R _`.
-Legal play “WAGER”, blank for second “E”:
-
-```json
-{
-  "word": "WAGER",
-  "start": [7, 7],
-  "direction": "h",
-  "blanks": [2]
-}
-```
-
-New tiles placed: (10, 7)=E, (11, 7)=R (two tiles = exactly what remains in hand).
-
----
-
-**Return exactly one JSON object and nothing else.**
-"""
-
-
 def ensure_input(prompt: str, allowed: list, t: type = str):
     ipt = t(input(prompt))
     while ipt not in allowed:
@@ -132,11 +50,16 @@ def ensure_input(prompt: str, allowed: list, t: type = str):
     return ipt
 
 
-async def start_game(client: httpx.AsyncClient, num_players: int):
+async def start_game(
+    client: httpx.AsyncClient, num_players: int, bots=None, variant="standard"
+):
     if not (2 <= num_players <= 4):
         print("NUM_PLAYERS must be between 2 and 4 inclusive")
         return
-    payload = {"num_players": num_players}
+    payload = {"num_players": num_players, "variant": variant}
+    if bots:
+        # Seats the server plays itself, {seat: "greedy" | "sim"}
+        payload["bots"] = bots
     response = await client.post(f"{BASE_URL}/start", json=payload)
     return response.json()
 
@@ -157,74 +80,79 @@ async def get_state(client: httpx.AsyncClient):
     return response.json()
 
 
-async def get_ai(client: httpx.AsyncClient, board, hand_data, model):
-    # Write board to string
-    # stream = StringIO()
-    # write_board(board, color=False, output=stream)
-    # data = stream.getvalue()
-
-    user_prompt = {
-        "hand": hand_data,
-        "board": [[[val, mult] for (val, _, mult) in row] for row in board]
-    }
-    response = await client.post(
-        f"{OPENAI_PROXY_URL}/chat/thinking" if model[0] == 'o' else f"{OPENAI_PROXY_URL}/chat",
-        params={"json": True},
-        json={
-            "model": model,
-            "system_prompt": SYSTEM_PROMPT,
-            "user_prompt": json.dumps(user_prompt),
-        },
-        headers={"Authorization": f"Bearer {OPENAI_PROXY_AUTH}"}, timeout=120
-    )
-    data = response.json()
-    
-    for item in data["output"]:
-        # print(item)
-        if "content" in item:
-            return json.loads(item["content"][0]["text"])
-    raise Exception("Invalid response from AI:", data)
-
-async def create_locations_from_ai(client, board, hand_letters, i_am_playing, model):
-    # Get AI move suggestion
-    ai_response = await get_ai(client, board, hand_letters, model)
-    print("[AI] Response:", ai_response)
-
-    # Default to passing if the AI gives no move or word is null
-    if not ai_response or ai_response.get("word") is None:
+async def get_hints(client: httpx.AsyncClient, player_index: int, k: int = 10):
+    # /hints streams NDJSON, the last line has the final ranking
+    moves = []
+    async with client.stream(
+        "GET", f"{BASE_URL}/hints", params={"player": player_index, "k": k}
+    ) as response:
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data["type"] == "done":
+                moves = data["moves"]
+    return moves
+
+
+async def create_locations_from_hints(client, i_am_playing):
+    moves = await get_hints(client, int(i_am_playing), k=1)
+    if not moves:
         print("[AI] No valid moves. Passing turn.")
-        locations = []
-    else:
-        word = ai_response["word"]
-        start_x, start_y = ai_response["start"]
-        direction = ai_response["direction"]
-        blanks = ai_response["blanks"]
-
-        # Set increments for direction
-        dx, dy = (1, 0) if direction == "h" else (0, 1)
-
-        # Build move locations
-        locations = []
-        for i, letter in enumerate(word):
-            x = start_x + dx * i
-            y = start_y + dy * i
-            # Blanks is a list of 1-based positions
-            is_blank = (i + 1) in blanks
-            locations.append(
-                {"letter": letter, "x": x, "y": y, "is_blank": is_blank}
-            )
+        return []
+    best = moves[0]
+    print(f"[AI] Playing {best['word']} for {best['score']} points")
+    return best["locations"]
 
-    print(locations)
-    # Send the move to the backend
-    response = await make_move(client, locations, int(i_am_playing))
-    # print(response["message"])
 
-    if response.get("success"):
-        print("Move accepted")
-    else:
-        print("Invalid move from AI.")
-        print("Error message:", response.get("message"))
+def get_word_list():
+    global WORD_LIST
+    if WORD_LIST is None:
+        from backend.scrabble import WordList
+
+        WORD_LIST = WordList.load_word_list()
+    return WORD_LIST
+
+
+def get_sim_bot():
+    # Loads the word list and starts the rollout workers, so only do it once
+    global SIM_BOT
+    if SIM_BOT is None:
+        from backend.simbot import SimBot
+
+        SIM_BOT = SimBot(get_word_list())
+        SIM_BOT.warm_up()
+    return SIM_BOT
+
+
+async def create_locations_from_sim(state, i_am_playing):
+    from backend.scrabble import Board
+
+    bot = get_sim_bot()
+    board = Board.from_save_dict(state, bot.word_list)
+    # Rollouts block, keep the websocket and pubsub alive meanwhile
+    move = await asyncio.to_thread(bot.choose_move, board, int(i_am_playing))
+    if move is None:
+        print("[AI] No valid moves. Passing turn.")
+        return []
+    print(f"[AI] Playing {move.word} for {move.score} points")
+    return move.to_locations()
+
+
+def get_llm_player(model):
+    global LLM_PLAYER
+    if LLM_PLAYER is None or LLM_PLAYER.model != model:
+        LLM_PLAYER = LLMPlayer(
+            model, get_word_list(), OPENAI_PROXY_URL, OPENAI_PROXY_AUTH
+        )
+    return LLM_PLAYER
+
 
+async def create_locations_from_ai(client, state, i_am_playing, model):
+    # Proposals are checked against the engine before they come back here,
+    # handle_board_state does the submitting
+    locations = await get_llm_player(model).choose(client, state, int(i_am_playing))
+    print(locations)
     return locations
 
 async def user_do_action(client, hand_data, state, i_am_playing):
@@ -232,13 +160,26 @@ async def user_do_action(client, hand_data, state, i_am_playing):
     num_blanks = sum(1 for tile in hand_data if tile[1])
 
         # Prompt for move details
-    word = input("Enter the word to place: ").strip().upper()
+    word = input("Enter the word to place (? for hints): ").strip().upper()
     locations = []
     if not word:
         return []
 
-    x = int(input("Start x (0-14): "))
-    y = int(input("Start y (0-14): "))
+    if word == "?":
+        hints = await get_hints(client, int(i_am_playing))
+        for i, hint in enumerate(hints, start=1):
+            print(
+                f"{i:2}. {hint['word']} at ({hint['x']}, {hint['y']}) "
+                f"{hint['direction']} for {hint['score']} points"
+            )
+        choice = input("Pick a hint (blank to type your own): ").strip()
+        if choice.isdigit() and 1 <= int(choice) <= len(hints):
+            return hints[int(choice) - 1]["locations"]
+        return await user_do_action(client, hand_data, state, i_am_playing)
+
+    last = len(state["board"]) - 1
+    x = int(input(f"Start x (0-{last}): "))
+    y = int(input(f"Start y (0-{last}): "))
     direction = (
         input("Direction: (h)orizontal/(v)ertical: ").strip().lower()
     )
@@ -363,8 +304,12 @@ async def handle_board_state(
         print(f"Your tiles: {hand_letters}")
         
         while True:
-            if is_ai:
-                locations = await create_locations_from_ai(client, state["board"], hand_letters, i_am_playing, model)
+            if model == "greedy":
+                locations = await create_locations_from_hints(client, i_am_playing)
+            elif model == "sim":
+                locations = await create_locations_from_sim(state, i_am_playing)
+            elif is_ai:
+                locations = await create_locations_from_ai(client, state, i_am_playing, model)
             else:
                 locations = await user_do_action(client, hand_data, state, i_am_playing)
 
@@ -377,6 +322,9 @@ async def handle_board_state(
                 break  # Exit retry loop
             else:
                 print("Invalid move. Try again.")
+                if is_ai and model not in ("greedy", "sim"):
+                    # Don't hand the server the same cached move again
+                    get_llm_player(model).forget(state, i_am_playing)
                 
 
         # Notify others via websocket and Redis
@@ -435,7 +383,9 @@ async def main(args):
                 httpx.AsyncClient() as client,
             ):
                 if args.reset:
-                    await start_game(client, args.reset)
+                    await start_game(
+                        client, args.reset, dict(args.bot or []), args.variant
+                    )
                     return
                 await listen_for_updates(ws, client, args.player, args.ai is not None, args.ai)
 
@@ -444,6 +394,13 @@ async def main(args):
             await asyncio.sleep(0.5)
 
 
+def parse_bot_seat(value):
+    seat, _, bot = value.partition(":")
+    if not seat.isdigit() or bot not in ("greedy", "sim"):
+        raise argparse.ArgumentTypeError("expected SEAT:greedy or SEAT:sim")
+    return int(seat), bot
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Scrabble user client")
 
@@ -465,11 +422,28 @@ if __name__ == "__main__":
     # Not mutually exclusives
     parser.add_argument(
         "--ai",
-        choices=["gpt-4.1-nano", "gpt-4.1-mini", "o3-mini", "o4-mini"],
-        help="Play the current player as AI",
+        choices=["gpt-4.1-nano", "gpt-4.1-mini", "o3-mini", "o4-mini", "greedy", "sim"],
+        help="Play the current player as AI (greedy plays the top /hints move, "
+        "sim runs the simulation bot locally)",
         default=None
     )
 
+    parser.add_argument(
+        "--bot",
+        type=parse_bot_seat,
+        action="append",
+        metavar="SEAT:BOT",
+        help="With --reset, have the server play SEAT itself (BOT is greedy or sim). "
+        "Can be given more than once",
+    )
+
+    parser.add_argument(
+        "--variant",
+        choices=["standard", "super"],
+        default="standard",
+        help="With --reset, the board to play on (super is 21x21)",
+    )
+
     args = parser.parse_args()
     if args.ai and args.player is None:
         parser.error("--ai requires player to be specified")
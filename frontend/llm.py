@@ -0,0 +1,295 @@
+"""
+LLM players: ask the OpenAI proxy for a move, check it against the engine
+before anything goes to the server, and remember the answer.
+
+Every round fires a few requests at once and plays the first proposal the
+engine accepts, the others are cancelled. Proposals are cached by state hash
+and rack, so coming back to the same position doesn't pay for the same calls
+again. Illegal proposals are dropped here with the engine's reason instead of
+being bounced by /make_move.
+"""
+
+import asyncio
+import collections
+import json
+
+import httpx
+
+from backend.movegen import rack_string
+from backend.scrabble import Board, Variant, WordList
+from backend.simbot import tiles_from_locations
+
+# Requests in flight per round, and rounds before giving up and passing
+CANDIDATES = 3
+ROUNDS = 2
+CACHE_SIZE = 256
+REQUEST_TIMEOUT = 120
+
+SYSTEM_PROMPT = """
+You are an expert Scrabble player. For the response, please think STEP-BY-STEP. THINK. THINK. THINK.
+Your job: **choose the highest-scoring legal move** for the current position, using only the tiles in your hand, and following official English-language Scrabble rules.
+
+The game engine will send you JSON like:
+
+```json
+{
+  "hand": "Q U I _ E T S",          // up to {rack_size} tiles; "_" = blank
+  "board": "<{size}×{size} grid>"
+}
+````
+
+---
+### Board input format
+
+The board passed in is a 2-dimentional list representing the board of the scrabble game. Position (0,0) represents the top left, while ({last},{last}) represents the bottom right.
+Each item in the board contains second items. The first, is the letter. If it is an empty string, it is a free tile. The second item is them modifier.
+
+### Board legend
+
+`$` = TWS (Tripple Word Score) `#` = DWS (Double Word Score) `@` = TLS (Tripple Letter Score) `!` = DLS (Double Letter Score) `.` = empty square Upper-case letters = tiles already played
+
+---
+
+### **MANDATORY rules** (read carefully)
+
+1. **Tile budget** You may place **only the tiles that appear in `"hand"`**, each at most once.
+   • The letters you physically place must exactly match a multiset drawn from your hand (blanks may stand for any letter).
+   • **Do NOT invent extra copies of a letter you don’t have.**
+
+2. **Empty squares only** Place tiles **only** on empty squares (`.` `!` `@` `#` `$`).
+   **Never overwrite** an existing letter.
+
+3. **Using board letters** You may incorporate letters already on the board to extend or cross words, but **you do not place a new tile on their squares**.
+
+4. **Connectivity**
+   • First move must cover ({center}).
+   • Subsequent moves must touch the existing word structure.
+
+5. **Blanks** If you use a blank (`"_"`), list its **1-based position(s)** in the `"blanks"` array.
+
+6. **Word validity** Every word formed must be in the standard English Scrabble lexicon.
+
+7. **Pass condition** If there is literally **no legal move** with your hand, output
+
+   ```json
+   {"word": null, "start": null, "direction": null, "blanks": []}
+   ```
+
+---
+
+### Output (one JSON object only)
+
+```json
+{
+  "word": "<WORD IN UPPERCASE>",
+  "start": [x, y],          // x = column 0-{last}, y = row 0-{last}
+  "direction": "h" or "v",  // h = left→right, v = top→bottom
+  "blanks": [positions]     // 1-based indices of blanks, [] if none
+}
+```
+
+---
+
+#### Worked legality example
+
+Board already shows “WAG” at (7, 7)–(9, 7). Hand = `E R _`.
+Legal play “WAGER”, blank for second “E”:
+
+```json
+{
+  "word": "WAGER",
+  "start": [7, 7],
+  "direction": "h",
+  "blanks": [2]
+}
+```
+
+New tiles placed: (10, 7)=E, (11, 7)=R (two tiles = exactly what remains in hand).
+
+---
+
+**Return exactly one JSON object and nothing else.**
+"""
+
+
+def system_prompt(variant: Variant) -> str:
+    # Not str.format, the prompt is full of JSON braces
+    x, y = variant.center
+    fields = {
+        "size": variant.size,
+        "last": variant.size - 1,
+        "center": f"{x}, {y}",
+        "rack_size": variant.rack_size,
+    }
+    prompt = SYSTEM_PROMPT
+    for name, value in fields.items():
+        prompt = prompt.replace(f"{{{name}}}", str(value))
+    return prompt
+
+
+def proposal_to_locations(proposal, board: Board) -> list[dict]:
+    """
+    /make_move locations for an answer in the SYSTEM_PROMPT format. Squares
+    that already hold the letter are part of the word but not new tiles, so
+    they are left out. Raises ValueError if the answer is malformed
+    """
+    if proposal is None or isinstance(proposal, dict) and proposal.get("word") is None:
+        return []  # Pass
+    if not isinstance(proposal, dict):
+        raise ValueError(f"Malformed proposal {proposal!r}")
+
+    def is_int(value):
+        # Not bool, and not 7.0 or "7" either
+        return type(value) is int
+
+    word = proposal["word"]
+    start = proposal.get("start")
+    direction = proposal.get("direction")
+    blanks = proposal.get("blanks") or []
+    if (
+        not isinstance(word, str)
+        # A-Z only, the engine has no points for anything else
+        or not (word.isascii() and word.isalpha())
+        or not isinstance(start, (list, tuple))
+        or len(start) != 2
+        or not all(is_int(v) for v in start)
+        or direction not in ("h", "v")
+        or not isinstance(blanks, list)
+        or not all(is_int(v) for v in blanks)
+    ):
+        raise ValueError(f"Malformed proposal {proposal!r}")
+    word = word.upper()
+    start_x, start_y = start
+
+    size = board.variant.size
+    dx, dy = (1, 0) if direction == "h" else (0, 1)
+    locations = []
+    for i, letter in enumerate(word):
+        x, y = start_x + dx * i, start_y + dy * i
+        if not (0 <= x < size and 0 <= y < size):
+            raise ValueError(f"{word} runs off the board")
+        if board.board[y][x].letter.upper() == letter:
+            continue
+        # Blanks is a list of 1-based positions
+        locations.append({"letter": letter, "x": x, "y": y, "is_blank": (i + 1) in blanks})
+    return locations
+
+
+def check_move(board: Board, locations: list[dict], player_index: int) -> str | None:
+    """Why the engine would reject the move, or None if it is legal"""
+    try:
+        record = board.apply_move(
+            tiles_from_locations(locations), board.players[player_index]
+        )
+    except ValueError as exc:
+        return str(exc)
+    except Exception as exc:
+        # Whatever else the engine trips over, the proposal is no good
+        return f"{type(exc).__name__}: {exc}"
+    board.undo_move(record)
+    return None
+
+
+class LLMPlayer:
+    def __init__(
+        self,
+        model: str,
+        word_list: WordList,
+        proxy_url: str,
+        auth: str | None = None,
+        candidates=CANDIDATES,
+        rounds=ROUNDS,
+    ):
+        self.model = model
+        self.word_list = word_list
+        self.proxy_url = proxy_url
+        self.auth = auth
+        self.candidates = candidates
+        self.rounds = rounds
+        # (state hash, sorted rack) -> locations, oldest first
+        self.cache = collections.OrderedDict()
+
+    def cache_key(self, board: Board, player_index: int):
+        rack = rack_string(board.players[player_index].word_bank.hand)
+        return board.state_hash, "".join(sorted(rack))
+
+    async def ask(self, client: httpx.AsyncClient, state, hand_letters: str, prompt: str):
+        """One call to the proxy, returns the model's answer"""
+        user_prompt = {
+            "hand": hand_letters,
+            "board": [[[val, mult] for (val, _, mult) in row] for row in state["board"]],
+        }
+        endpoint = "/chat/thinking" if self.model[0] == "o" else "/chat"
+        response = await client.post(
+            f"{self.proxy_url}{endpoint}",
+            params={"json": True},
+            json={
+                "model": self.model,
+                "system_prompt": prompt,
+                "user_prompt": json.dumps(user_prompt),
+            },
+            headers={"Authorization": f"Bearer {self.auth}"},
+            timeout=REQUEST_TIMEOUT,
+        )
+        data = response.json()
+
+        output = data.get("output") if isinstance(data, dict) else None
+        for item in output if isinstance(output, list) else []:
+            if isinstance(item, dict) and "content" in item:
+                return json.loads(item["content"][0]["text"])
+        raise ValueError(f"Invalid response from AI: {data}")
+
+    async def choose(
+        self, client: httpx.AsyncClient, state, player_index: int
+    ) -> list[dict]:
+        """Locations of the first legal proposal, [] to pass"""
+        board = Board.from_save_dict(state, self.word_list)
+        key = self.cache_key(board, player_index)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            print("[AI] Using the cached move for this position")
+            return self.cache[key]
+
+        hand_letters = " ".join(rack_string(board.players[player_index].word_bank.hand))
+        locations = await self._first_legal(client, state, board, hand_letters, player_index)
+        self.cache[key] = locations
+        if len(self.cache) > CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return locations
+
+    def forget(self, state, player_index: int):
+        """Drop the cached move for a position, e.g. after the server refused it"""
+        board = Board.from_save_dict(state, self.word_list)
+        self.cache.pop(self.cache_key(board, player_index), None)
+
+    async def _first_legal(self, client, state, board, hand_letters, player_index):
+        prompt = system_prompt(board.variant)
+        for _ in range(self.rounds):
+            tasks = [
+                asyncio.create_task(self.ask(client, state, hand_letters, prompt))
+                for _ in range(self.candidates)
+            ]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    try:
+                        proposal = await next_done
+                        print("[AI] Response:", proposal)
+                        locations = proposal_to_locations(proposal, board)
+                    except Exception as exc:
+                        # Network errors, or anything odd in what came back
+                        print("[AI] Bad response:", exc)
+                        continue
+                    # A pass is always legal, keep waiting in case another
+                    # request comes back with a real move
+                    if not locations:
+                        continue
+                    reason = check_move(board, locations, player_index)
+                    if reason is None:
+                        return locations
+                    print("[AI] Illegal proposal:", reason)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        print("[AI] No legal move proposed. Passing turn.")
+        return []
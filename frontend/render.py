@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 
 from rich import print
 
@@ -50,3 +51,141 @@ def write_board(board, color=True, output=sys.stdout):
 
 def clear_terminal():
     os.system("cls" if os.name == "nt" else "clear")
+
+
+# LiveRenderer draws the same layout as write_board, but only rewrites what
+# changed since the last frame, straight to the terminal with ANSI escapes
+
+MAX_FPS = 10
+BOARD_TOP = 3  # Terminal row (1-based) of board row 0, below the header
+RESET = "\x1b[0m"
+
+
+def move_to(row, column):
+    return f"\x1b[{row};{column}H"
+
+
+def ansi_color(hex_color):
+    r, g, b = (int(hex_color[i : i + 2], 16) for i in (1, 3, 5))
+    return f"\x1b[38;2;{r};{g};{b}m"
+
+
+def cell_text(cell, color=True):
+    letter, is_blank, multiplier = cell
+    if letter:
+        return letter
+    if multiplier:
+        hex_color, symbol = MULTIPLIER_INFO[multiplier]
+        return ansi_color(hex_color) + symbol + RESET if color else symbol
+    return "."
+
+
+def bag_size(state):
+    bag = state["tile_bag"]
+    # Saved as {"counts", "rng"}, or a list of tiles by older servers
+    return sum(bag["counts"]) if isinstance(bag, dict) else len(bag)
+
+
+def panel_lines(state):
+    """The score panel under the board"""
+    lines = [f"  Turn {state['turn']}, {bag_size(state)} tiles in the bag"]
+    for i, player in enumerate(state["players"]):
+        marker = ">" if i == state["current_player"] else " "
+        lines.append(f"{marker} Player {i}: {player['score']} points")
+    if state.get("is_game_over"):
+        lines.append("  Game over!")
+    return lines
+
+
+def board_lines(cells):
+    size = len(cells[0])
+    lines = ["   " + " ".join(f"{i:2}" for i in range(size))]
+    lines.append("  +" + "---" * size + "+")
+    for y, row in enumerate(cells):
+        lines.append(f"{y:2}|" + "".join(f" {c} " for c in row) + "|")
+    lines.append("  +" + "---" * size + "+")
+    return lines
+
+
+class LiveRenderer:
+    """
+    Redraws the board and scores in place. The last frame is kept and only
+    the cells and panel lines that changed are repainted, at most max_fps
+    times a second. States that arrive faster wait in `pending` (the newest
+    wins) until flush() is called.
+
+    With color=False (the default when output isn't a terminal) there are no
+    escape codes at all: each changed frame is written out in full as plain
+    text, which is what you want when piping to a log.
+    """
+
+    def __init__(self, output=sys.stdout, color=None, max_fps=MAX_FPS, clock=time.monotonic):
+        self.output = output
+        self.color = output.isatty() if color is None else color
+        self.min_interval = 1 / max_fps
+        self.clock = clock
+        self.pending = None
+        self.last_draw = None
+        # The last frame drawn: board cells and panel lines
+        self.cells = None
+        self.panel = None
+
+    def update(self, state) -> bool:
+        """Draw `state` now if the refresh cap allows it, else keep it for flush"""
+        self.pending = state
+        if self.last_draw is not None and self.clock() - self.last_draw < self.min_interval:
+            return False
+        return self.flush()
+
+    def flush(self) -> bool:
+        """Draw the pending state, if any. Returns True if anything was written"""
+        if self.pending is None:
+            return False
+        state, self.pending = self.pending, None
+        self.last_draw = self.clock()
+
+        cells = [[cell_text(cell, self.color) for cell in row] for row in state["board"]]
+        panel = panel_lines(state)
+        if cells == self.cells and panel == self.panel:
+            return False
+
+        if not self.color:
+            text = "\n".join(board_lines(cells) + panel) + "\n\n"
+        elif self.cells is None or len(cells) != len(self.cells):
+            text = self.full_frame(cells, panel)
+        else:
+            text = self.changes(cells, panel)
+        self.cells, self.panel = cells, panel
+        self.output.write(text)
+        self.output.flush()
+        return True
+
+    def panel_top(self, cells):
+        # Below the board, its bottom border and the key line
+        return BOARD_TOP + len(cells) + 2
+
+    def full_frame(self, cells, panel):
+        key = "  " + "".join(
+            f"{name}:{ansi_color(hex_color)}{symbol}{RESET} "
+            for name, (hex_color, symbol) in MULTIPLIER_INFO.items()
+        )
+        lines = board_lines(cells) + [key, ""] + panel
+        return "\x1b[2J" + move_to(1, 1) + "\n".join(lines) + "\n"
+
+    def changes(self, cells, panel):
+        parts = []
+        for y, (row, old_row) in enumerate(zip(cells, self.cells)):
+            for x, (cell, old) in enumerate(zip(row, old_row)):
+                if cell != old:
+                    # Cells are " c " after the "yy|" prefix
+                    parts.append(move_to(BOARD_TOP + y, 5 + 3 * x) + cell)
+
+        top = self.panel_top(cells) + 1
+        for i in range(max(len(panel), len(self.panel))):
+            line = panel[i] if i < len(panel) else ""
+            if i >= len(self.panel) or line != self.panel[i]:
+                parts.append(move_to(top + i, 1) + "\x1b[2K" + line)
+
+        # Park the cursor under the panel
+        parts.append(move_to(top + len(panel), 1))
+        return "".join(parts)
@@ -1,15 +1,28 @@
 import asyncio
 import json
+import os
 
 import websockets
 
-from .render import clear_terminal, write_board
+from .render import LiveRenderer
 
-# Build the WebSocket URL dynamically
-WEBSOCKET_URL = "ws://ai.thewcl.com:8708"
+# The server's spectator feed, or any websocket that sends /state JSON
+BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+WEBSOCKET_URL = os.getenv(
+    "SPECTATE_URL", BASE_URL.replace("http", "ws", 1) + "/spectate"
+)
+
+
+async def keep_refreshing(renderer: LiveRenderer):
+    # Draws states the refresh cap held back
+    while True:
+        await asyncio.sleep(renderer.min_interval)
+        renderer.flush()
 
 
 async def listen_for_updates():
+    renderer = LiveRenderer()
+    refresher = asyncio.create_task(keep_refreshing(renderer))
 
     async with websockets.connect(WEBSOCKET_URL) as ws:
         print(f"Connected to {WEBSOCKET_URL}")
@@ -19,13 +32,12 @@ async def listen_for_updates():
                 board = data.get("board")
 
                 if isinstance(board, list):
-                    clear_terminal()
-
-                    write_board(board)
+                    renderer.update(data)
                 else:
                     print("Invalid board data received.")
             except json.JSONDecodeError:
                 print("Received non-JSON message.")
+    refresher.cancel()
 
 
 if __name__ == "__main__":